@@ -0,0 +1,168 @@
+"""Partition transaction and spotprice tables by month
+
+Revision ID: 9aef19d17734
+Revises: 75d8a8306db2
+Create Date: 2026-10-18 11:26:53.081447
+
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9aef19d17734'
+down_revision: Union[str, None] = '75d8a8306db2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRANSACTION_COLUMNS = "id, tx_hash, timestamp, txn_fee_usdt, gas_used, gas_price_wei, txn_fee_eth, eth_usdt_price"
+SPOTPRICE_COLUMNS = "id, symbol, timestamp, price"
+PREMAKE_MONTHS = 1
+
+# Frozen copies of the month arithmetic and partition naming in app.crud as of this revision, kept here on purpose
+# so later changes to app.crud cannot change what this migration does
+
+
+def _month_floor(timestamp: datetime) -> datetime:
+    return timestamp.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month: datetime) -> datetime:
+    return month.replace(year=month.year + 1, month=1) if month.month == 12 else month.replace(month=month.month + 1)
+
+
+def _create_partitions(table: str, legacy_table: str) -> None:
+    """
+    Creates the default partition and one partition per month from the oldest existing row until the upcoming months
+    """
+    op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+    now = datetime.now(tz=timezone.utc)
+    oldest = op.get_bind().execute(sa.text(f"SELECT min(timestamp) FROM {legacy_table}")).scalar()
+    month = _month_floor(oldest or now)
+    last_month = _month_floor(now)
+    for _ in range(PREMAKE_MONTHS):
+        last_month = _next_month(last_month)
+
+    while month <= last_month:
+        next_month = _next_month(month)
+        op.execute(
+            f"CREATE TABLE {table}_p{month.year}_{month.month:02d} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')"
+        )
+        month = next_month
+
+
+def upgrade() -> None:
+    # transaction
+    op.rename_table('transaction', 'transaction_unpartitioned')
+    op.execute("ALTER TABLE transaction_unpartitioned DROP CONSTRAINT transaction_pkey")
+    op.drop_index('ix_transaction_timestamp_id', table_name='transaction_unpartitioned')
+    op.drop_index('ix_transaction_tx_hash', table_name='transaction_unpartitioned')
+    op.drop_index('ix_transaction_timestamp', table_name='transaction_unpartitioned')
+
+    op.create_table('transaction',
+    sa.Column('tx_hash', sqlmodel.sql.sqltypes.AutoString(length=66), nullable=False),
+    sa.Column('txn_fee_usdt', sa.Float(), nullable=False),
+    sa.Column('gas_used', sa.Integer(), nullable=False),
+    sa.Column('gas_price_wei', sa.BigInteger(), nullable=True),
+    sa.Column('txn_fee_eth', sa.Float(), nullable=False),
+    sa.Column('eth_usdt_price', sa.Float(), nullable=False),
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id', 'timestamp'),
+    sa.UniqueConstraint('tx_hash', 'timestamp', name='tx_hash_timestamp_uc'),
+    postgresql_partition_by='RANGE (timestamp)'
+    )
+    op.create_index('ix_transaction_timestamp_id', 'transaction', ['timestamp', 'id'], unique=False)
+    op.create_index(op.f('ix_transaction_tx_hash'), 'transaction', ['tx_hash'], unique=False)
+    op.create_index(op.f('ix_transaction_timestamp'), 'transaction', ['timestamp'], unique=False)
+    _create_partitions('transaction', 'transaction_unpartitioned')
+
+    op.execute(
+        f"INSERT INTO transaction ({TRANSACTION_COLUMNS}) "
+        f"SELECT {TRANSACTION_COLUMNS} FROM transaction_unpartitioned WHERE timestamp IS NOT NULL"
+    )
+    op.drop_table('transaction_unpartitioned')
+
+    # spotprice
+    op.rename_table('spotprice', 'spotprice_unpartitioned')
+    op.execute("ALTER TABLE spotprice_unpartitioned DROP CONSTRAINT spotprice_pkey")
+    op.drop_constraint('symbol_timestamp_uc', 'spotprice_unpartitioned', type_='unique')
+    op.drop_index('ix_spotprice_symbol', table_name='spotprice_unpartitioned')
+    op.drop_index('ix_spotprice_timestamp', table_name='spotprice_unpartitioned')
+
+    op.create_table('spotprice',
+    sa.Column('symbol', sqlmodel.sql.sqltypes.AutoString(length=10), nullable=False),
+    sa.Column('price', sa.Float(), nullable=False),
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id', 'timestamp'),
+    sa.UniqueConstraint('symbol', 'timestamp', name='symbol_timestamp_uc'),
+    postgresql_partition_by='RANGE (timestamp)'
+    )
+    op.create_index(op.f('ix_spotprice_symbol'), 'spotprice', ['symbol'], unique=False)
+    op.create_index(op.f('ix_spotprice_timestamp'), 'spotprice', ['timestamp'], unique=False)
+    _create_partitions('spotprice', 'spotprice_unpartitioned')
+
+    op.execute(
+        f"INSERT INTO spotprice ({SPOTPRICE_COLUMNS}) "
+        f"SELECT {SPOTPRICE_COLUMNS} FROM spotprice_unpartitioned WHERE timestamp IS NOT NULL"
+    )
+    op.drop_table('spotprice_unpartitioned')
+
+
+def downgrade() -> None:
+    # transaction
+    op.rename_table('transaction', 'transaction_partitioned')
+    op.drop_index('ix_transaction_timestamp_id', table_name='transaction_partitioned')
+    op.drop_index('ix_transaction_tx_hash', table_name='transaction_partitioned')
+    op.drop_index('ix_transaction_timestamp', table_name='transaction_partitioned')
+    op.execute("ALTER TABLE transaction_partitioned DROP CONSTRAINT transaction_pkey")
+
+    op.create_table('transaction',
+    sa.Column('tx_hash', sqlmodel.sql.sqltypes.AutoString(length=66), nullable=False),
+    sa.Column('timestamp', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('txn_fee_usdt', sa.Float(), nullable=False),
+    sa.Column('gas_used', sa.Integer(), nullable=False),
+    sa.Column('gas_price_wei', sa.BigInteger(), nullable=True),
+    sa.Column('txn_fee_eth', sa.Float(), nullable=False),
+    sa.Column('eth_usdt_price', sa.Float(), nullable=False),
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(
+        f"INSERT INTO transaction ({TRANSACTION_COLUMNS}) "
+        f"SELECT DISTINCT ON (tx_hash) {TRANSACTION_COLUMNS} FROM transaction_partitioned"
+    )
+    op.drop_table('transaction_partitioned')
+    op.create_index('ix_transaction_timestamp_id', 'transaction', ['timestamp', 'id'], unique=False)
+    op.create_index(op.f('ix_transaction_tx_hash'), 'transaction', ['tx_hash'], unique=True)
+    op.create_index(op.f('ix_transaction_timestamp'), 'transaction', ['timestamp'], unique=False)
+
+    # spotprice
+    op.rename_table('spotprice', 'spotprice_partitioned')
+    op.drop_constraint('symbol_timestamp_uc', 'spotprice_partitioned', type_='unique')
+    op.drop_index('ix_spotprice_symbol', table_name='spotprice_partitioned')
+    op.drop_index('ix_spotprice_timestamp', table_name='spotprice_partitioned')
+    op.execute("ALTER TABLE spotprice_partitioned DROP CONSTRAINT spotprice_pkey")
+
+    op.create_table('spotprice',
+    sa.Column('symbol', sqlmodel.sql.sqltypes.AutoString(length=10), nullable=False),
+    sa.Column('timestamp', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('price', sa.Float(), nullable=False),
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('symbol', 'timestamp', name='symbol_timestamp_uc')
+    )
+    op.execute(
+        f"INSERT INTO spotprice ({SPOTPRICE_COLUMNS}) "
+        f"SELECT {SPOTPRICE_COLUMNS} FROM spotprice_partitioned"
+    )
+    op.drop_table('spotprice_partitioned')
+    op.create_index(op.f('ix_spotprice_symbol'), 'spotprice', ['symbol'], unique=False)
+    op.create_index(op.f('ix_spotprice_timestamp'), 'spotprice', ['timestamp'], unique=False)
@@ -0,0 +1,106 @@
+"""Store spot prices as one row of 60 1s prices per symbol and minute
+
+Revision ID: e517d2707658
+Revises: 9aef19d17734
+Create Date: 2026-10-18 13:48:06.215930
+
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e517d2707658'
+down_revision: Union[str, None] = '9aef19d17734'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PREMAKE_MONTHS = 1
+
+
+def _month_floor(timestamp: datetime) -> datetime:
+    return timestamp.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month: datetime) -> datetime:
+    return month.replace(year=month.year + 1, month=1) if month.month == 12 else month.replace(month=month.month + 1)
+
+
+def _create_partitions(table: str, source_table: str) -> None:
+    """
+    Creates the default partition and one partition per month from the oldest source row until the upcoming months
+    """
+    op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+    now = datetime.now(tz=timezone.utc)
+    oldest = op.get_bind().execute(sa.text(f"SELECT min(timestamp) FROM {source_table}")).scalar()
+    month = _month_floor(oldest or now)
+    last_month = _month_floor(now)
+    for _ in range(PREMAKE_MONTHS):
+        last_month = _next_month(last_month)
+
+    while month <= last_month:
+        next_month = _next_month(month)
+        op.execute(
+            f"CREATE TABLE {table}_p{month.year}_{month.month:02d} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')"
+        )
+        month = next_month
+
+
+def upgrade() -> None:
+    op.create_table('spotpriceminute',
+    sa.Column('symbol', sqlmodel.sql.sqltypes.AutoString(length=10), nullable=False),
+    sa.Column('timestamp', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('prices', postgresql.ARRAY(sa.Float()), nullable=False),
+    sa.PrimaryKeyConstraint('symbol', 'timestamp'),
+    postgresql_partition_by='RANGE (timestamp)'
+    )
+    _create_partitions('spotpriceminute', 'spotprice')
+
+    # Pack every minute into a fixed 60 element array, null for seconds without a price
+    op.execute(
+        "WITH per_second AS ("
+        "SELECT symbol, "
+        "date_trunc('minute', timestamp AT TIME ZONE 'UTC') AT TIME ZONE 'UTC' AS minute, "
+        "floor(extract(second FROM timestamp AT TIME ZONE 'UTC'))::int AS second, "
+        "price FROM spotprice) "
+        "INSERT INTO spotpriceminute (symbol, timestamp, prices) "
+        "SELECT minutes.symbol, minutes.minute, array_agg(per_second.price ORDER BY seconds.second) "
+        "FROM (SELECT DISTINCT symbol, minute FROM per_second) AS minutes "
+        "CROSS JOIN generate_series(0, 59) AS seconds(second) "
+        "LEFT JOIN per_second ON per_second.symbol = minutes.symbol "
+        "AND per_second.minute = minutes.minute AND per_second.second = seconds.second "
+        "GROUP BY minutes.symbol, minutes.minute"
+    )
+    op.drop_table('spotprice')
+
+
+def downgrade() -> None:
+    op.create_table('spotprice',
+    sa.Column('symbol', sqlmodel.sql.sqltypes.AutoString(length=10), nullable=False),
+    sa.Column('price', sa.Float(), nullable=False),
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id', 'timestamp'),
+    sa.UniqueConstraint('symbol', 'timestamp', name='symbol_timestamp_uc'),
+    postgresql_partition_by='RANGE (timestamp)'
+    )
+    op.create_index(op.f('ix_spotprice_symbol'), 'spotprice', ['symbol'], unique=False)
+    op.create_index(op.f('ix_spotprice_timestamp'), 'spotprice', ['timestamp'], unique=False)
+    _create_partitions('spotprice', 'spotpriceminute')
+
+    # Ids are generated from md5 since Postgres 12 has no built-in gen_random_uuid()
+    op.execute(
+        "INSERT INTO spotprice (id, symbol, timestamp, price) "
+        "SELECT md5(random()::text || clock_timestamp()::text)::uuid, symbol, "
+        "timestamp + (second - 1) * interval '1 second', price "
+        "FROM spotpriceminute, unnest(prices) WITH ORDINALITY AS seconds(price, second) "
+        "WHERE price IS NOT NULL"
+    )
+    op.drop_table('spotpriceminute')
@@ -17,7 +17,7 @@ def get_prices(symbol: str) -> Any:
     Returns the latest spot price for a given symbol
     """
     try:
-        response = binance.get_ticker_current_price(symbol=symbol.upper())
+        response = binance.get_cached_ticker_price(symbol=symbol.upper())
         if response is None:
             raise HTTPException(status_code=404, detail="Price not found")
         return response
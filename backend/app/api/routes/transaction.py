@@ -2,7 +2,7 @@ from typing import Any, List, Optional
 from fastapi import APIRouter, HTTPException, status, Query
 from app.api.deps import HttpClientDep, SessionDep
 from app import web3, crud
-from app.models import TransactionsPublic
+from app.models import CountStrategy, RollupResolution, TransactionFeeStatsPublic, TransactionsPublic
 from datetime import datetime, timezone
 
 
@@ -20,16 +20,29 @@ def get_transactions(
     end_time: Optional[int] = Query(None),
     skip: int = Query(0),
     limit: int = Query(50),
+    cursor: Optional[str] = Query(None),
+    count_strategy: CountStrategy = Query("exact"),
 ) -> Any:
     """
     Get transactions based on optional tx_hashes and optional date range.
-    Supports pagination with skip and limit parameters.
+    Supports pagination with skip and limit parameters, or with the next_cursor
+    returned by a previous page, which takes precedence over skip.
+    count_strategy picks an exact, planner-estimated or maintained total count.
     """
+    if cursor:
+        try:
+            crud.decode_transaction_cursor(cursor=cursor)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+
     try:
         start_time = datetime.fromtimestamp(start_time / 1000, tz=timezone.utc) if start_time else None
         end_time = datetime.fromtimestamp(end_time / 1000, tz=timezone.utc) if end_time else None
 
-        transactions = web3.get_eth_transaction_details(session=session, client=client, tx_hashes=tx_hashes, start_time=start_time, end_time=end_time, skip=skip, limit=limit)
+        transactions = web3.get_eth_transaction_details(session=session, client=client, tx_hashes=tx_hashes, start_time=start_time, end_time=end_time, skip=skip, limit=limit, cursor=cursor, count_strategy=count_strategy)
 
         return transactions
     
@@ -48,3 +61,21 @@ def get_transactions(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(re)
         )
+
+@router.get(
+    "/stats",
+    response_model=TransactionFeeStatsPublic,
+)
+def get_transaction_stats(
+    session: SessionDep,
+    resolution: RollupResolution = Query("hour"),
+    start_time: Optional[int] = Query(None),
+    end_time: Optional[int] = Query(None),
+) -> Any:
+    """
+    Get transaction fee totals, averages and counts per minute, hour or day bucket within an optional date range.
+    """
+    start_time = datetime.fromtimestamp(start_time / 1000, tz=timezone.utc) if start_time else None
+    end_time = datetime.fromtimestamp(end_time / 1000, tz=timezone.utc) if end_time else None
+
+    return crud.get_fee_stats(session=session, resolution=resolution, start_time=start_time, end_time=end_time)
@@ -1,102 +1,317 @@
-from typing import Any, Dict, List
+import logging
+import math
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, Full, Queue
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from binance.error import ClientError
 from binance.spot import Spot as Client
 from datetime import datetime, timezone
 from app import crud
-from app.models import SpotPriceCreate, SpotPricePublic
+from app.columnar import PriceIndex, parse_klines
+from app.models import SpotPricePublic
 from app.core.config import settings
+from app.price_cache import PriceCache, TtlCache
+from app.rate_limit import RateLimitedError, WeightLimiter, parse_retry_after, provider_limiter
 
 from sqlmodel import Session
 
+logger = logging.getLogger(__name__)
+
 ONE_SECOND_MS = 1000
 ETH_USDT_SYMBOL = "ETHUSDT"
 
+KLINES_PER_REQUEST = 1000
+# Request weight of GET /api/v3/klines
+KLINES_REQUEST_WEIGHT = 2
+
 spot_client = Client(base_url=settings.BINANCE_SPOT_API_URL)
+# Separate client returning the X-MBX-USED-WEIGHT-* headers alongside the klines
+kline_client = Client(base_url=settings.BINANCE_SPOT_API_URL, show_limit_usage=True)
+kline_weight_limiter = WeightLimiter(limit_per_minute=settings.BINANCE_WEIGHT_LIMIT_PER_MINUTE)
+binance_rate_limiter = provider_limiter(
+    "binance",
+    rate=settings.BINANCE_REQUESTS_PER_SECOND,
+    max_retries=settings.BINANCE_MAX_RETRIES,
+    backoff_base_seconds=settings.RATE_LIMIT_BACKOFF_BASE_SECONDS,
+    backoff_max_seconds=settings.RATE_LIMIT_BACKOFF_MAX_SECONDS
+)
+price_cache = PriceCache(window_seconds=settings.PRICE_CACHE_WINDOW_SECONDS, lru_size=settings.PRICE_CACHE_LRU_SIZE)
+ticker_cache: TtlCache[Optional[SpotPricePublic]] = TtlCache(
+    ttl_seconds=settings.TICKER_PRICE_CACHE_TTL_SECONDS,
+    max_entries=settings.TICKER_PRICE_CACHE_MAX_ENTRIES
+)
 
-def get_ethusdt_price(*, session: Session, timestamps_ms: List[int]) -> Dict[int, float]:
+def get_cached_prices(*, symbol: str, timestamps_ms: Iterable[int]) -> Dict[int, float]:
     """
-    Retrieves the spot price of ETHUSDT from Binance API for a given list of timestamps.
+    Retrieves prices held in the in-memory price cache for the given timestamps, keyed by epoch ms.
     """
-    prices = {}
-    timestamps = [datetime.fromtimestamp(ts / ONE_SECOND_MS, tz=timezone.utc) for ts in timestamps_ms]
+    cached = price_cache.get_many(symbol=symbol, seconds={ts // ONE_SECOND_MS for ts in timestamps_ms})
+    return {ts: cached[ts // ONE_SECOND_MS] for ts in timestamps_ms if ts // ONE_SECOND_MS in cached}
 
-    # Check if prices are already in the database
-    db_spot_prices = crud.get_spot_prices(session=session, symbol=ETH_USDT_SYMBOL, timestamps=timestamps)
-    for price in db_spot_prices:
-        prices[int(price.timestamp.astimezone(timezone.utc).timestamp() * ONE_SECOND_MS)] = price.price
-    
-    found_db_prices = set(prices.keys())
-    missing_prices = set(timestamps_ms) - found_db_prices if timestamps_ms else set()
+def cache_prices(*, symbol: str, prices: Dict[int, float]) -> None:
+    """
+    Stores prices keyed by epoch ms in the in-memory price cache.
+    """
+    price_cache.put_many(symbol=symbol, prices=((ts // ONE_SECOND_MS, price) for ts, price in prices.items()))
 
-    # Return if all prices are found in the database
-    if not missing_prices:
-        return prices
+def get_kline_windows(*, start_time_ms: int, end_time_ms: int) -> List[Tuple[int, int]]:
+    """
+    Splits an inclusive epoch ms range into consecutive windows of at most KLINES_PER_REQUEST 1s klines.
+    """
+    windows = []
+    window_start = start_time_ms
+    while window_start <= end_time_ms:
+        window_end = min(window_start + (KLINES_PER_REQUEST - 1) * ONE_SECOND_MS, end_time_ms)
+        windows.append((window_start, window_end))
+        window_start = window_end + ONE_SECOND_MS
+    return windows
+
+def plan_kline_windows(*, timestamps_ms: Iterable[int], lookback_ms: int = 0) -> List[Tuple[int, int]]:
+    """
+    Groups epoch ms timestamps into the fewest windows of at most KLINES_PER_REQUEST 1s klines that cover them all,
+    each timestamp along with the lookback_ms before it. Each window starts lookback_ms before an uncovered timestamp
+    and ends at the last timestamp it covers.
+    """
+    if lookback_ms >= KLINES_PER_REQUEST * ONE_SECOND_MS:
+        raise ValueError(f"lookback_ms must be less than {KLINES_PER_REQUEST} seconds")
+    windows = []
+    for timestamp_ms in sorted(set(timestamps_ms)):
+        if windows and timestamp_ms <= windows[-1][0] + (KLINES_PER_REQUEST - 1) * ONE_SECOND_MS:
+            windows[-1] = (windows[-1][0], timestamp_ms)
+        else:
+            window_start_ms = timestamp_ms - lookback_ms
+            if windows:
+                window_start_ms = max(window_start_ms, windows[-1][1] + ONE_SECOND_MS)
+            windows.append((window_start_ms, timestamp_ms))
+    return windows
+
+def _raise_if_rate_limited(e: ClientError) -> None:
+    """
+    Raises RateLimitedError for a 429, or a 418 once the IP is banned for ignoring them, so the request is retried
+    """
+    if e.status_code in (418, 429):
+        raise RateLimitedError(e.error_message, retry_after=parse_retry_after((e.header or {}).get("Retry-After"))) from e
+
+def _fetch_kline_window(*, client: Client, symbol: str, start_time_ms: int, end_time_ms: int) -> List[List[Any]]:
+    """
+    Retrieves the 1s klines of one window, within the request weight budget and retrying when rate limited,
+    pausing the weight budget for the Retry-After Binance sent with a 429 or 418.
+    """
+    def request() -> List[List[Any]]:
+        kline_weight_limiter.acquire(KLINES_REQUEST_WEIGHT)
+        try:
+            response = client.klines(symbol=symbol, interval="1s", startTime=start_time_ms, endTime=end_time_ms, limit=KLINES_PER_REQUEST)
+        except ClientError as e:
+            kline_weight_limiter.release(KLINES_REQUEST_WEIGHT)
+            try:
+                _raise_if_rate_limited(e)
+            except RateLimitedError as rate_limited:
+                # Binance bans by IP, so hold back every kline request until its Retry-After is over
+                if rate_limited.retry_after is not None:
+                    kline_weight_limiter.pause(rate_limited.retry_after)
+                raise
+            raise
+        except Exception:
+            kline_weight_limiter.release(KLINES_REQUEST_WEIGHT)
+            raise
 
-    # Get the earliest and latest timestamps
-    start_time = min(missing_prices)
-    end_time = max(missing_prices)
+        used_weight = response["limit_usage"].get("x-mbx-used-weight-1m")
+        kline_weight_limiter.release(KLINES_REQUEST_WEIGHT, used_weight=int(used_weight) if used_weight else None)
+        return response["data"]
 
-    max_interval = 1000 * ONE_SECOND_MS 
+    return binance_rate_limiter.call(request)
 
-    new_spot_prices = []
-    current_start_time = start_time
+def iter_kline_chunks(
+    *,
+    symbol: str,
+    windows: Iterable[Tuple[int, int]],
+    client: Optional[Client] = None
+) -> Iterator[List[List[Any]]]:
+    """
+    Retrieves 1s klines for each window from Binance API, keeping up to BINANCE_KLINE_CONCURRENCY requests in flight.
+    Yields the klines of each window in window order.
+    """
+    client = client or kline_client
+    concurrency = settings.BINANCE_KLINE_CONCURRENCY
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        in_flight = deque()
+        for start_time_ms, end_time_ms in windows:
+            in_flight.append(executor.submit(
+                _fetch_kline_window, client=client, symbol=symbol, start_time_ms=start_time_ms, end_time_ms=end_time_ms
+            ))
+            if len(in_flight) >= concurrency:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
 
-    # Get missing prices from Binance API
-    while current_start_time <= end_time:
-        current_end_time = min(current_start_time + max_interval, end_time)
+def get_ethusdt_price(*, session: Session, timestamps_ms: List[int], tolerance_ms: Optional[int] = None) -> Dict[int, float]:
+    """
+    Retrieves the spot price of ETHUSDT from Binance API for a given list of timestamps.
+    Seconds without a kline get the nearest earlier price within tolerance_ms, PRICE_AS_OF_TOLERANCE_SECONDS by default,
+    both from the database and from fetched klines, timestamps without any are left out.
+    """
+    if tolerance_ms is None:
+        tolerance_ms = settings.PRICE_AS_OF_TOLERANCE_SECONDS * ONE_SECOND_MS
+    requested_prices = set(timestamps_ms)
+
+    # Check if prices are already in the in-memory cache, then in the database
+    prices = get_cached_prices(symbol=ETH_USDT_SYMBOL, timestamps_ms=requested_prices)
+    missing_prices = requested_prices - prices.keys()
+    if missing_prices:
+        db_prices = crud.get_spot_price_map(
+            session=session, symbol=ETH_USDT_SYMBOL, timestamps_ms=missing_prices, tolerance_ms=tolerance_ms
+        )
+        cache_prices(symbol=ETH_USDT_SYMBOL, prices=db_prices)
+        prices.update(db_prices)
+        missing_prices -= db_prices.keys()
+
+    # Return if all prices are found in the cache or database
+    if not missing_prices:
+        return prices
 
-        klines = spot_client.klines(symbol=ETH_USDT_SYMBOL, interval="1s", startTime=current_start_time, endTime=current_end_time, limit=1000)
-        for kline in klines:
-            kline_open_time = kline[0]
-            open_price = float(kline[1])
-            timestamp = datetime.fromtimestamp(kline_open_time / ONE_SECOND_MS, tz=timezone.utc)
-            if kline_open_time in missing_prices:
-                new_spot_price = SpotPriceCreate(symbol=ETH_USDT_SYMBOL, timestamp=timestamp, price=open_price)
-                new_spot_prices.append(new_spot_price)
-                prices[kline_open_time] = open_price
+    # Get missing prices from Binance API, only for the windows covering the missing timestamps and their tolerance
+    fetched_prices = {}
+    windows = plan_kline_windows(timestamps_ms=missing_prices, lookback_ms=tolerance_ms)
+    contiguous_windows = len(get_kline_windows(start_time_ms=min(missing_prices) - tolerance_ms, end_time_ms=max(missing_prices)))
+    logger.info(
+        f"Fetching {len(missing_prices)} missing prices in {len(windows)} kline requests, "
+        f"saved {contiguous_windows - len(windows)} of {contiguous_windows}"
+    )
+    for klines in iter_kline_chunks(symbol=ETH_USDT_SYMBOL, windows=windows):
+        fetched_prices.update(parse_klines(klines).to_price_map())
 
-        current_start_time = current_end_time + ONE_SECOND_MS
+    # Resolve every missing timestamp in one pass, as of the nearest earlier kline within the tolerance
+    missing_times_ms = np.fromiter(sorted(missing_prices), dtype=np.int64, count=len(missing_prices))
+    resolved = PriceIndex(fetched_prices).lookup(missing_times_ms, tolerance_ms=tolerance_ms)
+    resolved_prices = {
+        timestamp_ms: price
+        for timestamp_ms, price in zip(missing_times_ms.tolist(), resolved.tolist())
+        if not math.isnan(price)
+    }
+    as_of_count = len(resolved_prices.keys() - fetched_prices.keys())
+    if as_of_count or len(resolved_prices) < len(missing_prices):
+        logger.info(
+            f"Resolved {as_of_count} prices as of an earlier second, "
+            f"{len(missing_prices) - len(resolved_prices)} have no price within {tolerance_ms}ms"
+        )
+    prices.update(resolved_prices)
 
-    # Batch insert new spot prices into the database
-    if new_spot_prices:
-        crud.insert_spot_prices(session=session, spot_prices_create=new_spot_prices)
+    # Batch insert the fetched klines into the database and cache them, as of prices are left out of the cache
+    # so a second is never served an earlier price once its own kline is known
+    if fetched_prices:
+        crud.copy_spot_prices(
+            session=session,
+            spot_prices=[(ETH_USDT_SYMBOL, open_time, price) for open_time, price in fetched_prices.items()]
+        )
+        cache_prices(symbol=ETH_USDT_SYMBOL, prices=fetched_prices)
 
     return prices
 
+def iter_spot_price_chunks(
+    *,
+    symbol: str,
+    windows: Sequence[Tuple[int, int]],
+    windows_per_chunk: int
+) -> Iterator[Tuple[int, List[Tuple[str, int, float]]]]:
+    """
+    Retrieves 1s klines for each window and yields them in chunks of windows_per_chunk windows,
+    as (end time of the last window in epoch ms, [(symbol, open time in epoch ms, open price)]).
+    """
+    spot_prices = []
+    chunk_windows = 0
+    for (_, window_end_ms), klines in zip(windows, iter_kline_chunks(symbol=symbol, windows=windows)):
+        spot_prices.extend((symbol, kline[0], float(kline[1])) for kline in klines)
+        chunk_windows += 1
+        if chunk_windows == windows_per_chunk:
+            yield window_end_ms, spot_prices
+            spot_prices = []
+            chunk_windows = 0
+    if chunk_windows:
+        yield window_end_ms, spot_prices
+
+_CHUNKS_DONE = object()
+
 def batch_save_ethusdt_price(*, session: Session, start_time: datetime, end_time: datetime) -> None:
     """
     Retrieves and saves the spot price of ETHUSDT from Binance API for a given start and end time.
+    Chunks are fetched in a background thread into a bounded queue and written as they arrive,
+    advancing the spot price last update after each committed chunk so an interrupted backfill resumes from there.
     """
     start_time_ms = int(start_time.astimezone(timezone.utc).timestamp() * ONE_SECOND_MS)
     end_time_ms = int(end_time.astimezone(timezone.utc).timestamp() * ONE_SECOND_MS)
+    windows = get_kline_windows(start_time_ms=start_time_ms, end_time_ms=end_time_ms)
 
-    max_interval = 1000 * ONE_SECOND_MS 
-
-    new_spot_prices = []
-    current_start_time = start_time_ms
+    chunks: Queue = Queue(maxsize=settings.SPOT_PRICE_BACKFILL_QUEUE_SIZE)
+    stopped = threading.Event()
 
-    while current_start_time <= end_time_ms:
-        current_end_time = min(current_start_time + max_interval, end_time_ms)
+    def put(item: Any) -> bool:
+        while not stopped.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
 
-        # Get spot prices from Binance API
-        klines = spot_client.klines(symbol=ETH_USDT_SYMBOL, interval="1s", startTime=current_start_time, endTime=current_end_time, limit=1000)
-        for kline in klines:
-            kline_open_time = kline[0]
-            open_price = float(kline[1])
-            timestamp = datetime.fromtimestamp(kline_open_time / ONE_SECOND_MS, tz=timezone.utc)
-            new_spot_price = SpotPriceCreate(symbol=ETH_USDT_SYMBOL, timestamp=timestamp, price=open_price)
-            new_spot_prices.append(new_spot_price)
+    def produce() -> None:
+        try:
+            for chunk in iter_spot_price_chunks(
+                symbol=ETH_USDT_SYMBOL, windows=windows, windows_per_chunk=settings.SPOT_PRICE_BACKFILL_CHUNK_WINDOWS
+            ):
+                if not put(chunk):
+                    return
+            put(_CHUNKS_DONE)
+        except Exception as e:
+            put(e)
 
-        # Move to the next chunk
-        current_start_time = current_end_time + ONE_SECOND_MS
+    producer = threading.Thread(target=produce, name="spot-price-backfill", daemon=True)
+    producer.start()
+    try:
+        while True:
+            try:
+                chunk = chunks.get(timeout=0.1)
+            except Empty:
+                if not producer.is_alive():
+                    break
+                continue
+            if chunk is _CHUNKS_DONE:
+                break
+            if isinstance(chunk, Exception):
+                raise chunk
 
-    # Batch insert new spot prices into the database
-    if new_spot_prices:
-        crud.insert_spot_prices(session=session, spot_prices_create=new_spot_prices)
+            # Write the chunk, warm the in-memory cache with it, then move the watermark past it
+            watermark_ms, spot_prices = chunk
+            if spot_prices:
+                crud.copy_spot_prices(session=session, spot_prices=spot_prices)
+                cache_prices(symbol=ETH_USDT_SYMBOL, prices={open_time: price for _, open_time, price in spot_prices})
+            crud.update_lastupdate_spot_price(
+                session=session, end_time=datetime.fromtimestamp(watermark_ms / ONE_SECOND_MS, tz=timezone.utc)
+            )
+    finally:
+        stopped.set()
+        producer.join()
 
 def get_ticker_current_price(*, symbol: str) -> SpotPricePublic:
     """
     Retrieves the current price of a given symbol from Binance API.
     """
-    ticker = spot_client.ticker_price(symbol=symbol)
+    def request() -> Dict[str, str]:
+        try:
+            return spot_client.ticker_price(symbol=symbol)
+        except ClientError as e:
+            _raise_if_rate_limited(e)
+            raise
+
+    ticker = binance_rate_limiter.call(request)
 
     return SpotPricePublic(symbol=symbol, timestamp=datetime.now(tz=timezone.utc), price=float(ticker["price"]) if ticker else 0.0)
+
+def get_cached_ticker_price(*, symbol: str) -> Optional[SpotPricePublic]:
+    """
+    Retrieves the current price of a given symbol, cached for TICKER_PRICE_CACHE_TTL_SECONDS.
+    Concurrent requests for a symbol that is not cached share a single Binance API call.
+    """
+    return ticker_cache.get_or_load(symbol, lambda: get_ticker_current_price(symbol=symbol))
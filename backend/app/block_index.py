@@ -0,0 +1,67 @@
+import threading
+from typing import Iterable, Literal, Optional, Tuple
+
+import numpy as np
+
+
+class BlockIndex:
+    """
+    In-memory index of block timestamps, as sorted arrays of block numbers and epoch seconds,
+    for resolving a timestamp to a block range bound without asking Etherscan.
+    A timestamp between two known blocks at most max_gap_blocks apart is resolved conservatively so no block is missed,
+    a start to the known block before it and an end to the block before the known block after it.
+    """
+
+    def __init__(self, *, max_gap_blocks: int):
+        self.max_gap_blocks = max_gap_blocks
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._block_numbers = np.empty(0, dtype=np.int64)
+        self._timestamps = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._block_numbers)
+
+    def add(self, block_timestamps: Iterable[Tuple[int, int]]) -> None:
+        """
+        Adds (block number, epoch second) pairs, blocks already known are kept
+        """
+        pairs = np.array(list(block_timestamps), dtype=np.int64).reshape(-1, 2)
+        if not len(pairs):
+            return
+        with self._lock:
+            block_numbers = np.concatenate([self._block_numbers, pairs[:, 0]])
+            timestamps = np.concatenate([self._timestamps, pairs[:, 1]])
+            block_numbers, first = np.unique(block_numbers, return_index=True)
+            self._block_numbers = block_numbers
+            self._timestamps = timestamps[first]
+
+    def resolve(self, timestamp: int, *, bound: Literal["start", "end"]) -> Optional[int]:
+        """
+        Resolves an epoch second to the first block of a range starting at it or the last block of a range ending at it,
+        None if it is outside the known range or falls in a gap wider than max_gap_blocks
+        """
+        with self._lock:
+            block_numbers, timestamps = self._block_numbers, self._timestamps
+        block_number = self._resolve(block_numbers, timestamps, timestamp, bound)
+        if block_number is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return block_number
+
+    def _resolve(self, block_numbers: np.ndarray, timestamps: np.ndarray, timestamp: int, bound: str) -> Optional[int]:
+        position = int(np.searchsorted(timestamps, timestamp, side="right")) - 1
+        if position < 0:
+            return None
+        if timestamps[position] == timestamp:
+            return int(block_numbers[position])
+        if position + 1 == len(block_numbers):
+            return None
+
+        before_block, after_block = int(block_numbers[position]), int(block_numbers[position + 1])
+        if after_block - before_block > self.max_gap_blocks:
+            return None
+        # Blocks in between have unknown timestamps, so widen the range to cover all of them
+        return before_block if bound == "start" else after_block - 1
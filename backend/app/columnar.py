@@ -0,0 +1,245 @@
+import os
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+ONE_SECOND_MS = 1000
+ONE_MINUTE_MS = 60 * ONE_SECOND_MS
+# Open times at or above this are epoch microseconds, about year 5138 in epoch ms
+MICROSECOND_TIMESTAMP_THRESHOLD = 10 ** 14
+WEI_PER_ETH = 1e18
+
+
+def uuid4_batch(count: int) -> List[uuid.UUID]:
+    """
+    Generates count random version 4 UUIDs from a single os.urandom call
+    """
+    raw = np.frombuffer(os.urandom(16 * count), dtype=np.uint8).reshape(count, 16).copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    data = raw.tobytes()
+    return [uuid.UUID(bytes=data[offset:offset + 16]) for offset in range(0, len(data), 16)]
+
+
+@dataclass
+class KlineBatch:
+    """
+    Columnar page of 1s klines, open times in epoch ms and open prices
+    """
+    open_times_ms: np.ndarray
+    open_prices: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.open_times_ms)
+
+    def select(self, mask: np.ndarray) -> "KlineBatch":
+        return KlineBatch(open_times_ms=self.open_times_ms[mask], open_prices=self.open_prices[mask])
+
+    def to_spot_prices(self, *, symbol: str) -> List[Tuple[str, int, float]]:
+        """
+        Builds (symbol, open time in epoch ms, open price) rows for writing to the database
+        """
+        return [(symbol, open_time, price) for open_time, price in zip(self.open_times_ms.tolist(), self.open_prices.tolist())]
+
+    def to_price_map(self) -> Dict[int, float]:
+        return dict(zip(self.open_times_ms.tolist(), self.open_prices.tolist()))
+
+    def to_minute_rows(self, *, symbol: str) -> List[Tuple[str, datetime, List[Optional[float]]]]:
+        """
+        Packs the klines into (symbol, minute, 60 prices) rows, None for seconds without a kline
+        """
+        minutes_ms, grid = pack_minutes(self)
+        minutes = minutes_ms.astype("datetime64[ms]").tolist()
+        missing = np.isnan(grid)
+        return [
+            (symbol, minute.replace(tzinfo=timezone.utc), [None if gap else price for price, gap in zip(row, gaps)] if gaps.any() else row)
+            for minute, row, gaps in zip(minutes, grid.tolist(), missing)
+        ]
+
+
+@dataclass
+class TransferEventBatch:
+    """
+    Columnar page of token transfer events, timestamps in epoch ms
+    """
+    tx_hashes: np.ndarray
+    block_numbers: np.ndarray
+    timestamps_ms: np.ndarray
+    gas_used: np.ndarray
+    gas_price_wei: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.tx_hashes)
+
+    def select(self, indices: np.ndarray) -> "TransferEventBatch":
+        return TransferEventBatch(
+            tx_hashes=self.tx_hashes[indices],
+            block_numbers=self.block_numbers[indices],
+            timestamps_ms=self.timestamps_ms[indices],
+            gas_used=self.gas_used[indices],
+            gas_price_wei=self.gas_price_wei[indices],
+        )
+
+
+@dataclass
+class TransactionBatch:
+    """
+    Columnar transfer events with their ETHUSDT prices and fees, and the events left out for lack of a price
+    """
+    events: TransferEventBatch
+    txn_fees_eth: np.ndarray
+    txn_fees_usdt: np.ndarray
+    eth_usdt_prices: np.ndarray
+    unpriced: Optional[TransferEventBatch] = None
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def to_rows(self) -> List[Dict[str, Any]]:
+        """
+        Builds Transaction rows for crud.insert_transaction_rows
+        """
+        timestamps = self.events.timestamps_ms.astype("datetime64[ms]").tolist()
+        return [
+            {
+                "id": id,
+                "tx_hash": tx_hash,
+                "timestamp": timestamp.replace(tzinfo=timezone.utc),
+                "txn_fee_usdt": txn_fee_usdt,
+                "gas_used": gas_used,
+                "gas_price_wei": gas_price_wei,
+                "txn_fee_eth": txn_fee_eth,
+                "eth_usdt_price": eth_usdt_price
+            }
+            for id, tx_hash, timestamp, txn_fee_usdt, gas_used, gas_price_wei, txn_fee_eth, eth_usdt_price in zip(
+                uuid4_batch(len(self)),
+                self.events.tx_hashes.tolist(),
+                timestamps,
+                self.txn_fees_usdt.tolist(),
+                self.events.gas_used.tolist(),
+                self.events.gas_price_wei.tolist(),
+                self.txn_fees_eth.tolist(),
+                self.eth_usdt_prices.tolist(),
+            )
+        ]
+
+
+def parse_klines(klines: Sequence[Sequence[Any]]) -> KlineBatch:
+    """
+    Parses Binance kline rows ([open time, open, high, low, close, ...]) into a KlineBatch
+    """
+    return KlineBatch(
+        open_times_ms=np.fromiter((kline[0] for kline in klines), dtype=np.int64, count=len(klines)),
+        open_prices=np.fromiter((kline[1] for kline in klines), dtype=np.float64, count=len(klines)),
+    )
+
+def parse_kline_csv(lines: Sequence[str]) -> KlineBatch:
+    """
+    Parses lines of a Binance kline archive CSV into a KlineBatch, skipping a header line if present.
+    Open times are converted to epoch ms, archives from 2025 on use epoch microseconds.
+    """
+    rows = [line for line in lines if line[:1].isdigit()]
+    if not rows:
+        return parse_klines([])
+    columns = np.loadtxt(rows, delimiter=",", usecols=(0, 1), dtype=np.float64, ndmin=2)
+    open_times = columns[:, 0].astype(np.int64)
+    open_times = np.where(open_times >= MICROSECOND_TIMESTAMP_THRESHOLD, open_times // 1000, open_times)
+    return KlineBatch(open_times_ms=open_times, open_prices=columns[:, 1])
+
+def pack_minutes(batch: KlineBatch) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Packs 1s klines into the distinct minutes they fall in, as epoch ms, and a minutes x 60 grid of prices, NaN where missing
+    """
+    offsets_ms = batch.open_times_ms % ONE_MINUTE_MS
+    minutes_ms, rows = np.unique(batch.open_times_ms - offsets_ms, return_inverse=True)
+    grid = np.full((len(minutes_ms), 60), np.nan)
+    grid[rows, offsets_ms // ONE_SECOND_MS] = batch.open_prices
+    return minutes_ms, grid
+
+def parse_transfer_events(events: Sequence[Mapping[str, str]]) -> TransferEventBatch:
+    """
+    Parses Etherscan tokentx events into a TransferEventBatch
+    """
+    return TransferEventBatch(
+        tx_hashes=np.array([event["hash"] for event in events], dtype=object),
+        block_numbers=np.fromiter((int(event["blockNumber"]) for event in events), dtype=np.int64, count=len(events)),
+        timestamps_ms=np.fromiter((int(event["timeStamp"]) for event in events), dtype=np.int64, count=len(events)) * ONE_SECOND_MS,
+        gas_used=np.fromiter((int(event["gasUsed"]) for event in events), dtype=np.int64, count=len(events)),
+        gas_price_wei=np.fromiter((int(event["gasPrice"]) for event in events), dtype=np.int64, count=len(events)),
+    )
+
+def concat_transfer_events(batches: Sequence[TransferEventBatch]) -> TransferEventBatch:
+    if not batches:
+        return parse_transfer_events([])
+    return TransferEventBatch(
+        tx_hashes=np.concatenate([batch.tx_hashes for batch in batches]),
+        block_numbers=np.concatenate([batch.block_numbers for batch in batches]),
+        timestamps_ms=np.concatenate([batch.timestamps_ms for batch in batches]),
+        gas_used=np.concatenate([batch.gas_used for batch in batches]),
+        gas_price_wei=np.concatenate([batch.gas_price_wei for batch in batches]),
+    )
+
+def dedupe_transfer_events(batch: TransferEventBatch) -> TransferEventBatch:
+    """
+    Keeps the first event of each transaction hash, in their original order.
+    A swap emits several transfer events for the pool, all with the same transaction fee.
+    """
+    if not len(batch):
+        return batch
+    _, first = np.unique(batch.tx_hashes, return_index=True)
+    if len(first) == len(batch):
+        return batch
+    return batch.select(np.sort(first))
+
+class PriceIndex:
+    """
+    Sorted array-backed index of prices keyed by epoch ms, for exact and as of lookups over whole batches
+    """
+
+    def __init__(self, prices: Mapping[int, float]):
+        times_ms = np.fromiter(prices.keys(), dtype=np.int64, count=len(prices))
+        values = np.fromiter(prices.values(), dtype=np.float64, count=len(prices))
+        order = np.argsort(times_ms)
+        self.times_ms = times_ms[order]
+        self.prices = values[order]
+
+    def __len__(self) -> int:
+        return len(self.times_ms)
+
+    def lookup(self, timestamps_ms: np.ndarray, *, tolerance_ms: int = 0) -> np.ndarray:
+        """
+        Returns the price at or nearest before each timestamp, at most tolerance_ms earlier, NaN where there is none
+        """
+        if not len(self):
+            return np.full(len(timestamps_ms), np.nan)
+        positions = np.searchsorted(self.times_ms, timestamps_ms, side="right") - 1
+        clipped = np.maximum(positions, 0)
+        found = (positions >= 0) & (timestamps_ms - self.times_ms[clipped] <= tolerance_ms)
+        return np.where(found, self.prices[clipped], np.nan)
+
+def join_prices(*, timestamps_ms: np.ndarray, prices: Mapping[int, float], tolerance_ms: int = 0) -> np.ndarray:
+    """
+    Looks up the price of each timestamp, as of at most tolerance_ms earlier, NaN where there is none
+    """
+    return PriceIndex(prices).lookup(timestamps_ms, tolerance_ms=tolerance_ms)
+
+def price_transfer_events(*, batch: TransferEventBatch, prices: Mapping[int, float]) -> TransactionBatch:
+    """
+    Joins ETHUSDT prices onto the events and computes their fees over the whole batch.
+    Raises ValueError if any event has no ETHUSDT price.
+    """
+    eth_usdt_prices = join_prices(timestamps_ms=batch.timestamps_ms, prices=prices)
+    missing = np.isnan(eth_usdt_prices)
+    if missing.any():
+        raise ValueError(f"Missing ETHUSDT price for {int(missing.sum())} events, first at {int(batch.timestamps_ms[missing][0])}")
+
+    txn_fees_eth = batch.gas_used.astype(np.float64) * batch.gas_price_wei.astype(np.float64) / WEI_PER_ETH
+    return TransactionBatch(
+        events=batch,
+        txn_fees_eth=txn_fees_eth,
+        txn_fees_usdt=txn_fees_eth * eth_usdt_prices,
+        eth_usdt_prices=eth_usdt_prices,
+    )
@@ -46,6 +46,19 @@ class Settings(BaseSettings):
 
     SCHEDULER_INTERVAL_MINUTES: int = 1
 
+    # Max rows per multi-row INSERT statement, 8 columns per transaction row
+    # keeps this well under Postgres' 65535 bind parameter limit
+    TRANSACTION_INSERT_CHUNK_SIZE: int = 1000
+
+    # Number of upcoming monthly partitions the ingest job keeps created ahead of time
+    PARTITION_PREMAKE_MONTHS: int = 1
+
+    # In-memory 1s price cache: recent seconds held in a ring buffer per symbol, older lookups in an LRU
+    PRICE_CACHE_WINDOW_SECONDS: int = 6 * 60 * 60
+    PRICE_CACHE_LRU_SIZE: int = 100_000
+    # Seconds without a 1s kline use the nearest earlier price at most this many seconds before, below 1000
+    PRICE_AS_OF_TOLERANCE_SECONDS: int = 60
+
     PROJECT_NAME: str
     POSTGRES_SERVER: str
     POSTGRES_PORT: int = 5432
@@ -55,12 +68,55 @@ class Settings(BaseSettings):
 
     INFURA_API_KEY: str
     INFURA_HTTPS: str
+    # Further JSON-RPC endpoints to fail over to, requests go to the healthiest of these and INFURA_HTTPS
+    RPC_FAILOVER_URLS: Annotated[list[str] | str, BeforeValidator(parse_cors)] = []
+    NODE_HEALTH_INTERVAL_SECONDS: float = 15.0
+    NODE_HEALTH_TIMEOUT_SECONDS: float = 5.0
+    INFURA_REQUESTS_PER_SECOND: float = 10.0
+    INFURA_MAX_RETRIES: int = 3
+    # "rpc" ingests the pool's Swap logs from INFURA_HTTPS with eth_getLogs instead of Etherscan tokentx events
+    TRANSACTION_INGESTION: Literal["etherscan", "rpc"] = "etherscan"
+    # Widest block range per eth_getLogs query, and calls per JSON-RPC batch request
+    RPC_LOG_BLOCK_RANGE: int = 2000
+    RPC_BATCH_SIZE: int = 100
 
     BINANCE_API_KEY: str
     BINANCE_SPOT_API_URL: str = "https://data-api.binance.vision"
+    BINANCE_KLINE_CONCURRENCY: int = 8
+    BINANCE_WEIGHT_LIMIT_PER_MINUTE: int = 6000
+    BINANCE_REQUESTS_PER_SECOND: float = 50.0
+    BINANCE_MAX_RETRIES: int = 3
+    TICKER_PRICE_CACHE_TTL_SECONDS: float = 1.0
+    TICKER_PRICE_CACHE_MAX_ENTRIES: int = 1024
+    # Windows of 1000 klines written per backfill chunk, and chunks buffered between fetching and writing
+    SPOT_PRICE_BACKFILL_CHUNK_WINDOWS: int = 60
+    SPOT_PRICE_BACKFILL_QUEUE_SIZE: int = 2
+    # "websocket" keeps spot prices current from the 1s kline stream instead of the scheduled REST backfill
+    SPOT_PRICE_INGESTION: Literal["rest", "websocket"] = "rest"
+    BINANCE_STREAM_URL: str = "wss://data-stream.binance.vision"
+    BINANCE_STREAM_FLUSH_SECONDS: float = 5.0
+    BINANCE_STREAM_BATCH_SIZE: int = 300
+    BINANCE_STREAM_MAX_RECONNECT_SECONDS: float = 60.0
 
     ETHERSCAN_API_KEY: str
     ETHERSCAN_URL: str = "https://api.etherscan.io/api"
+    ETHERSCAN_REQUESTS_PER_SECOND: float = 5.0
+    ETHERSCAN_MAX_RETRIES: int = 3
+    ETHERSCAN_CONCURRENCY: int = 4
+    # tokentx results per page, and blocks per window fetched concurrently
+    ETHERSCAN_PAGE_SIZE: int = 1000
+    ETHERSCAN_BLOCKS_PER_WINDOW: int = 500
+    # Widest gap between two known blocks that a timestamp is interpolated across instead of asking Etherscan
+    BLOCK_INDEX_MAX_GAP_BLOCKS: int = 64
+
+    # On-disk cache of upstream responses for blocks at least RESPONSE_CACHE_FINALITY_BLOCKS deep, disabled when unset
+    RESPONSE_CACHE_PATH: str | None = None
+    RESPONSE_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024
+    RESPONSE_CACHE_FINALITY_BLOCKS: int = 64
+
+    # Jittered exponential backoff before retrying a rate limited request that came back without Retry-After
+    RATE_LIMIT_BACKOFF_BASE_SECONDS: float = 0.5
+    RATE_LIMIT_BACKOFF_MAX_SECONDS: float = 30.0
 
     UNISWAP_V3_ETH_USDC_ADDRESS: str = "0x88e6A0c2dDD26FEEb64F039a2c41296FcB3f5640"
 
@@ -1,12 +1,81 @@
+import base64
+import uuid
+from collections import Counter
 from sqlmodel import Session, select, func
-from datetime import datetime
-from typing import Dict, Optional, List
-from app.models import Transaction, TransactionCreate, TransactionsPublic, LastUpdate, LastUpdateCreate, SpotPrice, SpotPriceCreate
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Optional, List, Set, Tuple
+from app.models import BlockTimestamp, CountStrategy, RollupResolution, Transaction, TransactionCount, TransactionCreate, TransactionFeeRollup, TransactionFeeStatPublic, TransactionFeeStatsPublic, TransactionsPublic, LastUpdate, LastUpdateCreate, SpotPriceMinute, SpotPricePublic
+from sqlalchemy import BigInteger, DateTime, Select, any_, bindparam, cast, delete, text, tuple_
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from app.core.config import settings
 
 
 # CRUD for Transaction
+def encode_transaction_cursor(*, transaction: Transaction) -> str:
+    """
+    Encodes the (timestamp, id) keyset position of a transaction into an opaque cursor
+    """
+    epoch_us = int(transaction.timestamp.timestamp() * 1_000_000)
+    raw = f"{epoch_us}:{transaction.id.hex}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_transaction_cursor(*, cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """
+    Decodes an opaque cursor into the (timestamp, id) keyset position it points at
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        epoch_us, id_hex = raw.split(":")
+        timestamp = datetime.fromtimestamp(int(epoch_us) / 1_000_000, tz=timezone.utc)
+        return timestamp, uuid.UUID(hex=id_hex)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def _count_exact(*, session: Session, statement: Select) -> int:
+    count_statement = select(func.count()).select_from(statement.subquery())
+    return session.exec(count_statement).one()
+
+def _estimate_count(*, session: Session, statement: Select) -> int:
+    """
+    Returns the planner's row estimate for a statement without executing it
+    """
+    compiled = statement.compile(dialect=session.get_bind().dialect, compile_kwargs={"render_postcompile": True})
+    plan = session.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+def _hour_floor(timestamp: datetime) -> datetime:
+    return timestamp.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+def _count_maintained(*, session: Session, start_time: Optional[datetime], end_time: Optional[datetime]) -> int:
+    """
+    Sums hourly TransactionCount buckets fully inside the time range,
+    and counts the partial hours at either edge exactly
+    """
+    lower = _hour_floor(start_time) if start_time else None
+    if lower is not None and lower < start_time:
+        lower += timedelta(hours=1)
+    upper = _hour_floor(end_time) if end_time else None
+
+    if lower is not None and upper is not None and lower >= upper:
+        statement = select(Transaction).where(Transaction.timestamp >= start_time, Transaction.timestamp <= end_time)
+        return _count_exact(session=session, statement=statement)
+
+    bucket_statement = select(func.coalesce(func.sum(TransactionCount.count), 0))
+    if lower is not None:
+        bucket_statement = bucket_statement.where(TransactionCount.bucket >= lower)
+    if upper is not None:
+        bucket_statement = bucket_statement.where(TransactionCount.bucket < upper)
+    count = int(session.exec(bucket_statement).one())
+
+    if lower is not None and lower > start_time:
+        statement = select(Transaction).where(Transaction.timestamp >= start_time, Transaction.timestamp < lower)
+        count += _count_exact(session=session, statement=statement)
+    if upper is not None:
+        statement = select(Transaction).where(Transaction.timestamp >= upper, Transaction.timestamp <= end_time)
+        count += _count_exact(session=session, statement=statement)
+    return count
+
 def get_transactions(
     *,
     session: Session,
@@ -14,10 +83,14 @@ def get_transactions(
     limit: int = 50,
     start_time: Optional[datetime] = None,
     end_time: Optional[datetime] = None,
-    tx_hashes: Optional[List[str]] = None
+    tx_hashes: Optional[List[str]] = None,
+    cursor: Optional[str] = None,
+    count_strategy: CountStrategy = "exact"
 ) -> TransactionsPublic:
     """
-    Gets transactions from DB, with filtering by start_time, end_time and tx_hashes and pagination support
+    Gets transactions from DB, with filtering by start_time, end_time and tx_hashes and pagination support.
+    When a cursor is given, pages by (timestamp, id) keyset instead of skip.
+    count_strategy selects how the total count is computed, tx_hashes filters are always counted exactly.
     """
     base_statement = select(Transaction)
     
@@ -28,88 +101,349 @@ def get_transactions(
     if tx_hashes:
         base_statement = base_statement.where(Transaction.tx_hash.in_(tx_hashes))
     
-    count_statement = select(func.count()).select_from(base_statement.subquery())
-    count = session.exec(count_statement).one()
+    if count_strategy == "estimated" and not tx_hashes:
+        count = _estimate_count(session=session, statement=base_statement)
+    elif count_strategy == "maintained" and not tx_hashes:
+        count = _count_maintained(session=session, start_time=start_time, end_time=end_time)
+    else:
+        count_strategy = "exact"
+        count = _count_exact(session=session, statement=base_statement)
 
-    statement = base_statement.order_by(Transaction.timestamp.desc()).offset(skip).limit(limit)
+    statement = base_statement.order_by(Transaction.timestamp.desc(), Transaction.id.desc())
+    if cursor:
+        cursor_timestamp, cursor_id = decode_transaction_cursor(cursor=cursor)
+        statement = statement.where(tuple_(Transaction.timestamp, Transaction.id) < tuple_(cursor_timestamp, cursor_id))
+    else:
+        statement = statement.offset(skip)
+    statement = statement.limit(limit)
     
     db_objs = session.exec(statement).all()
-    return TransactionsPublic(data=db_objs, count=count)
+    next_cursor = encode_transaction_cursor(transaction=db_objs[-1]) if db_objs and len(db_objs) == limit else None
+    return TransactionsPublic(data=db_objs, count=count, count_strategy=count_strategy, next_cursor=next_cursor)
 
-def insert_transactions(*, session: Session, transactions_create: List[TransactionCreate]) -> List[Transaction]:
+def insert_transactions(
+    *,
+    session: Session,
+    transactions_create: List[TransactionCreate],
+    chunk_size: Optional[int] = None
+) -> List[Transaction]:
     """
-    Inserts transactions into DB, on conflict do nothing.
+    Inserts transactions into DB in multi-row chunks, on conflict do nothing.
+    Returns only the transactions that were actually inserted.
     """
+    chunk_size = chunk_size or settings.TRANSACTION_INSERT_CHUNK_SIZE
     db_objs = []
-    for tx in transactions_create:
-        db_obj = Transaction.model_validate(tx)
-        stmt = pg_insert(Transaction).values(
-            tx_hash=db_obj.tx_hash,
-            timestamp=db_obj.timestamp,
-            txn_fee_usdt=db_obj.txn_fee_usdt,
-            gas_used=db_obj.gas_used,
-            gas_price_wei=db_obj.gas_price_wei,
-            txn_fee_eth=db_obj.txn_fee_eth,
-            eth_usdt_price=db_obj.eth_usdt_price
-        ).on_conflict_do_nothing(index_elements=['tx_hash'])
-        session.exec(stmt)
-        try:
-            session.commit()
-            db_objs.append(db_obj)
-        except IntegrityError:
-            session.rollback()
+    for start in range(0, len(transactions_create), chunk_size):
+        chunk = [Transaction.model_validate(tx) for tx in transactions_create[start:start + chunk_size]]
+        inserted_ids = _insert_transaction_chunk(session=session, rows=[_transaction_row(db_obj) for db_obj in chunk])
+        db_objs.extend(db_obj for db_obj in chunk if db_obj.id in inserted_ids)
     return db_objs
 
+def insert_transaction_rows(*, session: Session, rows: List[Dict[str, Any]], chunk_size: Optional[int] = None) -> int:
+    """
+    Inserts already typed transaction rows, dicts of every Transaction column including id, in multi-row chunks,
+    on conflict do nothing. Skips building a model per row for bulk ingestion. Returns the number of rows inserted.
+    """
+    chunk_size = chunk_size or settings.TRANSACTION_INSERT_CHUNK_SIZE
+    inserted = 0
+    for start in range(0, len(rows), chunk_size):
+        inserted += len(_insert_transaction_chunk(session=session, rows=rows[start:start + chunk_size]))
+    return inserted
+
+def _transaction_row(db_obj: Transaction) -> Dict[str, Any]:
+    return {
+        "id": db_obj.id,
+        "tx_hash": db_obj.tx_hash,
+        "timestamp": db_obj.timestamp,
+        "txn_fee_usdt": db_obj.txn_fee_usdt,
+        "gas_used": db_obj.gas_used,
+        "gas_price_wei": db_obj.gas_price_wei,
+        "txn_fee_eth": db_obj.txn_fee_eth,
+        "eth_usdt_price": db_obj.eth_usdt_price
+    }
+
+def _insert_transaction_chunk(*, session: Session, rows: List[Dict[str, Any]]) -> Set[uuid.UUID]:
+    """
+    Inserts one chunk of transaction rows with their count and rollup increments in a single commit.
+    Returns the ids actually inserted, none if the chunk was rolled back.
+    """
+    stmt = pg_insert(Transaction).values(rows).on_conflict_do_nothing(index_elements=['tx_hash', 'timestamp']).returning(Transaction.id)
+    try:
+        inserted_ids = set(session.exec(stmt).scalars().all())
+        inserted = [row for row in rows if row["id"] in inserted_ids]
+        _increment_transaction_counts(session=session, rows=inserted)
+        _increment_fee_rollups(session=session, rows=inserted)
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        return set()
+    return inserted_ids
+
+def _increment_transaction_counts(*, session: Session, rows: List[Dict[str, Any]]) -> None:
+    """
+    Adds newly inserted transactions to their hourly TransactionCount buckets, in the caller's transaction
+    """
+    bucket_counts = Counter(_hour_floor(row["timestamp"]) for row in rows)
+    if not bucket_counts:
+        return
+    stmt = pg_insert(TransactionCount).values([
+        {"bucket": bucket, "count": count} for bucket, count in bucket_counts.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['bucket'],
+        set_={"count": TransactionCount.count + stmt.excluded["count"]}
+    )
+    session.exec(stmt)
+
+
+# CRUD for TransactionFeeRollup
+ROLLUP_RESOLUTIONS = ("minute", "hour", "day")
+
+def _bucket_floor(timestamp: datetime, resolution: RollupResolution) -> datetime:
+    timestamp = timestamp.astimezone(timezone.utc).replace(second=0, microsecond=0)
+    if resolution in ("hour", "day"):
+        timestamp = timestamp.replace(minute=0)
+    if resolution == "day":
+        timestamp = timestamp.replace(hour=0)
+    return timestamp
+
+def _increment_fee_rollups(*, session: Session, rows: List[Dict[str, Any]]) -> None:
+    """
+    Adds newly inserted transactions to their minute, hour and day TransactionFeeRollup buckets, in the caller's transaction
+    """
+    rollups: Dict[Tuple[str, datetime], List[float]] = {}
+    for row in rows:
+        for resolution in ROLLUP_RESOLUTIONS:
+            rollup = rollups.setdefault((resolution, _bucket_floor(row["timestamp"], resolution)), [0, 0.0, 0.0, 0])
+            rollup[0] += 1
+            rollup[1] += row["txn_fee_usdt"]
+            rollup[2] += row["txn_fee_eth"]
+            rollup[3] += row["gas_used"]
+    if not rollups:
+        return
+    stmt = pg_insert(TransactionFeeRollup).values([
+        {
+            "resolution": resolution,
+            "bucket": bucket,
+            "count": count,
+            "txn_fee_usdt_sum": txn_fee_usdt_sum,
+            "txn_fee_eth_sum": txn_fee_eth_sum,
+            "gas_used_sum": gas_used_sum
+        }
+        for (resolution, bucket), (count, txn_fee_usdt_sum, txn_fee_eth_sum, gas_used_sum) in rollups.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['resolution', 'bucket'],
+        set_={
+            "count": TransactionFeeRollup.count + stmt.excluded["count"],
+            "txn_fee_usdt_sum": TransactionFeeRollup.txn_fee_usdt_sum + stmt.excluded.txn_fee_usdt_sum,
+            "txn_fee_eth_sum": TransactionFeeRollup.txn_fee_eth_sum + stmt.excluded.txn_fee_eth_sum,
+            "gas_used_sum": TransactionFeeRollup.gas_used_sum + stmt.excluded.gas_used_sum
+        }
+    )
+    session.exec(stmt)
+
+def get_fee_stats(
+    *,
+    session: Session,
+    resolution: RollupResolution,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None
+) -> TransactionFeeStatsPublic:
+    """
+    Gets bucketed transaction fee aggregates from the rollup table, for buckets overlapping start_time to end_time
+    """
+    statement = select(TransactionFeeRollup).where(TransactionFeeRollup.resolution == resolution)
+    if start_time:
+        statement = statement.where(TransactionFeeRollup.bucket >= _bucket_floor(start_time, resolution))
+    if end_time:
+        statement = statement.where(TransactionFeeRollup.bucket <= end_time)
+    statement = statement.order_by(TransactionFeeRollup.bucket)
+
+    data = [
+        TransactionFeeStatPublic(
+            bucket=rollup.bucket,
+            count=rollup.count,
+            total_fee_usdt=rollup.txn_fee_usdt_sum,
+            avg_fee_usdt=rollup.txn_fee_usdt_sum / rollup.count,
+            total_fee_eth=rollup.txn_fee_eth_sum,
+            avg_fee_eth=rollup.txn_fee_eth_sum / rollup.count,
+            avg_gas_used=rollup.gas_used_sum / rollup.count
+        )
+        for rollup in session.exec(statement).all()
+    ]
+    return TransactionFeeStatsPublic(resolution=resolution, data=data)
+
+# CRUD for SpotPrice, stored as one SpotPriceMinute row of 60 1s prices per symbol and minute
+ONE_MINUTE_MS = 60 * 1000
+
+def _epoch_ms(column):
+    return cast(func.extract("epoch", column) * 1000, BigInteger)
 
-# CRUD for SpotPrice
 def get_spot_price(
     *,
     session: Session,
     symbol: str,
     timestamp: datetime
-) -> SpotPrice | None:
+) -> SpotPricePublic | None:
     """
     Gets spot price for a given symbol and timestamp from DB
     """
-    statement = select(SpotPrice).where(SpotPrice.symbol == symbol).where(SpotPrice.timestamp == timestamp)
-    db_obj = session.exec(statement).first()
-    return db_obj
+    timestamp_ms = int(timestamp.timestamp() * 1000)
+    price = get_spot_price_map(session=session, symbol=symbol, timestamps_ms=[timestamp_ms]).get(timestamp_ms)
+    if price is None:
+        return None
+    return SpotPricePublic(symbol=symbol, timestamp=timestamp, price=price)
 
 def get_spot_prices(
     *,
     session: Session,
     symbol: str,
     timestamps: List[datetime]
-) -> List[SpotPrice]:
+) -> List[SpotPricePublic]:
+    """
+    Gets spot prices for a given symbol and list of timestamps from DB
+    """
+    timestamps_ms = {int(timestamp.timestamp() * 1000): timestamp for timestamp in timestamps}
+    prices = get_spot_price_map(session=session, symbol=symbol, timestamps_ms=timestamps_ms.keys())
+    return [
+        SpotPricePublic(symbol=symbol, timestamp=timestamps_ms[timestamp_ms], price=price)
+        for timestamp_ms, price in prices.items()
+    ]
+
+def get_spot_price_map(
+    *,
+    session: Session,
+    symbol: str,
+    timestamps_ms: Iterable[int],
+    tolerance_ms: int = 0
+) -> Dict[int, float]:
     """
-    Gets spot prices for a given symbol and time range from DB
+    Gets spot prices for a given symbol and epoch ms timestamps from DB, keyed by epoch ms.
+    A second without a stored price gets the latest stored price at most tolerance_ms earlier, timestamps without any are left out.
+    The minutes covering the timestamps are bound as a single array, and bounded by their min/max for partition pruning.
     """
-    statement = select(SpotPrice).where(
-        SpotPrice.symbol == symbol,
-        SpotPrice.timestamp.in_(timestamps)
+    unique_timestamps_ms = set(timestamps_ms)
+    if not unique_timestamps_ms:
+        return {}
+    minutes = [
+        datetime.fromtimestamp(minute_ms / 1000, tz=timezone.utc)
+        for minute_ms in sorted({
+            minute_ms
+            for ts in unique_timestamps_ms
+            for minute_ms in range(ts - tolerance_ms - (ts - tolerance_ms) % ONE_MINUTE_MS, ts + 1, ONE_MINUTE_MS)
+        })
+    ]
+    statement = select(_epoch_ms(SpotPriceMinute.timestamp), SpotPriceMinute.prices).where(
+        SpotPriceMinute.symbol == symbol,
+        SpotPriceMinute.timestamp >= minutes[0],
+        SpotPriceMinute.timestamp <= minutes[-1],
+        SpotPriceMinute.timestamp == any_(bindparam("minutes", minutes, type_=ARRAY(DateTime(timezone=True))))
     )
-    db_objs = session.exec(statement).all()
-    return db_objs
+    minute_prices = dict(session.exec(statement).all())
+
+    prices = {}
+    for timestamp_ms in unique_timestamps_ms:
+        # Walk back second by second to the latest stored price within the tolerance
+        for second_ms in range(timestamp_ms, timestamp_ms - tolerance_ms - 1, -1000):
+            offset_ms = second_ms % ONE_MINUTE_MS
+            row = minute_prices.get(second_ms - offset_ms)
+            if row is not None and row[offset_ms // 1000] is not None:
+                prices[timestamp_ms] = row[offset_ms // 1000]
+                break
+    return prices
 
-def insert_spot_prices(*, session: Session, spot_prices_create: List[SpotPriceCreate]) -> List[SpotPrice]:
+def copy_spot_prices(*, session: Session, spot_prices: Iterable[Tuple[str, int, float]]) -> int:
     """
-    Saves spot prices into DB, on conflict do nothing.
+    Bulk loads (symbol, epoch_ms, price) tuples into DB. Prices are packed into minute rows in memory,
+    streamed with COPY into a staging table and merged in one transaction, keeping seconds already stored.
+    Returns the number of minute rows written.
     """
-    db_objs = []
-    for sp in spot_prices_create:
-        db_obj = SpotPrice.model_validate(sp)
-        stmt = pg_insert(SpotPrice).values(
-            symbol=db_obj.symbol,
-            timestamp=db_obj.timestamp,
-            price=db_obj.price
-        ).on_conflict_do_nothing(index_elements=['symbol', 'timestamp'])
-        session.exec(stmt)
-        try:
-            session.commit()
-            db_objs.append(db_obj)
-        except IntegrityError:
-            session.rollback()
-    return db_objs
+    minutes: Dict[Tuple[str, int], List[Optional[float]]] = {}
+    for symbol, epoch_ms, price in spot_prices:
+        offset_ms = epoch_ms % ONE_MINUTE_MS
+        row = minutes.get((symbol, epoch_ms - offset_ms))
+        if row is None:
+            row = minutes[(symbol, epoch_ms - offset_ms)] = [None] * 60
+        row[offset_ms // 1000] = price
+    return copy_spot_price_minutes(
+        session=session,
+        minute_rows=(
+            (symbol, datetime.fromtimestamp(minute_ms / 1000, tz=timezone.utc), row)
+            for (symbol, minute_ms), row in minutes.items()
+        )
+    )
+
+def copy_spot_price_minutes(*, session: Session, minute_rows: Iterable[Tuple[str, datetime, List[Optional[float]]]]) -> int:
+    """
+    Bulk loads already packed (symbol, minute, 60 prices) rows into DB with COPY through a staging table,
+    merged in one transaction keeping seconds already stored. Returns the number of minute rows written.
+    """
+    minute_rows = iter(minute_rows)
+    first_row = next(minute_rows, None)
+    if first_row is None:
+        return 0
+
+    connection = session.connection().connection.driver_connection
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TEMP TABLE spotpriceminute_staging "
+            "(symbol varchar(10), timestamp timestamptz, prices double precision[]) "
+            "ON COMMIT DROP"
+        )
+        with cursor.copy("COPY spotpriceminute_staging (symbol, timestamp, prices) FROM STDIN") as copy:
+            copy.set_types(["varchar", "timestamptz", "float8[]"])
+            copy.write_row(first_row)
+            for row in minute_rows:
+                copy.write_row(row)
+        cursor.execute(
+            "INSERT INTO spotpriceminute (symbol, timestamp, prices) "
+            "SELECT symbol, timestamp, prices FROM spotpriceminute_staging "
+            "ON CONFLICT (symbol, timestamp) DO UPDATE SET prices = ARRAY("
+            "SELECT coalesce(stored, fetched) "
+            "FROM unnest(spotpriceminute.prices, excluded.prices) WITH ORDINALITY AS merged(stored, fetched, second) "
+            "ORDER BY second)"
+        )
+        written = cursor.rowcount
+    session.commit()
+    return written
+
+def get_complete_spot_price_minutes(*, session: Session, symbol: str, start_time: datetime, end_time: datetime) -> Set[int]:
+    """
+    Gets the minutes in [start_time, end_time) that already have a price for every second, as epoch ms.
+    """
+    statement = select(_epoch_ms(SpotPriceMinute.timestamp)).where(
+        SpotPriceMinute.symbol == symbol,
+        SpotPriceMinute.timestamp >= start_time,
+        SpotPriceMinute.timestamp < end_time,
+        func.array_position(SpotPriceMinute.prices, None).is_(None)
+    )
+    return set(session.exec(statement).all())
+
+# CRUD for BlockTimestamp
+def insert_block_timestamps(*, session: Session, block_timestamps: List[Tuple[int, datetime]]) -> None:
+    """
+    Stores (block number, timestamp) pairs, keeping blocks already stored
+    """
+    if not block_timestamps:
+        return
+    stmt = pg_insert(BlockTimestamp).values([
+        {"block_number": block_number, "timestamp": timestamp} for block_number, timestamp in block_timestamps
+    ]).on_conflict_do_nothing(index_elements=['block_number'])
+    session.exec(stmt)
+    session.commit()
+
+def get_block_timestamps_around(*, session: Session, timestamp: datetime) -> List[BlockTimestamp]:
+    """
+    Gets the latest stored block at or before timestamp and the earliest stored block after it, where they exist
+    """
+    before = session.exec(
+        select(BlockTimestamp).where(BlockTimestamp.timestamp <= timestamp).order_by(BlockTimestamp.timestamp.desc()).limit(1)
+    ).first()
+    after = session.exec(
+        select(BlockTimestamp).where(BlockTimestamp.timestamp > timestamp).order_by(BlockTimestamp.timestamp).limit(1)
+    ).first()
+    return [db_obj for db_obj in (before, after) if db_obj is not None]
 
 # CRUD for LastUpdate
 def get_lastupdate_transaction(*, session: Session) -> Optional[LastUpdate]:
@@ -152,14 +486,16 @@ def insert_lastupdate_spot_price(*, session: Session, lastupdate_spot_price_inse
     session.refresh(db_obj)
     return db_obj
 
-def update_lastupdate_transaction(*, session: Session, end_time: datetime) -> Optional[LastUpdate]:
+def update_lastupdate_transaction(*, session: Session, end_time: datetime, block_number: Optional[int] = None) -> Optional[LastUpdate]:
     """
-    Update last update time for transaction data
+    Update last update time for transaction data, and the last block ingested when given
     """
     statement = select(LastUpdate).where(LastUpdate.type == "transaction")
     db_obj = session.exec(statement).first()
     if db_obj:
         db_obj.timestamp = end_time
+        if block_number is not None:
+            db_obj.block_number = block_number
         session.add(db_obj)
         session.commit()
         session.refresh(db_obj)
@@ -180,3 +516,95 @@ def update_lastupdate_spot_price(*, session: Session, end_time: datetime) -> Opt
         return db_obj
     return db_obj
 
+
+# Partition management
+PARTITIONED_TABLES = (Transaction.__tablename__, SpotPriceMinute.__tablename__)
+# Key of the transaction scoped advisory lock serialising partition creation across the scheduler and request handlers
+PARTITION_LOCK_KEY = 0x70617274
+
+def _month_floor(timestamp: datetime) -> datetime:
+    return timestamp.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def _next_month(month: datetime) -> datetime:
+    return month.replace(year=month.year + 1, month=1) if month.month == 12 else month.replace(month=month.month + 1)
+
+def _partition_name(table: str, month: datetime) -> str:
+    return f"{table}_p{month.year}_{month.month:02d}"
+
+def get_partitions(*, session: Session, table: str) -> List[str]:
+    """
+    Gets the names of the partitions currently attached to a partitioned table
+    """
+    statement = text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :table"
+    ).bindparams(table=table)
+    return list(session.exec(statement).scalars().all())
+
+def ensure_monthly_partitions(*, session: Session, start_time: datetime, end_time: datetime) -> List[str]:
+    """
+    Creates any missing monthly partitions of the partitioned tables covering start_time to end_time.
+    Rows for those months already caught by the default partition are moved into the new partition.
+    Creation is serialised with an advisory lock and the missing partitions are checked again under it,
+    so concurrent callers do not both create the same partition. Returns the names of the partitions created.
+    """
+    if not _missing_monthly_partitions(session=session, start_time=start_time, end_time=end_time):
+        return []
+
+    session.exec(text("SELECT pg_advisory_xact_lock(:key)").bindparams(key=PARTITION_LOCK_KEY))
+    created = []
+    for table, name, month, next_month in _missing_monthly_partitions(session=session, start_time=start_time, end_time=end_time):
+        _create_monthly_partition(session=session, table=table, name=name, start=month, end=next_month)
+        created.append(name)
+    session.commit()
+    return created
+
+def _missing_monthly_partitions(*, session: Session, start_time: datetime, end_time: datetime) -> List[Tuple[str, str, datetime, datetime]]:
+    missing = []
+    for table in PARTITIONED_TABLES:
+        existing = set(get_partitions(session=session, table=table))
+        month = _month_floor(start_time)
+        while month <= end_time:
+            next_month = _next_month(month)
+            name = _partition_name(table, month)
+            if name not in existing:
+                missing.append((table, name, month, next_month))
+            month = next_month
+    return missing
+
+def _create_monthly_partition(*, session: Session, table: str, name: str, start: datetime, end: datetime) -> None:
+    bounds = {"start": start, "end": end}
+    in_range = "timestamp >= :start AND timestamp < :end"
+    has_default_rows = session.exec(
+        text(f"SELECT EXISTS (SELECT 1 FROM {table}_default WHERE {in_range})").bindparams(**bounds)
+    ).scalar()
+    if has_default_rows:
+        session.exec(text(f"CREATE TEMP TABLE partition_move AS SELECT * FROM {table}_default WHERE {in_range}").bindparams(**bounds))
+        session.exec(text(f"DELETE FROM {table}_default WHERE {in_range}").bindparams(**bounds))
+    session.exec(text(
+        f"CREATE TABLE {name} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    if has_default_rows:
+        session.exec(text(f"INSERT INTO {table} SELECT * FROM partition_move"))
+        session.exec(text("DROP TABLE partition_move"))
+
+def detach_monthly_partition(*, session: Session, table: str, month: datetime) -> str:
+    """
+    Detaches the partition holding the given month from a partitioned table, leaving it as a standalone table
+    that can be archived or dropped. Returns the detached table name.
+    """
+    if table not in PARTITIONED_TABLES:
+        raise ValueError(f"Table {table} is not partitioned")
+    start = _month_floor(month)
+    name = _partition_name(table, start)
+    session.exec(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+    if table == Transaction.__tablename__:
+        session.exec(delete(TransactionCount).where(
+            TransactionCount.bucket >= start,
+            TransactionCount.bucket < _next_month(start)
+        ))
+    session.commit()
+    return name
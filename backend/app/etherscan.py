@@ -1,21 +1,89 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import List
+from typing import Any, Dict, List, Literal, Tuple
 import httpx
+import numpy as np
 from sqlmodel import Session
+from app import crud
 from app.binance import get_ethusdt_price
+from app.block_index import BlockIndex
+from app.columnar import ONE_SECOND_MS, TransactionBatch, TransferEventBatch, concat_transfer_events, dedupe_transfer_events, parse_transfer_events, price_transfer_events
 from app.core.config import settings
-from app.models import TransactionCreate
+from app.rate_limit import RateLimitedError, parse_retry_after, provider_limiter
+from app.response_cache import fingerprint, response_cache
 
+logger = logging.getLogger(__name__)
 
-ONE_SECOND_MS = 1000
+# Etherscan caps page * offset of a tokentx query at 10,000 results
+MAX_RESULTS_PER_QUERY = 10_000
+
+
+class TransferEventStats:
+    """
+    Running counts of tokentx events fetched and of those dropped as repeats of a transaction hash
+    """
+
+    def __init__(self):
+        self.events = 0
+        self.duplicates = 0
+        self._lock = threading.Lock()
+
+    def record(self, *, events: int, duplicates: int) -> None:
+        with self._lock:
+            self.events += events
+            self.duplicates += duplicates
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "events": self.events,
+                "duplicates": self.duplicates,
+                "duplicate_ratio": self.duplicates / self.events if self.events else 0.0
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self.events = 0
+            self.duplicates = 0
+
+
+etherscan_rate_limiter = provider_limiter(
+    "etherscan",
+    rate=settings.ETHERSCAN_REQUESTS_PER_SECOND,
+    max_retries=settings.ETHERSCAN_MAX_RETRIES,
+    backoff_base_seconds=settings.RATE_LIMIT_BACKOFF_BASE_SECONDS,
+    backoff_max_seconds=settings.RATE_LIMIT_BACKOFF_MAX_SECONDS
+)
+block_index = BlockIndex(max_gap_blocks=settings.BLOCK_INDEX_MAX_GAP_BLOCKS)
+transfer_event_stats = TransferEventStats()
+
+
+def _get(*, client: httpx.Client, url: str) -> Dict[str, Any]:
+    """
+    Sends a GET request to the Etherscan API under the shared Etherscan rate limiter,
+    retrying it when rate limited either with a 429 or a "Max rate limit reached" result.
+    """
+    def request() -> Dict[str, Any]:
+        response = client.get(url)
+        if response.status_code == 429:
+            raise RateLimitedError("HTTP 429", retry_after=parse_retry_after(response.headers.get("Retry-After")))
+        response.raise_for_status()
+        data = response.json()
+        result = data.get("result")
+        if isinstance(result, str) and "rate limit" in result.lower():
+            raise RateLimitedError(result)
+        return data
+
+    return etherscan_rate_limiter.call(request)
 
 def get_block_no_by_timestamp(*, client: httpx.Client, timestamp: int) -> int:
     """
     Retrieves the block number from Etherscan API for a given timestamp.
     """
     url = f"{settings.ETHERSCAN_URL}?module=block&action=getblocknobytime&timestamp={timestamp}&closest=before&apikey={settings.ETHERSCAN_API_KEY}"
-    response = client.get(url)
-    data = response.json()
+    data = _get(client=client, url=url)
     
     if "result" not in data:
         raise ValueError(f"Unexpected response format: {data}")
@@ -25,6 +93,99 @@ def get_block_no_by_timestamp(*, client: httpx.Client, timestamp: int) -> int:
     else:
         raise ValueError(data["result"])
 
+def resolve_block_no(*, client: httpx.Client, session: Session, timestamp: int, bound: Literal["start", "end"]) -> int:
+    """
+    Resolves a timestamp to the first or last block of a block range from the block index, loading the stored blocks
+    around it on a miss, and only asks Etherscan for the last block at or before it when it is still outside the known range.
+    """
+    block_number = block_index.resolve(timestamp, bound=bound)
+    if block_number is not None:
+        return block_number
+
+    block_timestamps = crud.get_block_timestamps_around(session=session, timestamp=datetime.fromtimestamp(timestamp, tz=timezone.utc))
+    block_index.add((db_obj.block_number, int(db_obj.timestamp.timestamp())) for db_obj in block_timestamps)
+    block_number = block_index.resolve(timestamp, bound=bound)
+    if block_number is not None:
+        return block_number
+
+    return get_block_no_by_timestamp(client=client, timestamp=timestamp)
+
+def record_block_timestamps(*, session: Session, events: TransferEventBatch) -> None:
+    """
+    Adds the blocks of the events to the block index and stores them
+    """
+    block_numbers, first = np.unique(events.block_numbers, return_index=True)
+    timestamps = events.timestamps_ms[first] // ONE_SECOND_MS
+    block_timestamps = list(zip(block_numbers.tolist(), timestamps.tolist()))
+    block_index.add(block_timestamps)
+    crud.insert_block_timestamps(
+        session=session,
+        block_timestamps=[(block_number, datetime.fromtimestamp(timestamp, tz=timezone.utc)) for block_number, timestamp in block_timestamps]
+    )
+
+def get_block_windows(*, from_block: int, to_block: int, blocks_per_window: int) -> List[Tuple[int, int]]:
+    """
+    Splits an inclusive block range into consecutive windows of at most blocks_per_window blocks.
+    """
+    return [
+        (start_block, min(start_block + blocks_per_window - 1, to_block))
+        for start_block in range(from_block, to_block + 1, blocks_per_window)
+    ]
+
+def _get_tokentx_page(
+    *,
+    client: httpx.Client,
+    address: str,
+    start_block: int,
+    end_block: int,
+    page: int,
+    offset: int
+) -> List[Dict[str, str]]:
+    url = (
+        f"{settings.ETHERSCAN_URL}?module=account&action=tokentx"
+        f"&address={address}"
+        f"&page={page}&offset={offset}&startblock={start_block}&endblock={end_block}"
+        f"&sort=asc&apikey={settings.ETHERSCAN_API_KEY}"
+    )
+
+
+    def fetch() -> List[Dict[str, str]]:
+        data = _get(client=client, url=url)
+
+        # Errors such as "Invalid API Key" come back as a string result
+        if isinstance(data.get("result"), str):
+            raise ValueError(data["result"])
+        return data["result"]
+
+    # Pages of finalized blocks never change
+    key = fingerprint("etherscan", "tokentx", address.lower(), start_block, end_block, page, offset)
+    return response_cache.get_or_fetch(key, block_number=end_block, fetch=fetch)
+
+def _get_tokentx_window(*, client: httpx.Client, address: str, start_block: int, end_block: int) -> List[Dict[str, str]]:
+    """
+    Retrieves every tokentx event of a block window in ascending block order. Etherscan returns at most
+    MAX_RESULTS_PER_QUERY results per query, so when a query is exhausted it continues from the last block seen,
+    dropping that block's events from the exhausted query as they may be incomplete.
+    """
+    page_size = settings.ETHERSCAN_PAGE_SIZE
+    max_pages = max(MAX_RESULTS_PER_QUERY // page_size, 1)
+    events = []
+    while True:
+        for page in range(1, max_pages + 1):
+            results = _get_tokentx_page(
+                client=client, address=address, start_block=start_block, end_block=end_block, page=page, offset=page_size
+            )
+            events.extend(results)
+            if len(results) < page_size:
+                return events
+
+        last_block = int(events[-1]["blockNumber"])
+        if last_block == start_block:
+            raise ValueError(f"Block {start_block} has more than {max_pages * page_size} tokentx events")
+        while events and int(events[-1]["blockNumber"]) == last_block:
+            events.pop()
+        start_block = last_block
+
 def get_erc20_token_transfer_events(
     *,
     client: httpx.Client,
@@ -32,55 +193,53 @@ def get_erc20_token_transfer_events(
     address: str,
     from_block: int,
     to_block: int
-) -> List[TransactionCreate]:
+) -> TransactionBatch:
     """
-    Retrieves ERC20 token transfer events from Etherscan API for a given contract address and block range.
+    Retrieves ERC20 token transfer events from Etherscan API for a given contract address and block range,
+    priced and with their fees computed as a columnar batch, newest first.
+    The range is split into windows of ETHERSCAN_BLOCKS_PER_WINDOW blocks fetched ETHERSCAN_CONCURRENCY at a time
+    under the shared Etherscan rate limiter.
     """
-    transactions = []
-    page = 1
-    offset = 100
-    timestamps_ms = []
-    raw_transactions = []
+    response_cache.observe_head(to_block)
+    windows = get_block_windows(from_block=from_block, to_block=to_block, blocks_per_window=settings.ETHERSCAN_BLOCKS_PER_WINDOW)
+    with ThreadPoolExecutor(max_workers=settings.ETHERSCAN_CONCURRENCY) as executor:
+        window_events = list(executor.map(
+            lambda window: _get_tokentx_window(client=client, address=address, start_block=window[0], end_block=window[1]),
+            windows
+        ))
+    batches = [parse_transfer_events(events[::-1]) for events in reversed(window_events) if events]
 
-    while True:
-        url = (
-            f"{settings.ETHERSCAN_URL}?module=account&action=tokentx"
-            f"&address={address}"
-            f"&page={page}&offset={offset}&startblock={from_block}&endblock={to_block}"
-            f"&sort=desc&apikey={settings.ETHERSCAN_API_KEY}"
-        )
+    return build_transactions(session=session, events=concat_transfer_events(batches))
 
-        response = client.get(url)
-        response.raise_for_status()
-        data = response.json()
-
-        if not data["result"]:
-            break
-
-        for event in data["result"]:
-            timestamp_ms = int(event["timeStamp"]) * ONE_SECOND_MS
-            timestamps_ms.append(timestamp_ms)
-            raw_transactions.append(event)
+def build_transactions(*, session: Session, events: TransferEventBatch) -> TransactionBatch:
+    """
+    Records the blocks of newest first transfer events, keeps one event per transaction hash
+    and prices them with their fees computed as a columnar batch. Events without an ETHUSDT price are left out,
+    logged and returned as the batch's unpriced events so the caller can retry them.
+    """
+    record_block_timestamps(session=session, events=events)
 
-        page += 1
+    # Keep one event per transaction hash so each transaction is priced and inserted once
+    unique_events = dedupe_transfer_events(events)
+    transfer_event_stats.record(events=len(events), duplicates=len(events) - len(unique_events))
+    if len(unique_events) < len(events):
+        logger.info(f"Dropped {len(events) - len(unique_events)} of {len(events)} transfer events repeating a transaction hash")
+    events = unique_events
 
     # Fetch all ETH/USDT prices for the collected timestamps
-    eth_usdt_prices = get_ethusdt_price(session=session, timestamps_ms=timestamps_ms)
-
-    # Process the raw transactions to create TransactionCreate objects
-    for event in raw_transactions:
-        timestamp_ms = int(event["timeStamp"]) * ONE_SECOND_MS
-        eth_usdt_price = eth_usdt_prices.get(timestamp_ms)
-
-        transaction = TransactionCreate(
-            tx_hash=event["hash"],
-            timestamp=datetime.fromtimestamp(int(event["timeStamp"]), tz=timezone.utc),
-            txn_fee_usdt=float(event["gasUsed"]) * float(event["gasPrice"]) * eth_usdt_price / 1e18,
-            gas_used=int(event["gasUsed"]),
-            gas_price_wei=int(event["gasPrice"]),
-            txn_fee_eth=float(event["gasUsed"]) * float(event["gasPrice"]) / 1e18,
-            eth_usdt_price=eth_usdt_price
+    eth_usdt_prices = get_ethusdt_price(session=session, timestamps_ms=events.timestamps_ms.tolist())
+
+    # Leave out events no price could be resolved for rather than failing the whole batch
+    priced = np.isin(events.timestamps_ms, np.fromiter(eth_usdt_prices.keys(), dtype=np.int64, count=len(eth_usdt_prices)))
+    unpriced = events.select(np.flatnonzero(~priced))
+    if len(unpriced):
+        logger.warning(
+            f"Skipped {len(unpriced)} of {len(events)} transfer events without an ETHUSDT price, "
+            f"earliest at {int(unpriced.timestamps_ms.min())}"
         )
-        transactions.append(transaction)
+        events = events.select(np.flatnonzero(priced))
 
-    return transactions
\ No newline at end of file
+    # Compute fees over the whole batch, rows are only built when inserting
+    transactions = price_transfer_events(batch=events, prices=eth_usdt_prices)
+    transactions.unpriced = unpriced
+    return transactions
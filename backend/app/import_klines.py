@@ -0,0 +1,124 @@
+"""
+Bulk imports Binance 1s kline archives (https://data.binance.vision) from a local directory into SpotPriceMinute,
+e.g. ETHUSDT-1s-2025-01.zip monthly or ETHUSDT-1s-2025-01-15.zip daily archives, zipped or extracted CSV.
+
+Run from the backend directory:
+    python app/import_klines.py /path/to/archives --workers 4
+"""
+import argparse
+import io
+import logging
+import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlmodel import Session
+
+from app import crud
+from app.columnar import ONE_MINUTE_MS, parse_kline_csv
+from app.core.db import engine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ARCHIVE_NAME = re.compile(r"^(?P<symbol>[A-Z0-9]+)-1s-(?P<year>\d{4})-(?P<month>\d{2})(?:-(?P<day>\d{2}))?\.(?:zip|csv)$")
+ROWS_PER_CHUNK = 6 * 60 * 60
+
+
+def get_archive_range(path: Path) -> Optional[Tuple[str, datetime, datetime]]:
+    """
+    Gets the symbol and the [start, end) time range covered by an archive from its file name, None if not a 1s kline archive
+    """
+    match = ARCHIVE_NAME.match(path.name)
+    if not match:
+        return None
+    year, month = int(match["year"]), int(match["month"])
+    if match["day"]:
+        start_time = datetime(year, month, int(match["day"]), tzinfo=timezone.utc)
+        return match["symbol"], start_time, start_time + timedelta(days=1)
+    start_time = datetime(year, month, 1, tzinfo=timezone.utc)
+    end_time = datetime(year + 1, 1, 1, tzinfo=timezone.utc) if month == 12 else datetime(year, month + 1, 1, tzinfo=timezone.utc)
+    return match["symbol"], start_time, end_time
+
+def iter_archive_lines(path: Path) -> Iterator[str]:
+    """
+    Streams the CSV lines of an archive, decompressing zip members on the fly
+    """
+    if path.suffix == ".zip":
+        with zipfile.ZipFile(path) as archive:
+            for name in archive.namelist():
+                if name.endswith(".csv"):
+                    with archive.open(name) as member:
+                        yield from io.TextIOWrapper(member, encoding="ascii")
+    else:
+        with open(path, encoding="ascii") as file:
+            yield from file
+
+def import_archive(*, session: Session, path: Path, rows_per_chunk: int = ROWS_PER_CHUNK) -> int:
+    """
+    Imports one archive, skipping it if every minute it covers is already complete and otherwise
+    only loading minutes that are not. Each chunk is committed on its own. Returns the number of minute rows written.
+    """
+    archive_range = get_archive_range(path)
+    if archive_range is None:
+        logger.warning(f"Skipping {path.name}, not a 1s kline archive")
+        return 0
+    symbol, start_time, end_time = archive_range
+
+    complete_minutes = crud.get_complete_spot_price_minutes(session=session, symbol=symbol, start_time=start_time, end_time=end_time)
+    if len(complete_minutes) >= (end_time - start_time) // timedelta(minutes=1):
+        logger.info(f"Skipping {path.name}, already present")
+        return 0
+    complete_minutes_ms = np.fromiter(complete_minutes, dtype=np.int64, count=len(complete_minutes))
+
+    written = 0
+    lines = iter_archive_lines(path)
+    while chunk := list(islice(lines, rows_per_chunk)):
+        batch = parse_kline_csv(chunk)
+        batch = batch.select(~np.isin(batch.open_times_ms - batch.open_times_ms % ONE_MINUTE_MS, complete_minutes_ms))
+        written += crud.copy_spot_price_minutes(session=session, minute_rows=batch.to_minute_rows(symbol=symbol))
+    logger.info(f"Imported {path.name}, {written} minute rows written")
+    return written
+
+def import_directory(*, directory: Path, workers: int = 1, rows_per_chunk: int = ROWS_PER_CHUNK) -> int:
+    """
+    Imports every archive in a directory, up to workers archives at once each with its own DB session.
+    Monthly partitions for all archives are created first so concurrent imports never create the same one.
+    """
+    paths: List[Path] = sorted(path for path in directory.iterdir() if path.suffix in (".zip", ".csv"))
+    archive_ranges = [archive_range for archive_range in map(get_archive_range, paths) if archive_range]
+    if archive_ranges:
+        with Session(engine) as session:
+            crud.ensure_monthly_partitions(
+                session=session,
+                start_time=min(start_time for _, start_time, _ in archive_ranges),
+                end_time=max(end_time for _, _, end_time in archive_ranges)
+            )
+
+    def import_path(path: Path) -> int:
+        with Session(engine) as session:
+            return import_archive(session=session, path=path, rows_per_chunk=rows_per_chunk)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return sum(executor.map(import_path, paths))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk import Binance 1s kline archives into the spot price table")
+    parser.add_argument("directory", type=Path, help="directory holding the .zip or .csv archives")
+    parser.add_argument("--workers", type=int, default=1, help="archives imported concurrently")
+    parser.add_argument("--rows-per-chunk", type=int, default=ROWS_PER_CHUNK, help="CSV rows parsed and committed at once")
+    args = parser.parse_args()
+
+    logger.info(f"Importing kline archives from {args.directory}")
+    written = import_directory(directory=args.directory, workers=args.workers, rows_per_chunk=args.rows_per_chunk)
+    logger.info(f"Kline archives imported, {written} minute rows written")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from queue import Empty, Queue
+from typing import Callable, List, Optional, Tuple
+
+import websocket
+from sqlmodel import Session
+
+from app import binance, crud
+from app.core.config import settings
+from app.core.db import engine
+
+logger = logging.getLogger(__name__)
+
+
+class KlineStreamIngester:
+    """
+    Keeps 1s ETHUSDT spot prices current from the Binance ethusdt@kline_1s stream.
+    Closed klines are buffered and written in batches to SpotPriceMinute and the in-memory price cache,
+    advancing the spot price last update after each batch. Gaps since the last written kline,
+    e.g. on startup or after a reconnect, are backfilled from the REST API by a separate thread so the socket keeps
+    being read, while the last update is held before the gap until its backfill has been written.
+    """
+
+    def __init__(
+        self,
+        *,
+        stream_url: Optional[str] = None,
+        session_factory: Callable[[], Session] = lambda: Session(engine),
+        flush_seconds: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        max_reconnect_seconds: Optional[float] = None
+    ):
+        self.symbol = binance.ETH_USDT_SYMBOL
+        self.url = f"{stream_url or settings.BINANCE_STREAM_URL}/ws/{self.symbol.lower()}@kline_1s"
+        self.flush_seconds = flush_seconds if flush_seconds is not None else settings.BINANCE_STREAM_FLUSH_SECONDS
+        self.batch_size = batch_size or settings.BINANCE_STREAM_BATCH_SIZE
+        self.max_reconnect_seconds = max_reconnect_seconds if max_reconnect_seconds is not None else settings.BINANCE_STREAM_MAX_RECONNECT_SECONDS
+        self.connections = 0
+        self.backfills = 0
+        self._session_factory = session_factory
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._backfill_thread: Optional[threading.Thread] = None
+        self._gaps: Queue = Queue()
+        self._lock = threading.Lock()
+        self._pending_backfills = 0
+        self._held_end_time_ms: Optional[int] = None
+        self._socket: Optional[websocket.WebSocket] = None
+        self._buffer: List[Tuple[str, int, float]] = []
+        self._last_flush = time.monotonic()
+        self._last_open_time_ms: Optional[int] = None
+
+    def start(self) -> None:
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="kline-stream", daemon=True)
+        self._thread.start()
+        self._backfill_thread = threading.Thread(target=self._run_backfills, name="kline-backfill", daemon=True)
+        self._backfill_thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._socket is not None:
+            self._socket.abort()
+        if self._thread is not None:
+            self._thread.join()
+        if self._backfill_thread is not None:
+            self._backfill_thread.join()
+
+    def _run(self) -> None:
+        with self._session_factory() as session:
+            last_update = crud.get_lastupdate_spot_price(session=session)
+            if last_update:
+                self._last_open_time_ms = int(last_update.timestamp.timestamp() * binance.ONE_SECOND_MS)
+
+            reconnect_seconds = 1.0
+            while not self._stopped.is_set():
+                try:
+                    self._socket = websocket.create_connection(self.url, timeout=self.flush_seconds)
+                    self.connections += 1
+                    reconnect_seconds = 1.0
+                    self._consume(session=session)
+                except Exception as e:
+                    if self._stopped.is_set():
+                        break
+                    logger.warning(f"Kline stream disconnected: {e!r}, reconnecting in {reconnect_seconds}s")
+                finally:
+                    if self._socket is not None:
+                        self._socket.close()
+                        self._socket = None
+                    try:
+                        self._flush(session=session)
+                    except Exception as e:
+                        logger.warning(f"Failed to write buffered klines: {e!r}")
+                if self._stopped.wait(reconnect_seconds):
+                    break
+                reconnect_seconds = min(reconnect_seconds * 2, self.max_reconnect_seconds)
+
+    def _consume(self, *, session: Session) -> None:
+        while not self._stopped.is_set():
+            try:
+                message = self._socket.recv()
+            except websocket.WebSocketTimeoutException:
+                message = None
+            if message:
+                kline = json.loads(message).get("k")
+                if kline and kline["x"]:
+                    self._on_closed_kline(session=session, open_time_ms=kline["t"], open_price=float(kline["o"]))
+            elif message is not None:
+                raise websocket.WebSocketConnectionClosedException("Connection closed by server")
+            if len(self._buffer) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_seconds:
+                self._flush(session=session)
+
+    def _on_closed_kline(self, *, session: Session, open_time_ms: int, open_price: float) -> None:
+        last_open_time_ms = self._last_open_time_ms
+        if last_open_time_ms is not None and open_time_ms <= last_open_time_ms:
+            return
+        if last_open_time_ms is not None and open_time_ms > last_open_time_ms + binance.ONE_SECOND_MS:
+            # Write what is buffered first so the last update only ever advances over contiguous prices,
+            # then hand the gap to the backfill thread instead of blocking the receive loop on it
+            self._flush(session=session)
+            self.backfills += 1
+            with self._lock:
+                self._pending_backfills += 1
+            self._gaps.put((last_open_time_ms + binance.ONE_SECOND_MS, open_time_ms - binance.ONE_SECOND_MS))
+        self._buffer.append((self.symbol, open_time_ms, open_price))
+        self._last_open_time_ms = open_time_ms
+
+    def _flush(self, *, session: Session) -> None:
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        spot_prices, self._buffer = self._buffer, []
+        try:
+            crud.copy_spot_prices(session=session, spot_prices=spot_prices)
+        except Exception:
+            # Keep the klines buffered so they are retried with the next flush
+            session.rollback()
+            self._buffer = spot_prices + self._buffer
+            raise
+        binance.cache_prices(symbol=self.symbol, prices={open_time: price for _, open_time, price in spot_prices})
+        with self._lock:
+            if self._pending_backfills:
+                # Applied by the backfill thread once the gaps before these prices are written
+                self._held_end_time_ms = spot_prices[-1][1]
+                return
+            crud.update_lastupdate_spot_price(
+                session=session,
+                end_time=datetime.fromtimestamp(spot_prices[-1][1] / binance.ONE_SECOND_MS, tz=timezone.utc)
+            )
+
+    def _run_backfills(self) -> None:
+        with self._session_factory() as session:
+            while not self._stopped.is_set():
+                try:
+                    start_time_ms, end_time_ms = self._gaps.get(timeout=0.1)
+                except Empty:
+                    continue
+                retry_seconds = 1.0
+                while not self._stopped.is_set():
+                    try:
+                        binance.batch_save_ethusdt_price(
+                            session=session,
+                            start_time=datetime.fromtimestamp(start_time_ms / binance.ONE_SECOND_MS, tz=timezone.utc),
+                            end_time=datetime.fromtimestamp(end_time_ms / binance.ONE_SECOND_MS, tz=timezone.utc)
+                        )
+                        break
+                    except Exception as e:
+                        session.rollback()
+                        logger.warning(f"Kline gap backfill failed: {e!r}, retrying in {retry_seconds}s")
+                        if self._stopped.wait(retry_seconds):
+                            return
+                        retry_seconds = min(retry_seconds * 2, self.max_reconnect_seconds)
+                else:
+                    return
+
+                with self._lock:
+                    self._pending_backfills -= 1
+                    if self._pending_backfills or self._held_end_time_ms is None:
+                        continue
+                    held_end_time_ms, self._held_end_time_ms = self._held_end_time_ms, None
+                    try:
+                        crud.update_lastupdate_spot_price(
+                            session=session,
+                            end_time=datetime.fromtimestamp(held_end_time_ms / binance.ONE_SECOND_MS, tz=timezone.utc)
+                        )
+                    except Exception as e:
+                        # The next flush of the stream advances it instead
+                        session.rollback()
+                        logger.warning(f"Failed to advance the spot price last update: {e!r}")
@@ -8,6 +8,8 @@ from starlette.middleware.cors import CORSMiddleware
 from app.api.main import api_router
 from app.api.deps import get_db
 from app.core.config import settings
+from app.kline_stream import KlineStreamIngester
+from app.node_health import node_monitor
 from app.tasks import long_running_task, run_continuously
 
 
@@ -18,16 +20,25 @@ def custom_generate_unique_id(route: APIRoute) -> str:
 async def lifespan(app: FastAPI):
     client = httpx.Client(timeout=10.0)
     app.state.client = client
+    node_monitor.start()
 
     long_running_task(client=client)
     stop_run_continuously = run_continuously()
     schedule.every(settings.SCHEDULER_INTERVAL_MINUTES).minute.do(long_running_task, client=client)
     app.state.stop_run_continuously = stop_run_continuously
 
+    kline_stream = None
+    if settings.SPOT_PRICE_INGESTION == "websocket":
+        kline_stream = KlineStreamIngester()
+        kline_stream.start()
+
     yield {"client": client}
 
+    if kline_stream:
+        kline_stream.stop()
     if stop_run_continuously:
         stop_run_continuously.set()
+    node_monitor.stop()
     client.close()
 
 
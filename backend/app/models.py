@@ -1,13 +1,15 @@
 import uuid
 
 from datetime import datetime
-from sqlalchemy import BigInteger, Column, DateTime
+from typing import Literal
+from sqlalchemy import BigInteger, Column, DateTime, Float, Index
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlmodel import Field, SQLModel, UniqueConstraint
 
 # Shared properties
 class TransactionBase(SQLModel):
     """Base model for Ethereum transaction."""
-    tx_hash: str = Field(unique=True, index=True, max_length=66)
+    tx_hash: str = Field(index=True, max_length=66)
     timestamp: datetime = Field(
         sa_column=Column(DateTime(timezone=True), index=True)
     )
@@ -22,19 +24,73 @@ class TransactionCreate(TransactionBase):
     pass
 
 # Database model, database table inferred from class name
+# Range partitioned by month on timestamp, so the partition key is part of every unique constraint
 class Transaction(TransactionBase, table=True):
     """Database model for Ethereum transaction."""
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    timestamp: datetime = Field(
+        sa_column=Column(DateTime(timezone=True), primary_key=True, index=True)
+    )
+
+    __table_args__ = (
+        UniqueConstraint("tx_hash", "timestamp", name="tx_hash_timestamp_uc"),
+        Index("ix_transaction_timestamp_id", "timestamp", "id"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
 
 # Properties to return via API, id is always required
 class TransactionPublic(TransactionBase):
     """Transaction response model for return via API."""
     id: uuid.UUID
 
+# How TransactionsPublic.count is computed: exact COUNT(*), planner row estimate,
+# or hourly counters maintained on insert
+CountStrategy = Literal["exact", "estimated", "maintained"]
+
 class TransactionsPublic(SQLModel):
     """Transactions response model for return via API."""
     data: list[TransactionPublic]
     count: int
+    count_strategy: CountStrategy = "exact"
+    next_cursor: str | None = None
+
+# Database model, database table inferred from class name
+class TransactionCount(SQLModel, table=True):
+    """Database model for number of transactions per hour bucket."""
+    bucket: datetime = Field(
+        sa_column=Column(DateTime(timezone=True), primary_key=True)
+    )
+    count: int = Field(sa_column=Column(BigInteger, nullable=False))
+
+
+RollupResolution = Literal["minute", "hour", "day"]
+
+# Database model, database table inferred from class name
+class TransactionFeeRollup(SQLModel, table=True):
+    """Database model for transaction fee aggregates per minute, hour or day bucket."""
+    resolution: str = Field(primary_key=True, max_length=10)
+    bucket: datetime = Field(
+        sa_column=Column(DateTime(timezone=True), primary_key=True)
+    )
+    count: int = Field(sa_column=Column(BigInteger, nullable=False))
+    txn_fee_usdt_sum: float
+    txn_fee_eth_sum: float
+    gas_used_sum: int = Field(sa_column=Column(BigInteger, nullable=False))
+
+class TransactionFeeStatPublic(SQLModel):
+    """Transaction fee aggregates of one bucket for return via API."""
+    bucket: datetime
+    count: int
+    total_fee_usdt: float
+    avg_fee_usdt: float
+    total_fee_eth: float
+    avg_fee_eth: float
+    avg_gas_used: float
+
+class TransactionFeeStatsPublic(SQLModel):
+    """Transaction fee aggregates response model for return via API."""
+    resolution: RollupResolution
+    data: list[TransactionFeeStatPublic]
 
 
 # Shared properties
@@ -53,6 +109,8 @@ class LastUpdateCreate(LastUpdateBase):
 class LastUpdate(LastUpdateBase, table=True):
     """Database model for data last update."""
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    # Last block ingested up to timestamp, where the data is ingested by block
+    block_number: int | None = Field(default=None, sa_column=Column(BigInteger, nullable=True))
 
 # Shared properties
 class SpotPriceBase(SQLModel):
@@ -73,10 +131,26 @@ class SpotPriceCreate(SpotPriceBase):
     pass
 
 # Database model, database table inferred from class name
-class SpotPrice(SpotPriceBase, table=True):
-    """Database model for spot price data."""
-    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+# One row per symbol and minute, prices[i] holds the 1s price at second i of the minute, null if missing.
+# Range partitioned by month on timestamp, so the partition key is part of every unique constraint
+class SpotPriceMinute(SQLModel, table=True):
+    """Database model for one minute of 1s spot price data."""
+    symbol: str = Field(primary_key=True, max_length=10)
+    timestamp: datetime = Field(
+        sa_column=Column(DateTime(timezone=True), primary_key=True)
+    )
+    prices: list[float | None] = Field(sa_column=Column(ARRAY(Float), nullable=False))
 
     __table_args__ = (
-        UniqueConstraint("symbol", "timestamp", name="symbol_timestamp_uc"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+
+
+# Database model, database table inferred from class name
+# Timestamps of blocks seen while ingesting, used to resolve timestamps to block numbers locally
+class BlockTimestamp(SQLModel, table=True):
+    """Database model for the timestamp of one Ethereum block."""
+    block_number: int = Field(sa_column=Column(BigInteger, primary_key=True, autoincrement=False))
+    timestamp: datetime = Field(
+        sa_column=Column(DateTime(timezone=True), nullable=False, index=True)
     )
@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class EndpointHealth:
+    """
+    Last known state of one JSON-RPC endpoint, healthy until a probe says otherwise
+    """
+    url: str
+    healthy: bool = True
+    block_number: Optional[int] = None
+    latency_seconds: Optional[float] = None
+    probes: int = 0
+    failures: int = 0
+    last_error: Optional[str] = None
+
+
+class NodeHealthMonitor:
+    """
+    Probes every JSON-RPC endpoint with eth_blockNumber every interval_seconds in the background,
+    keeping whether each is reachable, its latest block and a moving average of its latency.
+    Request paths read the cached state instead of making their own round-trip, and send requests to
+    the healthiest endpoint: the fastest one at most max_block_lag blocks behind the highest block seen.
+    """
+
+    def __init__(
+        self,
+        *,
+        endpoints: List[str],
+        interval_seconds: float,
+        timeout_seconds: float,
+        max_block_lag: int = 2,
+        latency_smoothing: float = 0.3,
+        clock: Callable[[], float] = time.perf_counter
+    ):
+        self.interval_seconds = interval_seconds
+        self.max_block_lag = max_block_lag
+        self.latency_smoothing = latency_smoothing
+        self._endpoints = [EndpointHealth(url=url) for url in dict.fromkeys(endpoints)]
+        self._current = self._endpoints[0]
+        self._clock = clock
+        self._client = httpx.Client(timeout=timeout_seconds)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="node-health", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self.probe_all()
+            self._stopped.wait(self.interval_seconds)
+
+    def _probe(self, endpoint: EndpointHealth) -> None:
+        started = self._clock()
+        try:
+            response = self._client.post(endpoint.url, json={"jsonrpc": "2.0", "id": 1, "method": "eth_blockNumber", "params": []})
+            response.raise_for_status()
+            block_number = int(response.json()["result"], 16)
+        except Exception as e:
+            with self._lock:
+                endpoint.probes += 1
+                endpoint.failures += 1
+                endpoint.healthy = False
+                endpoint.last_error = repr(e)
+            return
+
+        latency_seconds = self._clock() - started
+        with self._lock:
+            endpoint.probes += 1
+            endpoint.healthy = True
+            endpoint.block_number = block_number
+            endpoint.last_error = None
+            endpoint.latency_seconds = latency_seconds if endpoint.latency_seconds is None else (
+                self.latency_smoothing * latency_seconds + (1 - self.latency_smoothing) * endpoint.latency_seconds
+            )
+
+    def probe_all(self) -> None:
+        """
+        Probes every endpoint once and switches to the healthiest one
+        """
+        for endpoint in self._endpoints:
+            self._probe(endpoint)
+
+        with self._lock:
+            healthy = [endpoint for endpoint in self._endpoints if endpoint.healthy and endpoint.block_number is not None]
+            if not healthy:
+                return
+            head_block = max(endpoint.block_number for endpoint in healthy)
+            in_sync = [endpoint for endpoint in healthy if endpoint.block_number >= head_block - self.max_block_lag]
+            best = min(in_sync, key=lambda endpoint: endpoint.latency_seconds)
+            if best is not self._current:
+                logger.warning(f"Switching JSON-RPC endpoint to {best.url}, {self._current.url} is unhealthy or slower")
+                self._current = best
+        response_cache.observe_head(head_block)
+
+    def is_healthy(self) -> bool:
+        """
+        Whether any endpoint was reachable on its last probe
+        """
+        with self._lock:
+            return any(endpoint.healthy for endpoint in self._endpoints)
+
+    def endpoint(self) -> str:
+        """
+        URL of the endpoint requests should currently go to
+        """
+        with self._lock:
+            return self._current.url
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        with self._lock:
+            return {
+                endpoint.url: {
+                    "healthy": endpoint.healthy,
+                    "current": endpoint is self._current,
+                    "block_number": endpoint.block_number,
+                    "latency_seconds": endpoint.latency_seconds,
+                    "probes": endpoint.probes,
+                    "failures": endpoint.failures,
+                }
+                for endpoint in self._endpoints
+            }
+
+
+node_monitor = NodeHealthMonitor(
+    endpoints=[settings.INFURA_HTTPS, *settings.RPC_FAILOVER_URLS],
+    interval_seconds=settings.NODE_HEALTH_INTERVAL_SECONDS,
+    timeout_seconds=settings.NODE_HEALTH_TIMEOUT_SECONDS
+)
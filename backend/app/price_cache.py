@@ -0,0 +1,165 @@
+import math
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Generic, Hashable, Iterable, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+class PriceCache:
+    """
+    Bounded in-memory cache of 1s prices keyed by (symbol, epoch second).
+    The most recent window_seconds of each symbol live in a fixed size ring buffer,
+    older seconds are kept in an LRU of at most lru_size entries.
+    """
+
+    def __init__(self, *, window_seconds: int, lru_size: int):
+        self.window_seconds = window_seconds
+        self.lru_size = lru_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # symbol -> (seconds held by each slot, prices held by each slot), slot = second % window_seconds
+        self._rings: Dict[str, Tuple[array, array]] = {}
+        self._latest: Dict[str, int] = {}
+        self._lru: OrderedDict[Tuple[str, int], float] = OrderedDict()
+
+    def _ring(self, symbol: str) -> Tuple[array, array]:
+        ring = self._rings.get(symbol)
+        if ring is None:
+            ring = self._rings[symbol] = (array("q", [-1]) * self.window_seconds, array("d", [math.nan]) * self.window_seconds)
+        return ring
+
+    def _in_window(self, symbol: str, second: int) -> bool:
+        return second > self._latest.get(symbol, second) - self.window_seconds
+
+    def put_many(self, *, symbol: str, prices: Iterable[Tuple[int, float]]) -> None:
+        """
+        Stores (epoch second, price) pairs for a symbol
+        """
+        with self._lock:
+            seconds, values = self._ring(symbol)
+            for second, price in prices:
+                if second > self._latest.get(symbol, -1):
+                    self._latest[symbol] = second
+                if self._in_window(symbol, second):
+                    slot = second % self.window_seconds
+                    seconds[slot] = second
+                    values[slot] = price
+                else:
+                    self._lru[(symbol, second)] = price
+                    self._lru.move_to_end((symbol, second))
+                    if len(self._lru) > self.lru_size:
+                        self._lru.popitem(last=False)
+
+    def get_many(self, *, symbol: str, seconds: Iterable[int]) -> Dict[int, float]:
+        """
+        Gets cached prices for a symbol keyed by epoch second, seconds not cached are left out
+        """
+        found = {}
+        requested = 0
+        with self._lock:
+            ring = self._rings.get(symbol)
+            for second in seconds:
+                requested += 1
+                slot = second % self.window_seconds
+                if ring is not None and ring[0][slot] == second:
+                    found[second] = ring[1][slot]
+                    continue
+                price = self._lru.get((symbol, second))
+                if price is not None:
+                    self._lru.move_to_end((symbol, second))
+                    found[second] = price
+            self.hits += len(found)
+            self.misses += requested - len(found)
+        return found
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns hit/miss counters and current sizes
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "ring_symbols": len(self._rings),
+                "lru_entries": len(self._lru),
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self._rings.clear()
+            self._latest.clear()
+            self._lru.clear()
+
+
+class TtlCache(Generic[V]):
+    """
+    Caches loaded values per key for ttl_seconds. Concurrent misses for the same key are coalesced,
+    only the first caller loads the value while the others wait for its result. Failed loads are not cached.
+    Expired entries are dropped whenever a value is stored, and at most max_entries are kept, evicting the oldest.
+    """
+
+    def __init__(self, *, ttl_seconds: float, max_entries: int, clock: Callable[[], float] = time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Kept in insertion order, which is also expiry order as every entry lives for ttl_seconds
+        self._entries: OrderedDict[Hashable, Tuple[V, float]] = OrderedDict()
+        self._in_flight: Dict[Hashable, Future] = {}
+
+    def get_or_load(self, key: Hashable, load: Callable[[], V]) -> V:
+        """
+        Returns the cached value for key, loading it with load() if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._clock() < entry[1]:
+                self.hits += 1
+                return entry[0]
+            future = self._in_flight.get(key)
+            loading = future is None
+            if loading:
+                self.misses += 1
+                future = self._in_flight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not loading:
+            return future.result()
+
+        try:
+            value = load()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            now = self._clock()
+            self._entries[key] = (value, now + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while self._entries and (len(self._entries) > self.max_entries or next(iter(self._entries.values()))[1] <= now):
+                self._entries.popitem(last=False)
+            del self._in_flight[key]
+        future.set_result(value)
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced, "entries": len(self._entries)}
+
+    def clear(self) -> None:
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.coalesced = 0
+            self._entries.clear()
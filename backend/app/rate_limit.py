@@ -0,0 +1,244 @@
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+ONE_MINUTE_SECONDS = 60
+
+T = TypeVar("T")
+
+
+class WeightLimiter:
+    """
+    Adaptive limiter for per-minute request weight budgets such as Binance's X-MBX-USED-WEIGHT-1M.
+    Requests reserve their weight before being sent, and the weight the server reports as used
+    replaces the local estimate, so usage by other clients sharing the same IP is accounted for.
+    """
+
+    def __init__(
+        self,
+        *,
+        limit_per_minute: int,
+        headroom: float = 0.9,
+        clock: Callable[[], float] = time.time
+    ):
+        self.limit_per_minute = limit_per_minute
+        self.headroom = headroom
+        self.throttled = 0
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._minute = int(clock() // ONE_MINUTE_SECONDS)
+        self._used = 0
+        self._in_flight = 0
+        self._paused_until = 0.0
+
+    def _roll_window(self, now: float) -> None:
+        minute = int(now // ONE_MINUTE_SECONDS)
+        if minute != self._minute:
+            self._minute = minute
+            self._used = 0
+
+    def acquire(self, weight: int) -> None:
+        """
+        Blocks until weight fits in the current minute's budget, then reserves it
+        """
+        budget = self.limit_per_minute * self.headroom
+        with self._condition:
+            while True:
+                now = self._clock()
+                self._roll_window(now)
+                if now >= self._paused_until and self._used + self._in_flight + weight <= budget:
+                    self._in_flight += weight
+                    return
+                self.throttled += 1
+                if now < self._paused_until:
+                    wait_until = self._paused_until
+                else:
+                    wait_until = (self._minute + 1) * ONE_MINUTE_SECONDS
+                self._condition.wait(timeout=wait_until - now)
+
+    def release(self, weight: int, *, used_weight: Optional[int] = None) -> None:
+        """
+        Releases a reservation, recording the used weight the server reported for the current minute if any
+        """
+        with self._condition:
+            self._roll_window(self._clock())
+            self._in_flight = max(self._in_flight - weight, 0)
+            if used_weight is not None:
+                self._used = max(self._used, used_weight)
+            else:
+                self._used += weight
+            self._condition.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        """
+        Stops handing out reservations for the given number of seconds, e.g. after a 429 with Retry-After
+        """
+        with self._condition:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+
+class TokenBucket:
+    """
+    Token bucket limiting requests to rate per second with bursts of up to capacity, shared across threads.
+    A caller that finds the bucket empty reserves its tokens ahead and sleeps until they are due,
+    so waiting callers are served in arrival order.
+    """
+
+    def __init__(
+        self,
+        *,
+        rate: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.throttled = 0
+        self.waiting = 0
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        Takes tokens from the bucket, blocking until they are available and any pause is over. Returns the seconds waited
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            wait = max(-self._tokens / self.rate if self._tokens < 0 else 0.0, self._paused_until - now)
+            if wait:
+                self.throttled += 1
+                self.waiting += 1
+        if wait:
+            try:
+                self._sleep(wait)
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+        return wait
+
+    def pause(self, seconds: float) -> None:
+        """
+        Holds back every caller for the given number of seconds, e.g. after a 429 with Retry-After
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+
+class RateLimitedError(RuntimeError):
+    """
+    Raised by a request when the provider reports it was rate limited, with the seconds to wait if it said so
+    """
+
+    def __init__(self, message: str, *, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a Retry-After header given in seconds, None if missing or an HTTP date
+    """
+    try:
+        return max(float(value), 0.0) if value is not None else None
+    except ValueError:
+        return None
+
+def backoff_seconds(attempt: int, *, base: float, cap: float, rng: Callable[[], float] = random.random) -> float:
+    """
+    Full jitter exponential backoff, a random delay of up to base * 2 ** attempt seconds capped at cap
+    """
+    return rng() * min(cap, base * 2 ** attempt)
+
+
+class ProviderLimiter:
+    """
+    Paces every request to one upstream provider through a shared token bucket and retries requests
+    that were rate limited. The wait before a retry, the provider's Retry-After or a jittered exponential
+    backoff, pauses the whole bucket so concurrent callers back off together instead of failing too.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        rate: float,
+        capacity: Optional[float] = None,
+        max_retries: int = 3,
+        backoff_base_seconds: float = 0.5,
+        backoff_max_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        self.name = name
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.bucket = TokenBucket(rate=rate, capacity=capacity, clock=clock, sleep=sleep)
+        self.requests = 0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+
+    def call(self, request: Callable[[], T], *, tokens: float = 1) -> T:
+        """
+        Sends a request once tokens are available, retrying up to max_retries times while it raises RateLimitedError
+        """
+        attempt = 0
+        while True:
+            self.bucket.acquire(tokens)
+            with self._lock:
+                self.requests += 1
+            try:
+                return request()
+            except RateLimitedError as e:
+                with self._lock:
+                    self.rate_limited += 1
+                if attempt == self.max_retries:
+                    raise
+                delay = e.retry_after if e.retry_after is not None else backoff_seconds(
+                    attempt, base=self.backoff_base_seconds, cap=self.backoff_max_seconds
+                )
+                logger.warning(f"{self.name} rate limited: {e}, retrying in {delay:.2f}s")
+                self.bucket.pause(delay)
+                attempt += 1
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "requests": self.requests,
+            "rate_limited": self.rate_limited,
+            "throttled": self.bucket.throttled,
+            "waiting": self.bucket.waiting,
+        }
+
+
+_provider_limiters: Dict[str, ProviderLimiter] = {}
+_provider_limiters_lock = threading.Lock()
+
+
+def provider_limiter(name: str, *, rate: float, **kwargs) -> ProviderLimiter:
+    """
+    Gets the shared limiter of a provider, creating it with the given settings on first use
+    """
+    with _provider_limiters_lock:
+        limiter = _provider_limiters.get(name)
+        if limiter is None:
+            limiter = _provider_limiters[name] = ProviderLimiter(name, rate=rate, **kwargs)
+        return limiter
+
+def provider_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Gets the request, rate limited, throttled and waiting (queue depth) counts of every provider
+    """
+    with _provider_limiters_lock:
+        return {name: limiter.stats() for name, limiter in _provider_limiters.items()}
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+def fingerprint(*parts: Any) -> str:
+    """
+    Hashes the identity of a request, e.g. provider, method and parameters, into a cache key
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk SQLite cache of upstream responses keyed by request fingerprint, for responses that can no longer change.
+    A response is only admitted once the highest block it covers is finality_depth blocks behind the highest
+    block observed so far, and the least recently used responses are evicted beyond max_bytes.
+    Disabled, caching nothing, when path is None.
+    """
+
+    def __init__(self, *, path: Optional[str], max_bytes: int, finality_depth: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.finality_depth = finality_depth
+        self.head_block = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._size = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS response "
+                "(key TEXT PRIMARY KEY, body BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_response_accessed ON response (accessed)")
+            self._size = connection.execute("SELECT coalesce(sum(size), 0) FROM response").fetchone()[0]
+            self._connection = connection
+        return self._connection
+
+    def observe_head(self, block_number: int) -> None:
+        """
+        Records a block known to exist, advancing the head that finality is measured from
+        """
+        with self._lock:
+            self.head_block = max(self.head_block, block_number)
+
+    def is_final(self, block_number: int) -> bool:
+        return self.head_block > 0 and block_number <= self.head_block - self.finality_depth
+
+    def get(self, key: str) -> Optional[Any]:
+        if self.path is None:
+            return None
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute("SELECT body FROM response WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            connection.execute("UPDATE response SET accessed = ? WHERE key = ?", (time.time(), key))
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key: str, value: Any) -> None:
+        if self.path is None:
+            return
+        body = zlib.compress(json.dumps(value, separators=(",", ":")).encode())
+        with self._lock:
+            connection = self._connect()
+            previous = connection.execute("SELECT size FROM response WHERE key = ?", (key,)).fetchone()
+            connection.execute(
+                "INSERT OR REPLACE INTO response (key, body, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, body, len(body), time.time())
+            )
+            self._size += len(body) - (previous[0] if previous else 0)
+            self._evict(connection)
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        while self._size > self.max_bytes:
+            rows = connection.execute("SELECT key, size FROM response ORDER BY accessed LIMIT 100").fetchall()
+            if not rows:
+                self._size = 0
+                return
+            for key, size in rows:
+                if self._size <= self.max_bytes:
+                    return
+                connection.execute("DELETE FROM response WHERE key = ?", (key,))
+                self._size -= size
+                self.evictions += 1
+
+    def get_or_fetch(self, key: str, *, block_number: int, fetch: Callable[[], T]) -> T:
+        """
+        Returns the cached response for key, otherwise fetches it and caches it if block_number is final
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        value = fetch()
+        if value is not None and self.is_final(block_number):
+            self.put(key, value)
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "bytes": self._size,
+                "head_block": self.head_block,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+response_cache = ResponseCache(
+    path=settings.RESPONSE_CACHE_PATH,
+    max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+    finality_depth=settings.RESPONSE_CACHE_FINALITY_BLOCKS
+)
@@ -0,0 +1,183 @@
+import logging
+from itertools import count
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import httpx
+from sqlmodel import Session
+
+from app import etherscan
+from app.columnar import TransactionBatch, parse_transfer_events
+from app.core.config import settings
+from app.node_health import node_monitor
+from app.rate_limit import RateLimitedError, parse_retry_after, provider_limiter
+from app.response_cache import fingerprint, response_cache
+
+logger = logging.getLogger(__name__)
+
+# keccak256("Swap(address,address,int256,int256,uint160,uint128,int24)"), emitted by Uniswap V3 pools
+SWAP_TOPIC = "0xc42079f94a6350d7e6235f29174924f928cc2ac818eb64fed8004e115fbcca67"
+# Infura's "query returned more than 10000 results"
+LIMIT_EXCEEDED_CODE = -32005
+LIMIT_EXCEEDED_MESSAGES = ("more than", "too large", "too many", "exceed", "limit")
+
+_request_ids = count(1)
+
+infura_rate_limiter = provider_limiter(
+    "infura",
+    rate=settings.INFURA_REQUESTS_PER_SECOND,
+    max_retries=settings.INFURA_MAX_RETRIES,
+    backoff_base_seconds=settings.RATE_LIMIT_BACKOFF_BASE_SECONDS,
+    backoff_max_seconds=settings.RATE_LIMIT_BACKOFF_MAX_SECONDS
+)
+
+
+def _is_limit_exceeded(error: Mapping[str, Any]) -> bool:
+    message = str(error.get("message", "")).lower()
+    return error.get("code") == LIMIT_EXCEEDED_CODE or any(text in message for text in LIMIT_EXCEEDED_MESSAGES)
+
+def _request(method: str, params: List[Any]) -> Dict[str, Any]:
+    return {"jsonrpc": "2.0", "id": next(_request_ids), "method": method, "params": params}
+
+def _post(*, client: httpx.Client, payload: Any, calls: int = 1) -> Any:
+    """
+    Sends a JSON-RPC request or batch to the healthiest endpoint under the shared Infura rate limiter, one token per call,
+    retrying it when rate limited either with a 429 or a rate limit error.
+    """
+    def request() -> Any:
+        response = client.post(node_monitor.endpoint(), json=payload)
+        if response.status_code == 429:
+            raise RateLimitedError("HTTP 429", retry_after=parse_retry_after(response.headers.get("Retry-After")))
+        response.raise_for_status()
+        data = response.json()
+        for item in data if isinstance(data, list) else [data]:
+            message = str((item.get("error") or {}).get("message", ""))
+            if "rate limit" in message.lower():
+                raise RateLimitedError(message)
+        return data
+
+    return infura_rate_limiter.call(request, tokens=calls)
+
+def rpc_batch(
+    *,
+    client: httpx.Client,
+    calls: Sequence[Tuple[str, List[Any]]],
+    block_numbers: Optional[Sequence[Optional[int]]] = None,
+    skip_errors: bool = False
+) -> List[Any]:
+    """
+    Sends the calls as one JSON-RPC batch request and returns their results in call order.
+    When the block number each call is about is given, results are served from and admitted to the response cache,
+    a None block number takes the blockNumber of the result, e.g. for transactions and receipts looked up by hash.
+    Raises ValueError if any call failed, unless skip_errors, in which case the failure is logged and its result is None.
+    """
+    keys = [fingerprint("infura", method, params) for method, params in calls] if block_numbers is not None else [None] * len(calls)
+    results: List[Any] = [response_cache.get(key) if key else None for key in keys]
+    requests = {
+        index: _request(method, params)
+        for index, ((method, params), result) in enumerate(zip(calls, results))
+        if result is None
+    }
+    if not requests:
+        return results
+    responses = {item["id"]: item for item in _post(client=client, payload=list(requests.values()), calls=len(requests))}
+
+    for index, request in requests.items():
+        item = responses.get(request["id"])
+        if item is None or "error" in item:
+            message = f"{request['method']} failed for {request['params']}: {item['error'] if item else 'no response'}"
+            if not skip_errors:
+                raise ValueError(message)
+            logger.warning(message)
+            continue
+        result = results[index] = item["result"]
+        if keys[index] and result is not None:
+            block_number = block_numbers[index]
+            if block_number is None and isinstance(result, dict) and result.get("blockNumber"):
+                block_number = int(result["blockNumber"], 16)
+            if block_number is not None and response_cache.is_final(block_number):
+                response_cache.put(keys[index], result)
+    return results
+
+def get_swap_logs(*, client: httpx.Client, address: str, from_block: int, to_block: int) -> List[Dict[str, Any]]:
+    """
+    Retrieves the Swap logs of a pool over an inclusive block range in ascending order with eth_getLogs.
+    Ranges start at RPC_LOG_BLOCK_RANGE blocks, are halved whenever the node refuses a query as too large
+    and grow back after each successful one. Logs of finalized ranges are kept in the response cache.
+    """
+    logs = []
+    block_range = settings.RPC_LOG_BLOCK_RANGE
+    start_block = from_block
+    while start_block <= to_block:
+        end_block = min(start_block + block_range - 1, to_block)
+        params = [{"address": address.lower(), "topics": [SWAP_TOPIC], "fromBlock": hex(start_block), "toBlock": hex(end_block)}]
+        key = fingerprint("infura", "eth_getLogs", params)
+        result = response_cache.get(key)
+        if result is None:
+            data = _post(client=client, payload=_request("eth_getLogs", params))
+            error = data.get("error")
+            if error is not None:
+                if not _is_limit_exceeded(error) or start_block == end_block:
+                    raise ValueError(f"eth_getLogs failed for blocks {start_block}-{end_block}: {error}")
+                block_range = max((end_block - start_block + 1) // 2, 1)
+                logger.info(f"eth_getLogs over {end_block - start_block + 1} blocks refused, retrying with {block_range}")
+                continue
+            result = data["result"]
+            if response_cache.is_final(end_block):
+                response_cache.put(key, result)
+
+        logs.extend(log for log in result if not log.get("removed"))
+        start_block = end_block + 1
+        block_range = min(block_range * 2, settings.RPC_LOG_BLOCK_RANGE)
+    return logs
+
+def get_swap_transactions(
+    *,
+    client: httpx.Client,
+    session: Session,
+    address: str,
+    from_block: int,
+    to_block: int
+) -> TransactionBatch:
+    """
+    Retrieves the transactions swapping through a pool over a block range from an Ethereum node,
+    priced and with their fees computed as a columnar batch, newest first like etherscan.get_erc20_token_transfer_events.
+    Receipts and block timestamps are fetched in JSON-RPC batches of RPC_BATCH_SIZE calls, finalized ones from the response cache.
+    """
+    response_cache.observe_head(to_block)
+    logs = get_swap_logs(client=client, address=address, from_block=from_block, to_block=to_block)
+    tx_blocks = {log["transactionHash"]: log["blockNumber"] for log in reversed(logs)}
+    tx_hashes = list(tx_blocks)
+    block_numbers = list(dict.fromkeys(tx_blocks.values()))
+
+    batch_size = settings.RPC_BATCH_SIZE
+    receipts = []
+    for start in range(0, len(tx_hashes), batch_size):
+        chunk = tx_hashes[start:start + batch_size]
+        receipts.extend(rpc_batch(
+            client=client,
+            calls=[("eth_getTransactionReceipt", [tx_hash]) for tx_hash in chunk],
+            block_numbers=[int(tx_blocks[tx_hash], 16) for tx_hash in chunk]
+        ))
+    block_timestamps = {}
+    for start in range(0, len(block_numbers), batch_size):
+        chunk = block_numbers[start:start + batch_size]
+        blocks = rpc_batch(
+            client=client,
+            calls=[("eth_getBlockByNumber", [block_number, False]) for block_number in chunk],
+            block_numbers=[int(block_number, 16) for block_number in chunk]
+        )
+        block_timestamps.update((block_number, block["timestamp"]) for block_number, block in zip(chunk, blocks))
+
+    # Same fields as Etherscan tokentx events, as decimal strings
+    events = [
+        {
+            "hash": tx_hash,
+            "blockNumber": str(int(tx_blocks[tx_hash], 16)),
+            "timeStamp": str(int(block_timestamps[tx_blocks[tx_hash]], 16)),
+            "gasUsed": str(int(receipt["gasUsed"], 16)),
+            "gasPrice": str(int(receipt["effectiveGasPrice"], 16)),
+        }
+        for tx_hash, receipt in zip(tx_hashes, receipts)
+    ]
+    logger.info(f"Fetched {len(logs)} swap logs from {len(tx_hashes)} transactions in {len(block_numbers)} blocks")
+    return etherscan.build_transactions(session=session, events=parse_transfer_events(events))
@@ -3,10 +3,12 @@ import schedule
 import time
 import threading
 from datetime import datetime, timedelta, timezone
+import numpy as np
 from sqlmodel import Session
-from app import binance, etherscan, crud
+from app import binance, etherscan, crud, rpc_logs
 from app.core.db import engine
 from app.core.config import settings
+from app.columnar import ONE_SECOND_MS
 
 def long_running_task(client: httpx.Client):
     with Session(engine) as session:
@@ -21,25 +23,57 @@ def update_price_and_transactions(session: Session, client: httpx.Client, end_ti
     last_update_spot_price = crud.get_lastupdate_spot_price(session=session)
     spot_price_update_start_time = last_update_spot_price.timestamp + timedelta(seconds=1) if last_update_spot_price else end_time - timedelta(minutes=5)
 
-    binance.batch_save_ethusdt_price(session=session, start_time=spot_price_update_start_time, end_time=end_time)
-    crud.update_lastupdate_spot_price(session=session, end_time=end_time)
-
     last_update_transaction = crud.get_lastupdate_transaction(session=session)
     transaction_update_start_time = last_update_transaction.timestamp + timedelta(seconds=1) if last_update_transaction else end_time - timedelta(minutes=5)
 
-    starting_block = etherscan.get_block_no_by_timestamp(client=client, timestamp=int(transaction_update_start_time.timestamp()))
-    ending_block = etherscan.get_block_no_by_timestamp(client=client, timestamp=int(end_time.timestamp()))
+    # Make sure monthly partitions exist for the whole window and the upcoming months
+    crud.ensure_monthly_partitions(
+        session=session,
+        start_time=min(spot_price_update_start_time, transaction_update_start_time),
+        end_time=end_time + timedelta(days=31 * settings.PARTITION_PREMAKE_MONTHS)
+    )
+
+    # Advances the spot price last update as each chunk is committed, the kline stream does this itself in websocket mode
+    if settings.SPOT_PRICE_INGESTION == "rest":
+        binance.batch_save_ethusdt_price(session=session, start_time=spot_price_update_start_time, end_time=end_time)
+
+    # Continue from the block after the last one ingested, only resolving the start from its timestamp the first time
+    if last_update_transaction and last_update_transaction.block_number is not None:
+        starting_block = last_update_transaction.block_number + 1
+    else:
+        starting_block = etherscan.resolve_block_no(
+            client=client, session=session, timestamp=int(transaction_update_start_time.timestamp()), bound="start"
+        )
+    ending_block = etherscan.resolve_block_no(client=client, session=session, timestamp=int(end_time.timestamp()), bound="end")
 
-    transactions = etherscan.get_erc20_token_transfer_events(
+    if settings.TRANSACTION_INGESTION == "rpc":
+        transactions = rpc_logs.get_swap_transactions(
             client=client,
             session=session,
             address=settings.UNISWAP_V3_ETH_USDC_ADDRESS,
             from_block=starting_block,
             to_block=ending_block
         )
+    else:
+        transactions = etherscan.get_erc20_token_transfer_events(
+            client=client,
+            session=session,
+            address=settings.UNISWAP_V3_ETH_USDC_ADDRESS,
+            from_block=starting_block,
+            to_block=ending_block
+        )
+
+    crud.insert_transaction_rows(session=session, rows=transactions.to_rows())
 
-    crud.insert_transactions(session=session, transactions_create=transactions)
-    crud.update_lastupdate_transaction(session=session, end_time=end_time)
+    # Stop the watermark before the earliest event that could not be priced, so the next cycle retries from it
+    last_block = max(ending_block, starting_block - 1)
+    if transactions.unpriced is not None and len(transactions.unpriced):
+        earliest = int(np.argmin(transactions.unpriced.block_numbers))
+        last_block = int(transactions.unpriced.block_numbers[earliest]) - 1
+        end_time = datetime.fromtimestamp(
+            int(transactions.unpriced.timestamps_ms[earliest]) / ONE_SECOND_MS, tz=timezone.utc
+        ) - timedelta(seconds=1)
+    crud.update_lastupdate_transaction(session=session, end_time=end_time, block_number=last_block)
 
 
 def run_continuously(interval=1):
@@ -1,12 +1,20 @@
+import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import patch
 
+from app import binance
 from app.main import app
 from app.core.config import settings
 from app.models import SpotPricePublic
 
 client = TestClient(app)
 
+@pytest.fixture(autouse=True)
+def clear_ticker_cache():
+    binance.ticker_cache.clear()
+    yield
+    binance.ticker_cache.clear()
+
 def test_get_prices_success():
     symbol = "ETHUSDT"
     mock_response = SpotPricePublic(symbol=symbol, timestamp="2025-02-04T08:37:22.801Z", price=3000.0)
@@ -32,4 +40,14 @@ def test_get_prices_internal_server_error():
     with patch("app.binance.get_ticker_current_price", side_effect=Exception("Internal Server Error")):
         response = client.get(f"{settings.API_V1_STR}/prices/{symbol}")
         assert response.status_code == 500
-        assert response.json()["detail"] == "Internal Server Error"
\ No newline at end of file
+        assert response.json()["detail"] == "Internal Server Error"
+
+def test_get_prices_cached():
+    symbol = "ETHUSDT"
+    mock_response = SpotPricePublic(symbol=symbol, timestamp="2025-02-04T08:37:22.801Z", price=3000.0)
+
+    with patch("app.binance.get_ticker_current_price", return_value=mock_response) as get_ticker_current_price:
+        for _ in range(3):
+            response = client.get(f"{settings.API_V1_STR}/prices/{symbol.lower()}")
+            assert response.status_code == 200
+        get_ticker_current_price.assert_called_once_with(symbol=symbol)
@@ -8,7 +8,7 @@ from sqlmodel import Session
 
 from app.main import app
 from app.core.config import settings
-from app.models import TransactionsPublic, TransactionPublic
+from app.models import TransactionsPublic, TransactionPublic, TransactionFeeStatsPublic, TransactionFeeStatPublic
 from app.api.deps import HttpClientDep, SessionDep
 
 client = TestClient(app)
@@ -101,4 +101,37 @@ def test_get_transactions_connection_error(db_session: Session, mock_client) ->
     with patch("app.web3.get_eth_transaction_details", side_effect=ConnectionError("Connection Error")):
         response = mock_client.get(f"{settings.API_V1_STR}/transactions/")
         assert response.status_code == 500
-        assert response.json()["detail"] == "Connection Error"
\ No newline at end of file
+        assert response.json()["detail"] == "Connection Error"
+
+def test_get_transactions_invalid_cursor(db_session: Session, mock_client) -> None:
+    response = mock_client.get(f"{settings.API_V1_STR}/transactions/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+def test_get_transaction_stats(db_session: Session, mock_client) -> None:
+    bucket = datetime(2025, 2, 4, 8, tzinfo=timezone.utc)
+    mock_response = TransactionFeeStatsPublic(
+        resolution="hour",
+        data=[
+            TransactionFeeStatPublic(
+                bucket=bucket,
+                count=4,
+                total_fee_usdt=40.0,
+                avg_fee_usdt=10.0,
+                total_fee_eth=0.04,
+                avg_fee_eth=0.01,
+                avg_gas_used=21000.0
+            )
+        ]
+    )
+
+    with patch("app.crud.get_fee_stats", return_value=mock_response) as get_fee_stats:
+        response = mock_client.get(f"{settings.API_V1_STR}/transactions/stats", params={"resolution": "hour"})
+        assert response.status_code == 200
+        stats = response.json()
+        assert stats["resolution"] == "hour"
+        assert stats["data"][0]["count"] == 4
+        assert get_fee_stats.call_args.kwargs["resolution"] == "hour"
+
+def test_get_transaction_stats_invalid_resolution(db_session: Session, mock_client) -> None:
+    response = mock_client.get(f"{settings.API_V1_STR}/transactions/stats", params={"resolution": "week"})
+    assert response.status_code == 422
@@ -2,16 +2,25 @@ from uuid import uuid4
 import pytest
 from datetime import datetime, timezone
 from unittest.mock import MagicMock, patch
-from sqlmodel import Session
+from sqlmodel import Session, select
+from sqlalchemy.dialects import postgresql
 
 from app.crud import (
+    _estimate_count,
     get_transactions,
+    get_fee_stats,
+    encode_transaction_cursor,
+    decode_transaction_cursor,
     insert_transactions,
+    insert_transaction_rows,
     get_spot_price,
     get_spot_prices,
-    insert_spot_prices
+    get_spot_price_map,
+    copy_spot_prices,
+    ensure_monthly_partitions,
+    detach_monthly_partition
 )
-from app.models import Transaction, TransactionCreate, SpotPrice, SpotPriceCreate, TransactionsPublic
+from app.models import Transaction, TransactionCreate, TransactionFeeRollup, TransactionsPublic
 
 @pytest.fixture
 def mock_session():
@@ -51,6 +60,110 @@ def test_get_transactions(mock_session):
     assert result.count == 1
     assert result.data[0].tx_hash == "0x123"
 
+def test_transaction_cursor_roundtrip():
+    transaction = Transaction(
+        id=uuid4(),
+        tx_hash="0x123",
+        timestamp=datetime(2025, 2, 4, 8, 37, 22, 801000, tzinfo=timezone.utc),
+        txn_fee_usdt=10.0,
+        gas_used=21000,
+        gas_price_wei=1000000000,
+        txn_fee_eth=0.01,
+        eth_usdt_price=1000.0
+    )
+
+    cursor = encode_transaction_cursor(transaction=transaction)
+
+    assert decode_transaction_cursor(cursor=cursor) == (transaction.timestamp, transaction.id)
+
+def test_decode_transaction_cursor_invalid():
+    with pytest.raises(ValueError):
+        decode_transaction_cursor(cursor="not-a-cursor")
+
+def test_get_transactions_with_cursor(mock_session):
+    timestamp = datetime.now(tz=timezone.utc)
+    mock_transactions = [
+        Transaction(
+            id=uuid4(),
+            tx_hash=f"0x{i}",
+            timestamp=timestamp,
+            txn_fee_usdt=10.0,
+            gas_used=21000,
+            gas_price_wei=1000000000,
+            txn_fee_eth=0.01,
+            eth_usdt_price=1000.0
+        )
+        for i in range(2)
+    ]
+    mock_session.exec.return_value.all.return_value = mock_transactions
+    mock_session.exec.return_value.one.return_value = 10
+    cursor = encode_transaction_cursor(transaction=mock_transactions[0])
+
+    result = get_transactions(session=mock_session, cursor=cursor, limit=2)
+
+    page_statement = mock_session.exec.call_args_list[-1].args[0]
+    assert page_statement._offset_clause is None
+    assert len(result.data) == 2
+    assert result.next_cursor == encode_transaction_cursor(transaction=mock_transactions[-1])
+
+def test_get_transactions_maintained_count(mock_session):
+    start_time = datetime(2025, 2, 4, 8, 30, tzinfo=timezone.utc)
+    end_time = datetime(2025, 2, 4, 12, 15, tzinfo=timezone.utc)
+    mock_session.exec.return_value.all.return_value = []
+    mock_session.exec.return_value.one.side_effect = [100, 7, 3]
+
+    result = get_transactions(session=mock_session, start_time=start_time, end_time=end_time, count_strategy="maintained")
+
+    bucket_statement = mock_session.exec.call_args_list[0].args[0]
+    bucket_params = {k: v for k, v in bucket_statement.compile().params.items() if k.startswith("bucket")}
+    assert bucket_params == {
+        "bucket_1": datetime(2025, 2, 4, 9, tzinfo=timezone.utc),
+        "bucket_2": datetime(2025, 2, 4, 12, tzinfo=timezone.utc),
+    }
+    assert result.count == 110
+    assert result.count_strategy == "maintained"
+
+def test_get_transactions_maintained_count_with_tx_hashes_is_exact(mock_session):
+    mock_session.exec.return_value.all.return_value = []
+    mock_session.exec.return_value.one.return_value = 1
+
+    result = get_transactions(session=mock_session, tx_hashes=["0x123"], count_strategy="maintained")
+
+    assert result.count == 1
+    assert result.count_strategy == "exact"
+
+def test_get_transactions_estimated_count(mock_session):
+    mock_session.exec.return_value.all.return_value = []
+    mock_session.connection.return_value.exec_driver_sql.return_value.scalar.return_value = [{"Plan": {"Plan Rows": 1200000}}]
+
+    with patch("app.crud.Select.compile", return_value=MagicMock(params={})):
+        result = get_transactions(session=mock_session, count_strategy="estimated")
+
+    assert result.count == 1200000
+    assert result.count_strategy == "estimated"
+
+def test_get_transactions_estimated_count_with_tx_hashes_is_exact(mock_session):
+    mock_session.get_bind.return_value.dialect = postgresql.psycopg.dialect()
+    mock_session.exec.return_value.one.return_value = 2
+    mock_session.exec.return_value.all.return_value = []
+
+    result = get_transactions(session=mock_session, tx_hashes=["0x1", "0x2"], count_strategy="estimated")
+
+    assert result.count == 2
+    assert result.count_strategy == "exact"
+    mock_session.connection.return_value.exec_driver_sql.assert_not_called()
+
+def test_estimate_count_renders_expanding_parameters(mock_session):
+    mock_session.get_bind.return_value.dialect = postgresql.psycopg.dialect()
+    mock_session.connection.return_value.exec_driver_sql.return_value.scalar.return_value = [{"Plan": {"Plan Rows": 2}}]
+    statement = select(Transaction).where(Transaction.tx_hash.in_(["0x1", "0x2"]))
+
+    assert _estimate_count(session=mock_session, statement=statement) == 2
+
+    sql, params = mock_session.connection.return_value.exec_driver_sql.call_args.args
+    assert "POSTCOMPILE" not in sql
+    assert sorted(params.values()) == ["0x1", "0x2"]
+
 def test_insert_transactions(mock_session):
     transactions_create = [
         TransactionCreate(
@@ -74,7 +187,7 @@ def test_insert_transactions(mock_session):
         txn_fee_eth=0.01,
         eth_usdt_price=1000.0
     )
-    mock_session.exec.return_value = None
+    mock_session.exec.return_value.scalars.return_value.all.return_value = [mock_transaction.id]
     mock_session.commit.return_value = None
     mock_session.rollback.return_value = None
 
@@ -84,17 +197,132 @@ def test_insert_transactions(mock_session):
     assert len(result) == 1
     assert result[0].tx_hash == "0x123"
 
+def test_insert_transactions_chunks_and_skips_conflicts(mock_session):
+    transactions_create = [
+        TransactionCreate(
+            tx_hash=f"0x{i}",
+            timestamp=datetime.now(tz=timezone.utc),
+            txn_fee_usdt=10.0,
+            gas_used=21000,
+            gas_price_wei=1000000000,
+            txn_fee_eth=0.01,
+            eth_usdt_price=1000.0
+        )
+        for i in range(5)
+    ]
+    inserted_hashes = {"0x0", "0x3", "0x4"}
+
+    def exec_side_effect(stmt):
+        params = stmt.compile().params
+        ids = [v for k, v in params.items() if k.startswith("id_m")]
+        hashes = [v for k, v in params.items() if k.startswith("tx_hash_m")]
+        result = MagicMock()
+        result.scalars.return_value.all.return_value = [i for i, h in zip(ids, hashes) if h in inserted_hashes]
+        return result
+
+    mock_session.exec.side_effect = exec_side_effect
+
+    result = insert_transactions(session=mock_session, transactions_create=transactions_create, chunk_size=2)
+
+    assert mock_session.commit.call_count == 3
+    assert [tx.tx_hash for tx in result] == ["0x0", "0x3", "0x4"]
+
+def test_insert_transaction_rows(mock_session):
+    timestamp = datetime(2025, 2, 4, 8, 37, 22, tzinfo=timezone.utc)
+    rows = [
+        {
+            "id": uuid4(),
+            "tx_hash": f"0x{i}",
+            "timestamp": timestamp,
+            "txn_fee_usdt": 10.0,
+            "gas_used": 21000,
+            "gas_price_wei": 1000000000,
+            "txn_fee_eth": 0.01,
+            "eth_usdt_price": 1000.0
+        }
+        for i in range(3)
+    ]
+    mock_session.exec.return_value.scalars.return_value.all.side_effect = [[rows[0]["id"], rows[1]["id"]], [], [], []]
+
+    inserted = insert_transaction_rows(session=mock_session, rows=rows, chunk_size=2)
+
+    assert inserted == 2
+    assert mock_session.commit.call_count == 2
+
+def test_insert_transactions_updates_fee_rollups(mock_session):
+    timestamp = datetime(2025, 2, 4, 8, 37, 22, tzinfo=timezone.utc)
+    transactions_create = [
+        TransactionCreate(
+            tx_hash=f"0x{i}",
+            timestamp=timestamp,
+            txn_fee_usdt=10.0,
+            gas_used=21000,
+            gas_price_wei=1000000000,
+            txn_fee_eth=0.01,
+            eth_usdt_price=1000.0
+        )
+        for i in range(2)
+    ]
+    statements = []
+
+    def exec_side_effect(stmt):
+        statements.append(stmt)
+        params = stmt.compile().params
+        result = MagicMock()
+        result.scalars.return_value.all.return_value = [v for k, v in params.items() if k.startswith("id_m")]
+        return result
+
+    mock_session.exec.side_effect = exec_side_effect
+
+    insert_transactions(session=mock_session, transactions_create=transactions_create)
+
+    rollup_statement = next(stmt for stmt in statements if stmt.table.name == "transactionfeerollup")
+    params = rollup_statement.compile().params
+    rollups = {
+        params[f"resolution_m{i}"]: (params[f"bucket_m{i}"], params[f"count_m{i}"], params[f"txn_fee_usdt_sum_m{i}"])
+        for i in range(3)
+    }
+    assert rollups == {
+        "minute": (datetime(2025, 2, 4, 8, 37, tzinfo=timezone.utc), 2, 20.0),
+        "hour": (datetime(2025, 2, 4, 8, tzinfo=timezone.utc), 2, 20.0),
+        "day": (datetime(2025, 2, 4, tzinfo=timezone.utc), 2, 20.0),
+    }
+
+def test_get_fee_stats(mock_session):
+    bucket = datetime(2025, 2, 4, 8, tzinfo=timezone.utc)
+    mock_session.exec.return_value.all.return_value = [
+        TransactionFeeRollup(
+            resolution="hour",
+            bucket=bucket,
+            count=4,
+            txn_fee_usdt_sum=40.0,
+            txn_fee_eth_sum=0.04,
+            gas_used_sum=84000
+        )
+    ]
+
+    result = get_fee_stats(session=mock_session, resolution="hour", start_time=bucket, end_time=bucket)
+
+    assert result.resolution == "hour"
+    assert len(result.data) == 1
+    assert result.data[0].count == 4
+    assert result.data[0].total_fee_usdt == 40.0
+    assert result.data[0].avg_fee_usdt == 10.0
+    assert result.data[0].avg_gas_used == 21000
+
+MINUTE_MS = 1738658220000  # 2025-02-04 08:37:00 UTC
+
+def minute_row(**prices_by_second):
+    prices = [None] * 60
+    for second, price in prices_by_second.items():
+        prices[int(second.lstrip("s"))] = price
+    return prices
+
 def test_get_spot_price(mock_session):
     symbol = "ETH"
-    timestamp = datetime.now(tz=timezone.utc)
+    timestamp = datetime(2025, 2, 4, 8, 37, 22, tzinfo=timezone.utc)
 
-    mock_spot_price = SpotPrice(
-        id=1,
-        symbol=symbol,
-        timestamp=timestamp,
-        price=1000.0
-    )
-    mock_session.exec.return_value.first.return_value = mock_spot_price
+    mock_session.exec.return_value.all.return_value = [(MINUTE_MS, minute_row(s22=1000.0))]
 
     result = get_spot_price(session=mock_session, symbol=symbol, timestamp=timestamp)
 
@@ -104,44 +332,122 @@ def test_get_spot_price(mock_session):
 
 def test_get_spot_prices(mock_session):
     symbol = "ETH"
-    timestamps = [datetime.now(tz=timezone.utc)]
+    timestamps = [
+        datetime(2025, 2, 4, 8, 37, 22, tzinfo=timezone.utc),
+        datetime(2025, 2, 4, 8, 37, 23, tzinfo=timezone.utc),
+    ]
 
-    mock_spot_price = SpotPrice(
-        id=1,
-        symbol=symbol,
-        timestamp=timestamps[0],
-        price=1000.0
-    )
-    mock_session.exec.return_value.all.return_value = [mock_spot_price]
+    mock_session.exec.return_value.all.return_value = [(MINUTE_MS, minute_row(s22=1000.0))]
 
     result = get_spot_prices(session=mock_session, symbol=symbol, timestamps=timestamps)
 
     assert len(result) == 1
     assert result[0].symbol == "ETH"
+    assert result[0].timestamp == timestamps[0]
     assert result[0].price == 1000.0
 
-def test_insert_spot_prices(mock_session):
-    spot_prices_create = [
-        SpotPriceCreate(
-            symbol="ETH",
-            timestamp=datetime.now(tz=timezone.utc),
-            price=1000.0
-        )
+def test_get_spot_price_map(mock_session):
+    mock_session.exec.return_value.all.return_value = [(MINUTE_MS, minute_row(s22=1000.0, s59=1001.0))]
+
+    result = get_spot_price_map(
+        session=mock_session,
+        symbol="ETH",
+        timestamps_ms=[MINUTE_MS + 23000, MINUTE_MS + 22000, MINUTE_MS + 22000, MINUTE_MS + 59000, MINUTE_MS + 60000]
+    )
+
+    params = mock_session.exec.call_args.args[0].compile().params
+    assert params["minutes"] == [
+        datetime(2025, 2, 4, 8, 37, tzinfo=timezone.utc),
+        datetime(2025, 2, 4, 8, 38, tzinfo=timezone.utc),
     ]
+    assert result == {MINUTE_MS + 22000: 1000.0, MINUTE_MS + 59000: 1001.0}
 
-    mock_spot_price = SpotPrice(
-        id=1,
+def test_get_spot_price_map_as_of_earlier_second(mock_session):
+    mock_session.exec.return_value.all.return_value = [(MINUTE_MS, minute_row(s22=1000.0, s59=1001.0))]
+
+    result = get_spot_price_map(
+        session=mock_session,
         symbol="ETH",
-        timestamp=datetime.now(tz=timezone.utc),
-        price=1000.0
+        timestamps_ms=[MINUTE_MS + 30000, MINUTE_MS + 60000 + 9000, MINUTE_MS + 60000 + 10000],
+        tolerance_ms=10000
     )
-    mock_session.exec.return_value = None
-    mock_session.commit.return_value = None
-    mock_session.rollback.return_value = None
 
-    with patch("app.crud.SpotPrice.model_validate", return_value=mock_spot_price):
-        result = insert_spot_prices(session=mock_session, spot_prices_create=spot_prices_create)
+    params = mock_session.exec.call_args.args[0].compile().params
+    assert params["minutes"] == [
+        datetime(2025, 2, 4, 8, 37, tzinfo=timezone.utc),
+        datetime(2025, 2, 4, 8, 38, tzinfo=timezone.utc),
+    ]
+    # 8:37:30 as of 8:37:22, 8:38:09 as of 8:37:59 across the minute, 8:38:10 is 11s past it
+    assert result == {MINUTE_MS + 30000: 1000.0, MINUTE_MS + 60000 + 9000: 1001.0}
 
-    assert len(result) == 1
-    assert result[0].symbol == "ETH"
-    assert result[0].price == 1000.0
\ No newline at end of file
+def test_get_spot_price_map_empty(mock_session):
+    assert get_spot_price_map(session=mock_session, symbol="ETH", timestamps_ms=[]) == {}
+    mock_session.exec.assert_not_called()
+
+def test_copy_spot_prices(mock_session):
+    spot_prices = [
+        ("ETHUSDT", MINUTE_MS + 22000, 3000.0),
+        ("ETHUSDT", MINUTE_MS + 23000, 3001.5),
+        ("ETHUSDT", MINUTE_MS + 60000, 3002.0),
+    ]
+    cursor = mock_session.connection.return_value.connection.driver_connection.cursor.return_value.__enter__.return_value
+    copy = cursor.copy.return_value.__enter__.return_value
+    cursor.rowcount = 2
+
+    result = copy_spot_prices(session=mock_session, spot_prices=spot_prices)
+
+    assert result == 2
+    written = [call.args[0] for call in copy.write_row.call_args_list]
+    assert written == [
+        ("ETHUSDT", datetime(2025, 2, 4, 8, 37, tzinfo=timezone.utc), minute_row(s22=3000.0, s23=3001.5)),
+        ("ETHUSDT", datetime(2025, 2, 4, 8, 38, tzinfo=timezone.utc), minute_row(s0=3002.0)),
+    ]
+    assert "ON CONFLICT (symbol, timestamp) DO UPDATE" in cursor.execute.call_args_list[-1].args[0]
+    mock_session.commit.assert_called_once()
+
+def test_copy_spot_prices_empty(mock_session):
+    assert copy_spot_prices(session=mock_session, spot_prices=[]) == 0
+    mock_session.connection.assert_not_called()
+
+def test_ensure_monthly_partitions(mock_session):
+    mock_session.exec.return_value.scalars.return_value.all.return_value = ["transaction_default", "transaction_p2025_01", "spotpriceminute_default"]
+    mock_session.exec.return_value.scalar.return_value = False
+
+    created = ensure_monthly_partitions(
+        session=mock_session,
+        start_time=datetime(2025, 1, 15, tzinfo=timezone.utc),
+        end_time=datetime(2025, 2, 10, tzinfo=timezone.utc)
+    )
+
+    assert created == ["transaction_p2025_02", "spotpriceminute_p2025_01", "spotpriceminute_p2025_02"]
+    mock_session.commit.assert_called_once()
+    assert "pg_advisory_xact_lock" in str(mock_session.exec.call_args_list[2].args[0])
+
+def test_ensure_monthly_partitions_rechecks_under_lock(mock_session):
+    # Another caller creates transaction_p2025_02 between the first check and taking the lock
+    partitions = [["transaction_p2025_01"], ["spotpriceminute_p2025_01"], ["transaction_p2025_01", "transaction_p2025_02"], ["spotpriceminute_p2025_01"]]
+    with patch("app.crud.get_partitions", side_effect=partitions):
+        created = ensure_monthly_partitions(
+            session=mock_session,
+            start_time=datetime(2025, 1, 15, tzinfo=timezone.utc),
+            end_time=datetime(2025, 2, 10, tzinfo=timezone.utc)
+        )
+
+    assert created == ["spotpriceminute_p2025_02"]
+
+def test_ensure_monthly_partitions_skips_lock_when_none_missing(mock_session):
+    mock_session.exec.return_value.scalars.return_value.all.return_value = ["transaction_p2025_01", "spotpriceminute_p2025_01"]
+
+    created = ensure_monthly_partitions(
+        session=mock_session,
+        start_time=datetime(2025, 1, 1, tzinfo=timezone.utc),
+        end_time=datetime(2025, 1, 31, tzinfo=timezone.utc)
+    )
+
+    assert created == []
+    assert mock_session.exec.call_count == 2
+    mock_session.commit.assert_not_called()
+
+def test_detach_monthly_partition_unknown_table(mock_session):
+    with pytest.raises(ValueError):
+        detach_monthly_partition(session=mock_session, table="lastupdate", month=datetime(2025, 1, 1, tzinfo=timezone.utc))
@@ -0,0 +1,197 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import ANY, MagicMock, patch
+import pytest
+from binance.error import ClientError
+
+from app import binance
+
+MINUTE_MS = 1738658220000  # 2025-02-04 08:37:00 UTC
+
+
+@pytest.fixture(autouse=True)
+def clear_price_cache():
+    binance.price_cache.clear()
+    yield
+    binance.price_cache.clear()
+
+def test_get_ethusdt_price_uses_cache_before_db():
+    binance.cache_prices(symbol=binance.ETH_USDT_SYMBOL, prices={MINUTE_MS: 3000.0})
+
+    with patch("app.binance.crud.get_spot_price_map") as get_spot_price_map:
+        prices = binance.get_ethusdt_price(session=MagicMock(), timestamps_ms=[MINUTE_MS])
+
+    assert prices == {MINUTE_MS: 3000.0}
+    get_spot_price_map.assert_not_called()
+
+def test_get_ethusdt_price_caches_db_prices():
+    with patch("app.binance.crud.get_spot_price_map", return_value={MINUTE_MS: 3000.0}) as get_spot_price_map:
+        binance.get_ethusdt_price(session=MagicMock(), timestamps_ms=[MINUTE_MS])
+        prices = binance.get_ethusdt_price(session=MagicMock(), timestamps_ms=[MINUTE_MS])
+
+    assert prices == {MINUTE_MS: 3000.0}
+    assert get_spot_price_map.call_count == 1
+    assert get_spot_price_map.call_args.kwargs["tolerance_ms"] == binance.settings.PRICE_AS_OF_TOLERANCE_SECONDS * 1000
+
+def test_get_ethusdt_price_fetches_and_caches_missing_prices():
+    klines = [[MINUTE_MS, "3000.0"], [MINUTE_MS + 1000, "3001.0"]]
+
+    with (
+        patch("app.binance.crud.get_spot_price_map", return_value={}),
+        patch("app.binance.crud.copy_spot_prices") as copy_spot_prices,
+        patch.object(binance.kline_client, "klines", return_value={"limit_usage": {}, "data": klines}),
+    ):
+        prices = binance.get_ethusdt_price(session=MagicMock(), timestamps_ms=[MINUTE_MS, MINUTE_MS + 1000])
+
+    assert prices == {MINUTE_MS: 3000.0, MINUTE_MS + 1000: 3001.0}
+    copy_spot_prices.assert_called_once()
+    assert binance.get_cached_prices(symbol=binance.ETH_USDT_SYMBOL, timestamps_ms=[MINUTE_MS + 1000]) == {MINUTE_MS + 1000: 3001.0}
+
+def test_get_kline_windows():
+    windows = binance.get_kline_windows(start_time_ms=0, end_time_ms=2500 * 1000)
+
+    assert windows == [(0, 999000), (1000000, 1999000), (2000000, 2500000)]
+
+def test_iter_kline_chunks_keeps_window_order():
+    def klines(symbol, interval, startTime, endTime, limit):
+        time.sleep(random.uniform(0, 0.01))
+        return {"limit_usage": {"x-mbx-used-weight-1m": "10"}, "data": [[startTime, "1.0"]]}
+
+    client = MagicMock()
+    client.klines.side_effect = klines
+    windows = binance.get_kline_windows(start_time_ms=0, end_time_ms=50 * 1000 * 1000)
+
+    chunks = list(binance.iter_kline_chunks(symbol=binance.ETH_USDT_SYMBOL, windows=windows, client=client))
+
+    assert [chunk[0][0] for chunk in chunks] == [start for start, _ in windows]
+
+def test_fetch_kline_window_retries_when_rate_limited():
+    client = MagicMock()
+    client.klines.side_effect = [
+        ClientError(429, -1003, "Too many requests", {"Retry-After": "0"}),
+        {"limit_usage": {}, "data": [[MINUTE_MS, "3000.0"]]},
+    ]
+
+    klines = binance._fetch_kline_window(client=client, symbol=binance.ETH_USDT_SYMBOL, start_time_ms=MINUTE_MS, end_time_ms=MINUTE_MS)
+
+    assert klines == [[MINUTE_MS, "3000.0"]]
+    assert client.klines.call_count == 2
+
+def test_fetch_kline_window_pauses_weight_budget_for_retry_after():
+    client = MagicMock()
+    client.klines.side_effect = [
+        ClientError(429, -1003, "Too many requests", {"Retry-After": "0"}),
+        {"limit_usage": {}, "data": [[MINUTE_MS, "3000.0"]]},
+    ]
+
+    with patch.object(binance.kline_weight_limiter, "pause") as pause:
+        binance._fetch_kline_window(client=client, symbol=binance.ETH_USDT_SYMBOL, start_time_ms=MINUTE_MS, end_time_ms=MINUTE_MS)
+
+    pause.assert_called_once_with(0.0)
+
+def test_plan_kline_windows_covers_sparse_timestamps():
+    one_week_ms = 7 * 24 * 60 * 60 * 1000
+    timestamps_ms = [MINUTE_MS + one_week_ms, MINUTE_MS, MINUTE_MS + 5000, MINUTE_MS + 999000, MINUTE_MS + 1000000]
+
+    windows = binance.plan_kline_windows(timestamps_ms=timestamps_ms)
+
+    assert windows == [
+        (MINUTE_MS, MINUTE_MS + 999000),
+        (MINUTE_MS + 1000000, MINUTE_MS + 1000000),
+        (MINUTE_MS + one_week_ms, MINUTE_MS + one_week_ms),
+    ]
+
+def test_plan_kline_windows_with_lookback():
+    windows = binance.plan_kline_windows(timestamps_ms=[MINUTE_MS, MINUTE_MS + 30000, MINUTE_MS + 2000000], lookback_ms=60000)
+
+    assert windows == [(MINUTE_MS - 60000, MINUTE_MS + 30000), (MINUTE_MS + 1940000, MINUTE_MS + 2000000)]
+
+def test_get_ethusdt_price_resolves_missing_seconds_as_of_earlier_price():
+    klines = [[MINUTE_MS - 5000, "2999.0"], [MINUTE_MS + 2000, "3002.0"]]
+
+    with (
+        patch("app.binance.crud.get_spot_price_map", return_value={}),
+        patch("app.binance.crud.copy_spot_prices") as copy_spot_prices,
+        patch.object(binance.kline_client, "klines", return_value={"limit_usage": {}, "data": klines}) as get_klines,
+    ):
+        timestamps_ms = [MINUTE_MS, MINUTE_MS + 2000, MINUTE_MS + 4000]
+        prices = binance.get_ethusdt_price(session=MagicMock(), timestamps_ms=timestamps_ms, tolerance_ms=10000)
+
+    assert prices == {MINUTE_MS: 2999.0, MINUTE_MS + 2000: 3002.0, MINUTE_MS + 4000: 3002.0}
+    assert binance.get_cached_prices(symbol=binance.ETH_USDT_SYMBOL, timestamps_ms=timestamps_ms) == {MINUTE_MS + 2000: 3002.0}
+    assert get_klines.call_count == 1
+    assert get_klines.call_args.kwargs["startTime"] == MINUTE_MS - 10000
+    assert [open_time for _, open_time, _ in copy_spot_prices.call_args.kwargs["spot_prices"]] == [MINUTE_MS - 5000, MINUTE_MS + 2000]
+
+def test_get_ethusdt_price_leaves_out_prices_beyond_tolerance():
+    with (
+        patch("app.binance.crud.get_spot_price_map", return_value={}),
+        patch("app.binance.crud.copy_spot_prices"),
+        patch.object(binance.kline_client, "klines", return_value={"limit_usage": {}, "data": [[MINUTE_MS - 20000, "2999.0"]]}),
+    ):
+        prices = binance.get_ethusdt_price(session=MagicMock(), timestamps_ms=[MINUTE_MS], tolerance_ms=10000)
+
+    assert prices == {}
+
+def test_get_ethusdt_price_fetches_only_planned_windows():
+    one_week_ms = 7 * 24 * 60 * 60 * 1000
+    client = MagicMock()
+    client.klines.side_effect = lambda symbol, interval, startTime, endTime, limit: {"limit_usage": {}, "data": [[startTime, "3000.0"]]}
+
+    with (
+        patch("app.binance.crud.get_spot_price_map", return_value={}),
+        patch("app.binance.crud.copy_spot_prices"),
+        patch.object(binance, "kline_client", client),
+    ):
+        prices = binance.get_ethusdt_price(session=MagicMock(), timestamps_ms=[MINUTE_MS, MINUTE_MS + one_week_ms])
+
+    assert prices == {MINUTE_MS: 3000.0, MINUTE_MS + one_week_ms: 3000.0}
+    assert client.klines.call_count == 2
+
+def test_batch_save_ethusdt_price_advances_watermark_per_chunk():
+    client = MagicMock()
+    client.klines.side_effect = lambda symbol, interval, startTime, endTime, limit: {"limit_usage": {}, "data": [[startTime, "3000.0"]]}
+    start_time = datetime.fromtimestamp(MINUTE_MS / 1000, tz=timezone.utc)
+    end_time = start_time + timedelta(seconds=2999)
+
+    with (
+        patch("app.binance.crud.copy_spot_prices") as copy_spot_prices,
+        patch("app.binance.crud.update_lastupdate_spot_price") as update_lastupdate_spot_price,
+        patch.object(binance, "kline_client", client),
+        patch.object(binance.settings, "SPOT_PRICE_BACKFILL_CHUNK_WINDOWS", 2),
+    ):
+        binance.batch_save_ethusdt_price(session=MagicMock(), start_time=start_time, end_time=end_time)
+
+    assert [c.kwargs["spot_prices"] for c in copy_spot_prices.call_args_list] == [
+        [(binance.ETH_USDT_SYMBOL, MINUTE_MS, 3000.0), (binance.ETH_USDT_SYMBOL, MINUTE_MS + 1000000, 3000.0)],
+        [(binance.ETH_USDT_SYMBOL, MINUTE_MS + 2000000, 3000.0)],
+    ]
+    assert [c.kwargs["end_time"] for c in update_lastupdate_spot_price.call_args_list] == [
+        start_time + timedelta(seconds=1999),
+        end_time,
+    ]
+    assert binance.get_cached_prices(symbol=binance.ETH_USDT_SYMBOL, timestamps_ms=[MINUTE_MS + 2000000]) == {MINUTE_MS + 2000000: 3000.0}
+
+def test_batch_save_ethusdt_price_keeps_committed_chunks_on_failure():
+    def klines(symbol, interval, startTime, endTime, limit):
+        if startTime > MINUTE_MS:
+            raise ClientError(400, -1121, "Invalid symbol.", {})
+        return {"limit_usage": {}, "data": [[startTime, "3000.0"]]}
+
+    client = MagicMock()
+    client.klines.side_effect = klines
+    start_time = datetime.fromtimestamp(MINUTE_MS / 1000, tz=timezone.utc)
+
+    with (
+        patch("app.binance.crud.copy_spot_prices") as copy_spot_prices,
+        patch("app.binance.crud.update_lastupdate_spot_price") as update_lastupdate_spot_price,
+        patch.object(binance, "kline_client", client),
+        patch.object(binance.settings, "SPOT_PRICE_BACKFILL_CHUNK_WINDOWS", 1),
+        patch.object(binance.settings, "BINANCE_KLINE_CONCURRENCY", 1),
+        pytest.raises(ClientError),
+    ):
+        binance.batch_save_ethusdt_price(session=MagicMock(), start_time=start_time, end_time=start_time + timedelta(seconds=2999))
+
+    assert copy_spot_prices.call_count == 1
+    update_lastupdate_spot_price.assert_called_once_with(session=ANY, end_time=start_time + timedelta(seconds=999))
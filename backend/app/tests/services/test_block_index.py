@@ -0,0 +1,36 @@
+from app.block_index import BlockIndex
+
+TIMESTAMP = 1738658219  # 2025-02-04 08:36:59 UTC
+
+
+def test_block_index_resolves_known_blocks():
+    index = BlockIndex(max_gap_blocks=64)
+    index.add([(100, TIMESTAMP), (101, TIMESTAMP + 12), (101, TIMESTAMP + 99)])
+
+    assert len(index) == 2
+    assert index.resolve(TIMESTAMP, bound="start") == 100
+    assert index.resolve(TIMESTAMP + 11, bound="start") == 100
+    assert index.resolve(TIMESTAMP + 12, bound="end") == 101
+    assert index.hits == 3
+
+def test_block_index_widens_bounds_between_known_blocks():
+    index = BlockIndex(max_gap_blocks=64)
+    index.add([(100, TIMESTAMP), (110, TIMESTAMP + 120)])
+
+    assert index.resolve(TIMESTAMP + 60, bound="start") == 100
+    assert index.resolve(TIMESTAMP + 60, bound="end") == 109
+    assert index.resolve(TIMESTAMP + 1, bound="end") == 109
+    assert index.resolve(TIMESTAMP + 119, bound="start") == 100
+    assert index.resolve(TIMESTAMP + 120, bound="start") == 110
+
+def test_block_index_misses_outside_known_range_and_wide_gaps():
+    index = BlockIndex(max_gap_blocks=64)
+    assert index.resolve(TIMESTAMP, bound="start") is None
+
+    index.add([(100, TIMESTAMP), (200, TIMESTAMP + 1200), (201, TIMESTAMP + 1212)])
+
+    assert index.resolve(TIMESTAMP - 1, bound="start") is None
+    assert index.resolve(TIMESTAMP + 600, bound="start") is None
+    assert index.resolve(TIMESTAMP + 1213, bound="end") is None
+    assert index.resolve(TIMESTAMP + 1212, bound="end") == 201
+    assert index.misses == 4
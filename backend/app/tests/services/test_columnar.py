@@ -0,0 +1,78 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from app.columnar import PriceIndex, concat_transfer_events, dedupe_transfer_events, join_prices, parse_klines, parse_transfer_events, price_transfer_events
+
+TIMESTAMP = 1738658220  # 2025-02-04 08:37:00 UTC
+
+
+def transfer_event(tx_hash: str, timestamp: int, gas_used: int = 21000, gas_price: int = 2_000_000_000) -> dict:
+    return {"hash": tx_hash, "blockNumber": str(timestamp // 12), "timeStamp": str(timestamp), "gasUsed": str(gas_used), "gasPrice": str(gas_price)}
+
+def test_parse_klines():
+    batch = parse_klines([[TIMESTAMP * 1000, "3000.5", "3001.0"], [TIMESTAMP * 1000 + 1000, "3001.25", "3002.0"]])
+
+    assert batch.open_times_ms.tolist() == [TIMESTAMP * 1000, TIMESTAMP * 1000 + 1000]
+    assert batch.to_spot_prices(symbol="ETHUSDT") == [
+        ("ETHUSDT", TIMESTAMP * 1000, 3000.5),
+        ("ETHUSDT", TIMESTAMP * 1000 + 1000, 3001.25),
+    ]
+    assert batch.select(batch.open_prices > 3001.0).to_price_map() == {TIMESTAMP * 1000 + 1000: 3001.25}
+
+def test_join_prices_marks_missing_prices():
+    timestamps_ms = np.array([3000, 1000, 2000, 4000], dtype=np.int64)
+
+    prices = join_prices(timestamps_ms=timestamps_ms, prices={3000: 3.0, 1000: 1.0, 4000: 4.0})
+
+    assert prices[[0, 1, 3]].tolist() == [3.0, 1.0, 4.0]
+    assert np.isnan(prices[2])
+
+def test_price_index_as_of_lookup():
+    index = PriceIndex({5000: 5.0, 1000: 1.0, 2000: 2.0})
+
+    prices = index.lookup(np.array([500, 1000, 1500, 3500, 4000, 9000], dtype=np.int64), tolerance_ms=2000)
+
+    assert np.isnan(prices[0])
+    assert prices[1:5].tolist() == [1.0, 1.0, 2.0, 2.0]
+    assert np.isnan(prices[5])
+    assert np.isnan(PriceIndex({}).lookup(np.array([1000], dtype=np.int64), tolerance_ms=2000)[0])
+
+def test_price_transfer_events_computes_fees():
+    batch = concat_transfer_events([
+        parse_transfer_events([transfer_event("0xa", TIMESTAMP)]),
+        parse_transfer_events([transfer_event("0xb", TIMESTAMP + 1, gas_used=100000, gas_price=30_000_000_000)]),
+    ])
+
+    rows = price_transfer_events(batch=batch, prices={TIMESTAMP * 1000: 3000.0, (TIMESTAMP + 1) * 1000: 2000.0}).to_rows()
+
+    assert [row["tx_hash"] for row in rows] == ["0xa", "0xb"]
+    assert rows[0]["id"] != rows[1]["id"]
+    assert rows[0]["timestamp"] == datetime.fromtimestamp(TIMESTAMP, tz=timezone.utc)
+    assert rows[0]["txn_fee_eth"] == pytest.approx(21000 * 2e9 / 1e18)
+    assert rows[0]["txn_fee_usdt"] == pytest.approx(21000 * 2e9 * 3000.0 / 1e18)
+    assert rows[1]["gas_price_wei"] == 30_000_000_000
+    assert rows[1]["eth_usdt_price"] == 2000.0
+    assert rows[1]["txn_fee_usdt"] == pytest.approx(100000 * 30e9 * 2000.0 / 1e18)
+
+def test_price_transfer_events_requires_prices():
+    batch = parse_transfer_events([transfer_event("0xa", TIMESTAMP)])
+
+    with pytest.raises(ValueError, match="Missing ETHUSDT price for 1 events"):
+        price_transfer_events(batch=batch, prices={})
+
+def test_dedupe_transfer_events_keeps_first_event_per_hash():
+    batch = parse_transfer_events([
+        transfer_event("0xb", TIMESTAMP + 1),
+        transfer_event("0xa", TIMESTAMP),
+        transfer_event("0xb", TIMESTAMP + 1),
+        transfer_event("0xc", TIMESTAMP),
+        transfer_event("0xa", TIMESTAMP),
+    ])
+
+    unique = dedupe_transfer_events(batch)
+
+    assert unique.tx_hashes.tolist() == ["0xb", "0xa", "0xc"]
+    assert unique.timestamps_ms.tolist() == [(TIMESTAMP + 1) * 1000, TIMESTAMP * 1000, TIMESTAMP * 1000]
+    assert dedupe_transfer_events(unique) is unique
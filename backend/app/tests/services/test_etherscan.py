@@ -0,0 +1,179 @@
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from app import etherscan
+from app.block_index import BlockIndex
+from app.models import BlockTimestamp
+from app.rate_limit import ProviderLimiter, RateLimitedError
+
+TIMESTAMP = 1738658220  # 2025-02-04 08:37:00 UTC
+
+
+def transfer_event(tx_hash: str, block: int) -> dict:
+    return {"hash": tx_hash, "blockNumber": str(block), "timeStamp": str(TIMESTAMP + block), "gasUsed": "21000", "gasPrice": "2000000000"}
+
+class FakeEtherscan:
+    """
+    Serves tokentx pages from a fixed list of events, enforcing the page * offset result cap
+    """
+
+    def __init__(self, events: list, max_results: int):
+        self.events = events
+        self.max_results = max_results
+        self.requests = []
+
+    def get(self, url: str) -> MagicMock:
+        query = {key: value[0] for key, value in parse_qs(urlparse(url).query).items()}
+        page, offset = int(query["page"]), int(query["offset"])
+        self.requests.append((int(query["startblock"]), int(query["endblock"]), page))
+        response = MagicMock()
+        if page * offset > self.max_results:
+            response.json.return_value = {"status": "0", "message": "NOTOK", "result": "Result window is too large"}
+            return response
+
+        matching = [
+            event for event in self.events
+            if int(query["startblock"]) <= int(event["blockNumber"]) <= int(query["endblock"])
+        ]
+        results = matching[(page - 1) * offset:page * offset]
+        response.json.return_value = {"status": "1" if results else "0", "result": results}
+        return response
+
+@pytest.fixture
+def small_pages():
+    with (
+        patch.object(etherscan.settings, "ETHERSCAN_PAGE_SIZE", 2),
+        patch.object(etherscan.settings, "ETHERSCAN_BLOCKS_PER_WINDOW", 10),
+        patch.object(etherscan, "MAX_RESULTS_PER_QUERY", 4),
+    ):
+        yield
+
+def test_get_block_windows():
+    assert etherscan.get_block_windows(from_block=100, to_block=124, blocks_per_window=10) == [(100, 109), (110, 119), (120, 124)]
+
+def test_get_erc20_token_transfer_events_pages_and_prices_events(small_pages):
+    client = FakeEtherscan([transfer_event("0xa", 100), transfer_event("0xb", 101)], max_results=4)
+
+    with patch("app.etherscan.get_ethusdt_price", return_value={(TIMESTAMP + 100) * 1000: 3000.0, (TIMESTAMP + 101) * 1000: 3001.0}) as get_ethusdt_price:
+        transactions = etherscan.get_erc20_token_transfer_events(
+            client=client, session=MagicMock(), address="0xpool", from_block=100, to_block=105
+        )
+
+    assert get_ethusdt_price.call_args.kwargs["timestamps_ms"] == [(TIMESTAMP + 101) * 1000, (TIMESTAMP + 100) * 1000]
+    assert [(row["tx_hash"], row["eth_usdt_price"]) for row in transactions.to_rows()] == [("0xb", 3001.0), ("0xa", 3000.0)]
+
+def test_get_erc20_token_transfer_events_fetches_past_result_cap(small_pages):
+    # 3 events per block over blocks 100-123, so each 10 block window holds more than the 4 result cap
+    events = [transfer_event(f"0x{block}{i}", block) for block in range(100, 124) for i in range(3)]
+    client = FakeEtherscan(events, max_results=4)
+
+    with patch("app.etherscan.get_ethusdt_price", side_effect=lambda session, timestamps_ms: {ts: 3000.0 for ts in timestamps_ms}):
+        transactions = etherscan.get_erc20_token_transfer_events(
+            client=client, session=MagicMock(), address="0xpool", from_block=100, to_block=123
+        )
+
+    assert [row["tx_hash"] for row in transactions.to_rows()] == [event["hash"] for event in reversed(events)]
+    assert {(start, end) for start, end, _ in client.requests} >= {(100, 109), (110, 119), (120, 123)}
+
+def test_get_erc20_token_transfer_events_raises_on_error_result(small_pages):
+    client = MagicMock()
+    client.get.return_value.json.return_value = {"status": "0", "message": "NOTOK", "result": "Invalid API Key"}
+
+    with pytest.raises(ValueError, match="Invalid API Key"):
+        etherscan.get_erc20_token_transfer_events(client=client, session=MagicMock(), address="0xpool", from_block=100, to_block=105)
+
+@pytest.fixture
+def block_index():
+    with patch.object(etherscan, "block_index", BlockIndex(max_gap_blocks=64)) as block_index:
+        yield block_index
+
+def test_resolve_block_no_uses_index_then_db_then_etherscan(block_index):
+    client = MagicMock()
+    client.get.return_value.json.return_value = {"status": "1", "result": "300"}
+    block_index.add([(100, TIMESTAMP + 100), (101, TIMESTAMP + 112)])
+    stored = [
+        BlockTimestamp(block_number=150, timestamp=datetime.fromtimestamp(TIMESTAMP + 700, tz=timezone.utc)),
+        BlockTimestamp(block_number=151, timestamp=datetime.fromtimestamp(TIMESTAMP + 712, tz=timezone.utc)),
+    ]
+
+    with patch("app.etherscan.crud.get_block_timestamps_around", side_effect=[stored, []]) as get_block_timestamps_around:
+        assert etherscan.resolve_block_no(client=client, session=MagicMock(), timestamp=TIMESTAMP + 105, bound="start") == 100
+        get_block_timestamps_around.assert_not_called()
+        assert etherscan.resolve_block_no(client=client, session=MagicMock(), timestamp=TIMESTAMP + 705, bound="start") == 150
+        client.get.assert_not_called()
+        assert etherscan.resolve_block_no(client=client, session=MagicMock(), timestamp=TIMESTAMP + 2000, bound="end") == 300
+
+    assert "getblocknobytime" in client.get.call_args.args[0]
+    assert len(block_index) == 4
+
+def test_get_erc20_token_transfer_events_records_block_timestamps(small_pages, block_index):
+    client = FakeEtherscan([transfer_event("0xa", 100), transfer_event("0xb", 100), transfer_event("0xc", 102)], max_results=4)
+
+    with (
+        patch("app.etherscan.get_ethusdt_price", side_effect=lambda session, timestamps_ms: {ts: 3000.0 for ts in timestamps_ms}),
+        patch("app.etherscan.crud.insert_block_timestamps") as insert_block_timestamps,
+    ):
+        etherscan.get_erc20_token_transfer_events(client=client, session=MagicMock(), address="0xpool", from_block=100, to_block=105)
+
+    assert insert_block_timestamps.call_args.kwargs["block_timestamps"] == [
+        (100, datetime.fromtimestamp(TIMESTAMP + 100, tz=timezone.utc)),
+        (102, datetime.fromtimestamp(TIMESTAMP + 102, tz=timezone.utc)),
+    ]
+    assert block_index.resolve(TIMESTAMP + 102, bound="end") == 102
+
+def test_get_erc20_token_transfer_events_drops_repeated_hashes(small_pages, block_index):
+    client = FakeEtherscan([transfer_event("0xa", 100), transfer_event("0xa", 100), transfer_event("0xb", 101)], max_results=4)
+    etherscan.transfer_event_stats.clear()
+
+    with patch("app.etherscan.get_ethusdt_price", side_effect=lambda session, timestamps_ms: {ts: 3000.0 for ts in timestamps_ms}) as get_ethusdt_price:
+        transactions = etherscan.get_erc20_token_transfer_events(
+            client=client, session=MagicMock(), address="0xpool", from_block=100, to_block=105
+        )
+
+    assert [row["tx_hash"] for row in transactions.to_rows()] == ["0xb", "0xa"]
+    assert get_ethusdt_price.call_args.kwargs["timestamps_ms"] == [(TIMESTAMP + 101) * 1000, (TIMESTAMP + 100) * 1000]
+    assert etherscan.transfer_event_stats.stats() == {"events": 3, "duplicates": 1, "duplicate_ratio": pytest.approx(1 / 3)}
+
+def test_get_erc20_token_transfer_events_skips_unpriced_events(small_pages, block_index):
+    client = FakeEtherscan([transfer_event("0xa", 100), transfer_event("0xb", 101), transfer_event("0xc", 102)], max_results=4)
+
+    with patch("app.etherscan.get_ethusdt_price", return_value={(TIMESTAMP + 100) * 1000: 3000.0, (TIMESTAMP + 102) * 1000: 3002.0}):
+        transactions = etherscan.get_erc20_token_transfer_events(
+            client=client, session=MagicMock(), address="0xpool", from_block=100, to_block=105
+        )
+
+    assert [row["tx_hash"] for row in transactions.to_rows()] == ["0xc", "0xa"]
+    assert transactions.eth_usdt_prices.tolist() == [3002.0, 3000.0]
+    assert transactions.unpriced.tx_hashes.tolist() == ["0xb"]
+
+def test_get_block_no_by_timestamp_retries_when_rate_limited():
+    waits = []
+    limiter = ProviderLimiter("etherscan", rate=100.0, max_retries=2, sleep=waits.append)
+    client = MagicMock()
+    client.get.side_effect = [
+        MagicMock(status_code=429, headers={"Retry-After": "2"}),
+        MagicMock(status_code=200, **{"json.return_value": {"status": "0", "message": "NOTOK", "result": "Max rate limit reached"}}),
+        MagicMock(status_code=200, **{"json.return_value": {"status": "1", "result": "300"}}),
+    ]
+
+    with patch.object(etherscan, "etherscan_rate_limiter", limiter):
+        assert etherscan.get_block_no_by_timestamp(client=client, timestamp=TIMESTAMP) == 300
+
+    assert client.get.call_count == 3
+    assert waits[0] == pytest.approx(2.0, abs=0.1)
+    assert limiter.stats()["rate_limited"] == 2
+
+def test_get_block_no_by_timestamp_gives_up_after_max_retries():
+    client = MagicMock()
+    client.get.return_value = MagicMock(status_code=429, headers={"Retry-After": "0"})
+
+    with (
+        patch.object(etherscan, "etherscan_rate_limiter", ProviderLimiter("etherscan", rate=100.0, max_retries=1)),
+        pytest.raises(RateLimitedError),
+    ):
+        etherscan.get_block_no_by_timestamp(client=client, timestamp=TIMESTAMP)
+
+    assert client.get.call_count == 2
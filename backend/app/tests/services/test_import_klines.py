@@ -0,0 +1,56 @@
+import zipfile
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from app import import_klines
+
+DAY_START_MS = 1735689600000  # 2025-01-01 00:00:00 UTC
+
+
+def write_archive(directory: Path, name: str, open_times_ms: list, header: bool = True) -> Path:
+    lines = ["open_time,open,high,low,close,volume\n"] if header else []
+    # Archives from 2025 on carry open times in epoch microseconds
+    lines += [f"{open_time * 1000},{3000 + i}.5,0,0,0,0\n" for i, open_time in enumerate(open_times_ms)]
+    path = directory / name
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(name.replace(".zip", ".csv"), "".join(lines))
+    return path
+
+def test_get_archive_range():
+    assert import_klines.get_archive_range(Path("ETHUSDT-1s-2024-12.zip")) == (
+        "ETHUSDT", datetime(2024, 12, 1, tzinfo=timezone.utc), datetime(2025, 1, 1, tzinfo=timezone.utc)
+    )
+    assert import_klines.get_archive_range(Path("ETHUSDT-1s-2025-01-31.csv")) == (
+        "ETHUSDT", datetime(2025, 1, 31, tzinfo=timezone.utc), datetime(2025, 2, 1, tzinfo=timezone.utc)
+    )
+    assert import_klines.get_archive_range(Path("ETHUSDT-1m-2025-01.zip")) is None
+
+def test_import_archive_loads_only_incomplete_minutes(tmp_path):
+    path = write_archive(tmp_path, "ETHUSDT-1s-2025-01-01.zip", [DAY_START_MS, DAY_START_MS + 1000, DAY_START_MS + 60000, DAY_START_MS + 120000])
+
+    with (
+        patch("app.import_klines.crud.get_complete_spot_price_minutes", return_value={DAY_START_MS + 60000}),
+        patch("app.import_klines.crud.copy_spot_price_minutes", side_effect=lambda session, minute_rows: len(list(minute_rows))) as copy_spot_price_minutes,
+    ):
+        written = import_klines.import_archive(session=MagicMock(), path=path, rows_per_chunk=3)
+
+    assert written == 2
+    minute_rows = [row for c in copy_spot_price_minutes.call_args_list for row in c.kwargs["minute_rows"]]
+    assert [(symbol, minute, prices[:2]) for symbol, minute, prices in minute_rows] == [
+        ("ETHUSDT", datetime(2025, 1, 1, 0, 0, tzinfo=timezone.utc), [3000.5, 3001.5]),
+        ("ETHUSDT", datetime(2025, 1, 1, 0, 2, tzinfo=timezone.utc), [3003.5, None]),
+    ]
+
+def test_import_archive_skips_complete_ranges(tmp_path):
+    path = write_archive(tmp_path, "ETHUSDT-1s-2025-01-01.zip", [DAY_START_MS])
+    complete_minutes = {DAY_START_MS + minute * 60000 for minute in range(24 * 60)}
+
+    with (
+        patch("app.import_klines.crud.get_complete_spot_price_minutes", return_value=complete_minutes),
+        patch("app.import_klines.crud.copy_spot_price_minutes") as copy_spot_price_minutes,
+    ):
+        written = import_klines.import_archive(session=MagicMock(), path=path)
+
+    assert written == 0
+    copy_spot_price_minutes.assert_not_called()
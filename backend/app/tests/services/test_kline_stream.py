@@ -0,0 +1,150 @@
+import json
+import threading
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+from websockets.sync.server import serve
+
+from app import binance
+from app.kline_stream import KlineStreamIngester
+
+MINUTE_MS = 1738658220000  # 2025-02-04 08:37:00 UTC
+
+
+def kline_message(open_time_ms: int, price: str, closed: bool = True) -> str:
+    return json.dumps({
+        "e": "kline",
+        "s": binance.ETH_USDT_SYMBOL,
+        "k": {"t": open_time_ms, "T": open_time_ms + 999, "i": "1s", "o": price, "c": price, "x": closed},
+    })
+
+
+@pytest.fixture(autouse=True)
+def clear_price_cache():
+    binance.price_cache.clear()
+    yield
+    binance.price_cache.clear()
+
+@pytest.fixture
+def stream_server():
+    """
+    Local stand-in for the Binance stream, each connection sends the next list of messages then closes
+    """
+    connections = []
+    paths = []
+
+    def handler(websocket):
+        paths.append(websocket.request.path)
+        messages = connections.pop(0) if connections else []
+        for message in messages:
+            websocket.send(message)
+        if not connections:
+            threading.Event().wait(0.5)
+
+    with serve(handler, "127.0.0.1", 0) as server:
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield f"ws://127.0.0.1:{server.socket.getsockname()[1]}", connections, paths
+        server.shutdown()
+
+def run_ingester(url: str, last_update_ms: int, until, backfill=None):
+    last_update = MagicMock(timestamp=datetime.fromtimestamp(last_update_ms / 1000, tz=timezone.utc))
+    ingester = KlineStreamIngester(stream_url=url, session_factory=MagicMock, flush_seconds=0.05, batch_size=2, max_reconnect_seconds=0.05)
+    with (
+        patch("app.kline_stream.crud.get_lastupdate_spot_price", return_value=last_update),
+        patch("app.kline_stream.crud.copy_spot_prices") as copy_spot_prices,
+        patch("app.kline_stream.crud.update_lastupdate_spot_price") as update_lastupdate_spot_price,
+        patch("app.kline_stream.binance.batch_save_ethusdt_price", side_effect=backfill) as batch_save_ethusdt_price,
+    ):
+        ingester.start()
+        for _ in range(100):
+            if until(copy_spot_prices, batch_save_ethusdt_price):
+                break
+            threading.Event().wait(0.05)
+        ingester.stop()
+    return ingester, copy_spot_prices, update_lastupdate_spot_price, batch_save_ethusdt_price
+
+def written(copy_spot_prices) -> list:
+    return [spot_price for c in copy_spot_prices.call_args_list for spot_price in c.kwargs["spot_prices"]]
+
+def test_kline_stream_writes_closed_klines_in_batches(stream_server):
+    url, connections, paths = stream_server
+    connections.append([
+        kline_message(MINUTE_MS, "3000.0"),
+        kline_message(MINUTE_MS + 1000, "3001.5", closed=False),
+        kline_message(MINUTE_MS + 1000, "3001.0"),
+        kline_message(MINUTE_MS + 2000, "3002.0"),
+    ])
+
+    ingester, copy_spot_prices, update_lastupdate_spot_price, batch_save_ethusdt_price = run_ingester(
+        url, MINUTE_MS - 1000, until=lambda copy, _: len(written(copy)) == 3
+    )
+
+    assert paths[0] == "/ws/ethusdt@kline_1s"
+    assert written(copy_spot_prices) == [
+        (binance.ETH_USDT_SYMBOL, MINUTE_MS, 3000.0),
+        (binance.ETH_USDT_SYMBOL, MINUTE_MS + 1000, 3001.0),
+        (binance.ETH_USDT_SYMBOL, MINUTE_MS + 2000, 3002.0),
+    ]
+    assert update_lastupdate_spot_price.call_args.kwargs["end_time"] == datetime.fromtimestamp((MINUTE_MS + 2000) / 1000, tz=timezone.utc)
+    assert binance.get_cached_prices(symbol=binance.ETH_USDT_SYMBOL, timestamps_ms=[MINUTE_MS + 1000]) == {MINUTE_MS + 1000: 3001.0}
+    batch_save_ethusdt_price.assert_not_called()
+
+def test_kline_stream_reconnects_and_backfills_gap(stream_server):
+    url, connections, _ = stream_server
+    connections.append([kline_message(MINUTE_MS, "3000.0")])
+    connections.append([kline_message(MINUTE_MS, "3000.0"), kline_message(MINUTE_MS + 5000, "3005.0")])
+
+    ingester, copy_spot_prices, _, batch_save_ethusdt_price = run_ingester(
+        url, MINUTE_MS - 1000, until=lambda copy, backfill: len(written(copy)) == 2 and backfill.called
+    )
+
+    assert ingester.connections >= 2
+    assert written(copy_spot_prices) == [
+        (binance.ETH_USDT_SYMBOL, MINUTE_MS, 3000.0),
+        (binance.ETH_USDT_SYMBOL, MINUTE_MS + 5000, 3005.0),
+    ]
+    batch_save_ethusdt_price.assert_called_once()
+    assert batch_save_ethusdt_price.call_args.kwargs["start_time"] == datetime.fromtimestamp((MINUTE_MS + 1000) / 1000, tz=timezone.utc)
+    assert batch_save_ethusdt_price.call_args.kwargs["end_time"] == datetime.fromtimestamp((MINUTE_MS + 4000) / 1000, tz=timezone.utc)
+
+def test_kline_stream_backfills_from_last_update_on_startup(stream_server):
+    url, connections, _ = stream_server
+    connections.append([kline_message(MINUTE_MS, "3000.0")])
+
+    ingester, _, _, batch_save_ethusdt_price = run_ingester(
+        url, MINUTE_MS - 60000, until=lambda copy, backfill: len(written(copy)) == 1 and backfill.called
+    )
+
+    assert ingester.backfills == 1
+    assert batch_save_ethusdt_price.call_args.kwargs["start_time"] == datetime.fromtimestamp((MINUTE_MS - 59000) / 1000, tz=timezone.utc)
+
+def test_kline_stream_keeps_reading_and_holds_last_update_during_backfill(stream_server):
+    url, connections, _ = stream_server
+    connections.append([kline_message(MINUTE_MS, "3000.0"), kline_message(MINUTE_MS + 1000, "3001.0")])
+    backfilling = threading.Event()
+    release = threading.Event()
+
+    def backfill(**kwargs):
+        backfilling.set()
+        release.wait(5)
+
+    def until(copy, _):
+        # The stream keeps writing while the backfill is blocked, then the backfill is let through
+        if len(written(copy)) == 2 and backfilling.is_set():
+            release.set()
+        return release.is_set()
+
+    ingester, copy_spot_prices, update_lastupdate_spot_price, batch_save_ethusdt_price = run_ingester(
+        url, MINUTE_MS - 60000, until=until, backfill=backfill
+    )
+
+    assert written(copy_spot_prices) == [
+        (binance.ETH_USDT_SYMBOL, MINUTE_MS, 3000.0),
+        (binance.ETH_USDT_SYMBOL, MINUTE_MS + 1000, 3001.0),
+    ]
+    batch_save_ethusdt_price.assert_called_once()
+    assert [c.kwargs["end_time"] for c in update_lastupdate_spot_price.call_args_list] == [
+        datetime.fromtimestamp((MINUTE_MS + 1000) / 1000, tz=timezone.utc)
+    ]
@@ -0,0 +1,99 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+
+from app.node_health import NodeHealthMonitor
+from app.response_cache import ResponseCache
+
+
+@pytest.fixture
+def rpc_nodes():
+    """
+    Two local JSON-RPC stand-ins answering eth_blockNumber with their entry in blocks, or a 503 when it is None
+    """
+    blocks = [100, 100]
+    servers = []
+
+    for index in range(len(blocks)):
+        class Handler(BaseHTTPRequestHandler):
+            node = index
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                block = blocks[self.node]
+                body = json.dumps({"jsonrpc": "2.0", "id": request["id"], "result": hex(block) if block else None}).encode()
+                self.send_response(200 if block is not None else 503)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+
+    yield [f"http://127.0.0.1:{server.server_address[1]}" for server in servers], blocks
+    for server in servers:
+        server.shutdown()
+
+def monitor_for(urls, latencies=None):
+    """
+    Monitor whose probes take the given latency per endpoint, in order, by faking the clock
+    """
+    ticks = iter(tick for latency in (latencies or [0.01] * len(urls)) * 100 for tick in (0.0, latency))
+    return NodeHealthMonitor(endpoints=urls, interval_seconds=0.01, timeout_seconds=1.0, clock=lambda: next(ticks))
+
+def test_node_health_prefers_fastest_in_sync_endpoint(rpc_nodes):
+    urls, blocks = rpc_nodes
+    monitor = monitor_for(urls, latencies=[0.2, 0.05])
+
+    assert monitor.endpoint() == urls[0]
+    with patch("app.node_health.response_cache", ResponseCache(path=None, max_bytes=0, finality_depth=64)) as cache:
+        monitor.probe_all()
+        assert monitor.endpoint() == urls[1]
+        assert cache.head_block == 100
+
+        blocks[1] = 90
+        monitor.probe_all()
+
+    assert monitor.endpoint() == urls[0]
+    assert monitor.stats()[urls[1]]["block_number"] == 90
+
+def test_node_health_fails_over_when_endpoint_is_down(rpc_nodes):
+    urls, blocks = rpc_nodes
+    monitor = monitor_for(urls)
+
+    blocks[0] = None
+    monitor.probe_all()
+
+    assert monitor.is_healthy()
+    assert monitor.endpoint() == urls[1]
+    assert monitor.stats()[urls[0]] | {"latency_seconds": None} == {
+        "healthy": False, "current": False, "block_number": None, "latency_seconds": None, "probes": 1, "failures": 1
+    }
+
+    blocks[1] = None
+    monitor.probe_all()
+
+    assert not monitor.is_healthy()
+    assert monitor.endpoint() == urls[1]
+
+def test_node_health_probes_in_background(rpc_nodes):
+    urls, _ = rpc_nodes
+    monitor = NodeHealthMonitor(endpoints=urls[:1], interval_seconds=0.01, timeout_seconds=1.0)
+
+    monitor.start()
+    for _ in range(100):
+        if monitor.stats()[urls[0]]["probes"] >= 2:
+            break
+        threading.Event().wait(0.01)
+    monitor.stop()
+
+    assert monitor.stats()[urls[0]]["probes"] >= 2
+    assert monitor.stats()[urls[0]]["latency_seconds"] > 0
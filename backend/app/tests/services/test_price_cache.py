@@ -0,0 +1,102 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.price_cache import PriceCache, TtlCache
+
+
+def test_ring_buffer_hits_and_misses():
+    cache = PriceCache(window_seconds=10, lru_size=10)
+    cache.put_many(symbol="ETHUSDT", prices=[(100, 3000.0), (101, 3001.0)])
+
+    result = cache.get_many(symbol="ETHUSDT", seconds=[100, 101, 102])
+
+    assert result == {100: 3000.0, 101: 3001.0}
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+def test_ring_buffer_slot_reuse_does_not_return_stale_price():
+    cache = PriceCache(window_seconds=10, lru_size=10)
+    cache.put_many(symbol="ETHUSDT", prices=[(100, 3000.0)])
+    cache.put_many(symbol="ETHUSDT", prices=[(110, 3010.0)])
+
+    assert cache.get_many(symbol="ETHUSDT", seconds=[100, 110]) == {110: 3010.0}
+
+def test_older_seconds_go_to_bounded_lru():
+    cache = PriceCache(window_seconds=10, lru_size=2)
+    cache.put_many(symbol="ETHUSDT", prices=[(1000, 3000.0)])
+    cache.put_many(symbol="ETHUSDT", prices=[(1, 1.0), (2, 2.0)])
+    cache.get_many(symbol="ETHUSDT", seconds=[1])
+    cache.put_many(symbol="ETHUSDT", prices=[(3, 3.0)])
+
+    assert cache.get_many(symbol="ETHUSDT", seconds=[1, 2, 3, 1000]) == {1: 1.0, 3: 3.0, 1000: 3000.0}
+    assert cache.stats()["lru_entries"] == 2
+
+def test_symbols_are_cached_separately():
+    cache = PriceCache(window_seconds=10, lru_size=10)
+    cache.put_many(symbol="ETHUSDT", prices=[(100, 3000.0)])
+
+    assert cache.get_many(symbol="BTCUSDT", seconds=[100]) == {}
+
+def test_ttl_cache_expires_entries():
+    now = [0.0]
+    cache = TtlCache(ttl_seconds=1.0, max_entries=10, clock=lambda: now[0])
+    loads = []
+
+    def load():
+        loads.append(now[0])
+        return len(loads)
+
+    assert cache.get_or_load("ETHUSDT", load) == 1
+    now[0] = 0.5
+    assert cache.get_or_load("ETHUSDT", load) == 1
+    now[0] = 1.0
+    assert cache.get_or_load("ETHUSDT", load) == 2
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+def test_ttl_cache_drops_expired_entries_and_caps_size():
+    now = [0.0]
+    cache = TtlCache(ttl_seconds=1.0, max_entries=2, clock=lambda: now[0])
+
+    for symbol in ["A", "B", "C"]:
+        cache.get_or_load(symbol, lambda: symbol)
+    assert cache.stats()["entries"] == 2
+    assert cache.get_or_load("B", lambda: "reloaded") == "B"
+    assert cache.get_or_load("A", lambda: "reloaded") == "reloaded"
+
+    now[0] = 1.0
+    cache.get_or_load("D", lambda: "D")
+    assert cache.stats()["entries"] == 1
+
+def test_ttl_cache_coalesces_concurrent_misses():
+    cache = TtlCache(ttl_seconds=60.0, max_entries=10)
+    release = threading.Event()
+    loads = []
+
+    def load():
+        loads.append(1)
+        release.wait(5)
+        return 3000.0
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = [executor.submit(cache.get_or_load, "ETHUSDT", load) for _ in range(8)]
+        while cache.stats()["coalesced"] < 7:
+            threading.Event().wait(0.01)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert results == [3000.0] * 8
+    assert len(loads) == 1
+
+def test_ttl_cache_does_not_cache_failures():
+    cache = TtlCache(ttl_seconds=60.0, max_entries=10)
+
+    def fail():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_load("ETHUSDT", fail)
+
+    assert cache.get_or_load("ETHUSDT", lambda: 3000.0) == 3000.0
@@ -0,0 +1,132 @@
+import threading
+
+import pytest
+
+from app.rate_limit import ProviderLimiter, RateLimitedError, TokenBucket, WeightLimiter, backoff_seconds, parse_retry_after, provider_limiter, provider_stats
+
+
+class FakeClock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_acquire_within_budget_does_not_block():
+    limiter = WeightLimiter(limit_per_minute=100, headroom=1.0, clock=FakeClock(0.0))
+
+    for _ in range(10):
+        limiter.acquire(10)
+
+    assert limiter.throttled == 0
+
+def test_server_reported_weight_replaces_estimate():
+    limiter = WeightLimiter(limit_per_minute=100, headroom=1.0, clock=FakeClock(0.0))
+
+    limiter.acquire(10)
+    limiter.release(10, used_weight=95)
+
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (limiter.acquire(10), acquired.set()), daemon=True)
+    thread.start()
+
+    assert not acquired.wait(timeout=0.05)
+    assert limiter.throttled >= 1
+
+def test_budget_resets_next_minute():
+    clock = FakeClock(0.0)
+    limiter = WeightLimiter(limit_per_minute=100, headroom=1.0, clock=clock)
+    limiter.acquire(100)
+    limiter.release(100, used_weight=100)
+
+    clock.now = 60.0
+    limiter.acquire(50)
+
+    assert limiter.throttled == 0
+
+def test_pause_holds_back_reservations_within_budget():
+    clock = FakeClock(0.0)
+    limiter = WeightLimiter(limit_per_minute=100, headroom=1.0, clock=clock)
+    limiter.pause(5.0)
+
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (limiter.acquire(10), acquired.set()), daemon=True)
+    thread.start()
+
+    assert not acquired.wait(timeout=0.05)
+    clock.now = 5.0
+    limiter.release(0)
+    assert acquired.wait(timeout=1.0)
+
+def test_token_bucket_allows_burst_then_paces():
+    clock = FakeClock(0.0)
+    waits = []
+    bucket = TokenBucket(rate=2.0, capacity=2.0, clock=clock, sleep=waits.append)
+
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == 0.5
+    assert bucket.acquire() == 1.0
+    clock.now = 10.0
+    assert bucket.acquire() == 0.0
+
+    assert waits == [0.5, 1.0]
+    assert bucket.throttled == 2
+
+def test_token_bucket_pause_holds_back_callers():
+    clock = FakeClock(0.0)
+    waits = []
+    bucket = TokenBucket(rate=10.0, capacity=10.0, clock=clock, sleep=waits.append)
+
+    bucket.pause(3.0)
+
+    assert bucket.acquire() == 3.0
+    clock.now = 5.0
+    assert bucket.acquire() == 0.0
+    assert waits == [3.0]
+
+def test_backoff_seconds_is_jittered_and_capped():
+    assert backoff_seconds(0, base=0.5, cap=30.0, rng=lambda: 1.0) == 0.5
+    assert backoff_seconds(3, base=0.5, cap=30.0, rng=lambda: 0.5) == 2.0
+    assert backoff_seconds(10, base=0.5, cap=30.0, rng=lambda: 1.0) == 30.0
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") is None
+
+def test_provider_limiter_retries_rate_limited_requests():
+    clock = FakeClock(0.0)
+    waits = []
+
+    def sleep(seconds):
+        waits.append(seconds)
+        clock.now += seconds
+
+    limiter = ProviderLimiter("test", rate=10.0, max_retries=2, clock=clock, sleep=sleep)
+    responses = [RateLimitedError("429", retry_after=4.0), RateLimitedError("Max rate limit reached"), "ok"]
+
+    def request():
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    assert limiter.call(request) == "ok"
+    assert waits[0] == 4.0
+    assert 0.0 < waits[1] <= 1.0
+    assert limiter.stats() == {"requests": 3, "rate_limited": 2, "throttled": 2, "waiting": 0}
+
+def test_provider_limiter_raises_after_max_retries():
+    limiter = ProviderLimiter("test", rate=10.0, max_retries=1, clock=FakeClock(0.0), sleep=lambda seconds: None)
+
+    def request():
+        raise RateLimitedError("Max rate limit reached")
+
+    with pytest.raises(RateLimitedError):
+        limiter.call(request)
+    assert limiter.rate_limited == 2
+
+def test_provider_limiter_is_shared_by_name():
+    limiter = provider_limiter("test-shared", rate=5.0)
+
+    assert provider_limiter("test-shared", rate=50.0) is limiter
+    assert provider_stats()["test-shared"]["requests"] == 0
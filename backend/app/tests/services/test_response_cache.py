@@ -0,0 +1,52 @@
+from app.response_cache import ResponseCache, fingerprint
+
+
+def test_response_cache_admits_only_final_blocks(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "responses.sqlite3"), max_bytes=1 << 20, finality_depth=64)
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        return {"result": [1, 2, 3]}
+
+    cache.observe_head(1000)
+    assert cache.get_or_fetch("recent", block_number=937, fetch=fetch) == {"result": [1, 2, 3]}
+    assert cache.get_or_fetch("recent", block_number=937, fetch=fetch) == {"result": [1, 2, 3]}
+    assert cache.get_or_fetch("final", block_number=936, fetch=fetch) == {"result": [1, 2, 3]}
+    assert cache.get_or_fetch("final", block_number=936, fetch=fetch) == {"result": [1, 2, 3]}
+
+    assert len(fetches) == 3
+    assert cache.stats()["hits"] == 1
+
+def test_response_cache_persists_across_instances(tmp_path):
+    path = str(tmp_path / "responses.sqlite3")
+    key = fingerprint("infura", "eth_getBlockByNumber", ["0x64", False])
+    cache = ResponseCache(path=path, max_bytes=1 << 20, finality_depth=64)
+    cache.put(key, {"timestamp": "0x1"})
+    cache.close()
+
+    reopened = ResponseCache(path=path, max_bytes=1 << 20, finality_depth=64)
+
+    assert reopened.get(key) == {"timestamp": "0x1"}
+    assert reopened.stats()["bytes"] > 0
+
+def test_response_cache_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "responses.sqlite3"), max_bytes=1 << 20, finality_depth=64)
+    cache.put("a", "x" * 100)
+    size = cache.stats()["bytes"]
+    cache.max_bytes = size * 2
+    cache.put("b", "y" * 100)
+    cache.get("a")
+    cache.put("c", "z" * 100)
+
+    assert cache.get("a") == "x" * 100
+    assert cache.get("b") is None
+    assert cache.get("c") == "z" * 100
+    assert cache.stats()["evictions"] == 1
+
+def test_response_cache_disabled_without_path():
+    cache = ResponseCache(path=None, max_bytes=1 << 20, finality_depth=64)
+    cache.observe_head(1000)
+    cache.put("a", 1)
+
+    assert cache.get("a") is None
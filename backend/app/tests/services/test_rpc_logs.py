@@ -0,0 +1,153 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+
+import httpx
+import pytest
+
+from app import etherscan, rpc_logs
+from app.block_index import BlockIndex
+from app.rate_limit import ProviderLimiter
+from app.response_cache import ResponseCache
+
+TIMESTAMP = 1738658220  # 2025-02-04 08:37:00 UTC
+POOL = "0x88e6a0c2ddd26feeb64f039a2c41296fcb3f5640"
+
+
+def swap_log(tx_hash: str, block: int, log_index: int = 0) -> dict:
+    return {"address": POOL, "topics": [rpc_logs.SWAP_TOPIC], "transactionHash": tx_hash, "blockNumber": hex(block), "logIndex": hex(log_index), "removed": False}
+
+class JsonRpcNode:
+    """
+    Local stand-in for an Ethereum JSON-RPC node serving fixed logs, receipts and blocks.
+    eth_getLogs queries matching more than max_logs logs are refused like Infura does.
+    """
+
+    def __init__(self, *, logs: list, max_logs: int):
+        self.logs = logs
+        self.max_logs = max_logs
+        self.log_ranges = []
+        self.batch_sizes = []
+
+    def call(self, request: dict) -> dict:
+        method, params = request["method"], request["params"]
+        if method == "eth_getLogs":
+            from_block, to_block = int(params[0]["fromBlock"], 16), int(params[0]["toBlock"], 16)
+            self.log_ranges.append((from_block, to_block))
+            logs = [log for log in self.logs if from_block <= int(log["blockNumber"], 16) <= to_block]
+            if len(logs) > self.max_logs:
+                return {"jsonrpc": "2.0", "id": request["id"], "error": {"code": -32005, "message": f"query returned more than {self.max_logs} results"}}
+            return {"jsonrpc": "2.0", "id": request["id"], "result": logs}
+        if method == "eth_getTransactionReceipt":
+            if not all(c in "0123456789abcdef" for c in params[0][2:]):
+                return {"jsonrpc": "2.0", "id": request["id"], "error": {"code": -32602, "message": "invalid argument 0: invalid hex string"}}
+            return {"jsonrpc": "2.0", "id": request["id"], "result": {"transactionHash": params[0], "gasUsed": hex(21000), "effectiveGasPrice": hex(2_000_000_000)}}
+        if method == "eth_getBlockByNumber":
+            return {"jsonrpc": "2.0", "id": request["id"], "result": {"number": params[0], "timestamp": hex(TIMESTAMP + int(params[0], 16))}}
+        return {"jsonrpc": "2.0", "id": request["id"], "error": {"code": -32601, "message": "method not found"}}
+
+    def handle(self, payload):
+        if isinstance(payload, list):
+            self.batch_sizes.append(len(payload))
+            return [self.call(request) for request in reversed(payload)]
+        return self.call(payload)
+
+@pytest.fixture
+def rpc_node():
+    node = JsonRpcNode(logs=[], max_logs=3)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            body = json.dumps(node.handle(payload)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    with (
+        patch.object(rpc_logs.node_monitor, "endpoint", return_value=f"http://127.0.0.1:{server.server_address[1]}"),
+        patch.object(rpc_logs.settings, "RPC_LOG_BLOCK_RANGE", 8),
+        patch.object(rpc_logs.settings, "RPC_BATCH_SIZE", 2),
+        patch.object(rpc_logs, "infura_rate_limiter", ProviderLimiter("infura", rate=1000.0)),
+        httpx.Client() as client,
+    ):
+        yield node, client
+    server.shutdown()
+
+def test_get_swap_logs_shrinks_range_when_refused(rpc_node):
+    node, client = rpc_node
+    node.logs = [swap_log(f"0x{block}{i}", block) for block in range(100, 104) for i in range(2)] + [swap_log("0x120", 120)]
+
+    logs = rpc_logs.get_swap_logs(client=client, address=POOL, from_block=100, to_block=120)
+
+    assert [log["transactionHash"] for log in logs] == [log["transactionHash"] for log in node.logs]
+    assert node.log_ranges[:3] == [(100, 107), (100, 103), (100, 101)]
+    assert all(to_block - from_block < 8 for from_block, to_block in node.log_ranges)
+
+def test_get_swap_logs_raises_when_one_block_is_refused(rpc_node):
+    node, client = rpc_node
+    node.logs = [swap_log(f"0x{i}", 100, i) for i in range(4)]
+
+    with pytest.raises(ValueError, match="more than 3 results"):
+        rpc_logs.get_swap_logs(client=client, address=POOL, from_block=100, to_block=100)
+
+def test_rpc_batch_skips_failed_calls_when_asked(rpc_node):
+    _, client = rpc_node
+    calls = [("eth_getTransactionReceipt", ["0xaa"]), ("eth_getTransactionReceipt", ["0xnothex"]), ("eth_getTransactionReceipt", ["0xbb"])]
+
+    with pytest.raises(ValueError, match="invalid hex string"):
+        rpc_logs.rpc_batch(client=client, calls=calls)
+    receipts = rpc_logs.rpc_batch(client=client, calls=calls, skip_errors=True)
+
+    assert [receipt and receipt["transactionHash"] for receipt in receipts] == ["0xaa", None, "0xbb"]
+
+def test_get_swap_transactions_batches_receipts_and_blocks(rpc_node):
+    node, client = rpc_node
+    node.logs = [swap_log("0xa", 100), swap_log("0xb", 101, 0), swap_log("0xb", 101, 1), swap_log("0xc", 101, 2)]
+
+    with (
+        patch.object(etherscan, "block_index", BlockIndex(max_gap_blocks=64)),
+        patch("app.etherscan.crud.insert_block_timestamps"),
+        patch("app.etherscan.get_ethusdt_price", side_effect=lambda session, timestamps_ms: {ts: 3000.0 for ts in timestamps_ms}),
+    ):
+        transactions = rpc_logs.get_swap_transactions(client=client, session=MagicMock(), address=POOL, from_block=100, to_block=105)
+
+    rows = transactions.to_rows()
+    assert [row["tx_hash"] for row in rows] == ["0xc", "0xb", "0xa"]
+    assert rows[0]["timestamp"].timestamp() == TIMESTAMP + 101
+    assert rows[0]["gas_price_wei"] == 2_000_000_000
+    assert rows[0]["txn_fee_usdt"] == pytest.approx(21000 * 2e9 * 3000.0 / 1e18)
+    # 3 receipts in batches of 2, then the 2 distinct blocks in one batch
+    assert node.batch_sizes == [2, 1, 2]
+
+def test_get_swap_transactions_reuses_cached_responses_for_final_blocks(rpc_node, tmp_path):
+    node, client = rpc_node
+    node.logs = [swap_log("0xa", 100), swap_log("0xb", 101), swap_log("0xc", 190)]
+    cache = ResponseCache(path=str(tmp_path / "responses.sqlite3"), max_bytes=1 << 20, finality_depth=64)
+
+    def get_swap_transactions():
+        return rpc_logs.get_swap_transactions(client=client, session=MagicMock(), address=POOL, from_block=100, to_block=200)
+
+    with (
+        patch.object(rpc_logs, "response_cache", cache),
+        patch.object(etherscan, "block_index", BlockIndex(max_gap_blocks=64)),
+        patch("app.etherscan.crud.insert_block_timestamps"),
+        patch("app.etherscan.get_ethusdt_price", side_effect=lambda session, timestamps_ms: {ts: 3000.0 for ts in timestamps_ms}),
+    ):
+        first = get_swap_transactions()
+        requests = len(node.log_ranges), len(node.batch_sizes)
+        second = get_swap_transactions()
+
+    assert second.events.tx_hashes.tolist() == first.events.tx_hashes.tolist() == ["0xc", "0xb", "0xa"]
+    # Only the logs, receipt and block past block 136 are fetched again
+    assert len(node.log_ranges) - requests[0] == sum(1 for _, to_block in node.log_ranges[:requests[0]] if to_block > 136)
+    assert node.batch_sizes[requests[1]:] == [1, 1]
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app import tasks
+from app.columnar import parse_transfer_events
+
+END_TIME = datetime(2025, 2, 4, 8, 37, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def ingest():
+    """
+    Runs update_price_and_transactions against mocked upstreams, returning the mocks
+    """
+    with (
+        patch("app.tasks.crud") as crud,
+        patch("app.tasks.binance.batch_save_ethusdt_price"),
+        patch("app.tasks.etherscan.resolve_block_no", return_value=200) as resolve_block_no,
+        patch("app.tasks.etherscan.get_erc20_token_transfer_events") as get_transfer_events,
+    ):
+        crud.get_lastupdate_spot_price.return_value = None
+        get_transfer_events.return_value.to_rows.return_value = []
+
+        def run(last_update_transaction, unpriced_events=()):
+            crud.get_lastupdate_transaction.return_value = last_update_transaction
+            get_transfer_events.return_value.unpriced = parse_transfer_events(list(unpriced_events))
+            tasks.update_price_and_transactions(session=MagicMock(), client=MagicMock(), end_time=END_TIME)
+            return crud, resolve_block_no, get_transfer_events
+
+        yield run
+
+def test_update_price_and_transactions_continues_from_last_block(ingest):
+    crud, resolve_block_no, get_transfer_events = ingest(MagicMock(timestamp=END_TIME - timedelta(minutes=1), block_number=190))
+
+    resolve_block_no.assert_called_once()
+    assert resolve_block_no.call_args.kwargs["bound"] == "end"
+    assert get_transfer_events.call_args.kwargs["from_block"] == 191
+    assert get_transfer_events.call_args.kwargs["to_block"] == 200
+    assert crud.update_lastupdate_transaction.call_args.kwargs["end_time"] == END_TIME
+    assert crud.update_lastupdate_transaction.call_args.kwargs["block_number"] == 200
+
+def test_update_price_and_transactions_resolves_start_without_last_block(ingest):
+    _, resolve_block_no, _ = ingest(MagicMock(timestamp=END_TIME - timedelta(minutes=1), block_number=None))
+
+    assert [c.kwargs["bound"] for c in resolve_block_no.call_args_list] == ["start", "end"]
+
+def test_update_price_and_transactions_stops_watermark_before_unpriced_events(ingest):
+    timestamp = int(END_TIME.timestamp())
+    crud, _, _ = ingest(MagicMock(timestamp=END_TIME - timedelta(minutes=2), block_number=190), unpriced_events=[
+        {"hash": "0xb", "blockNumber": "197", "timeStamp": str(timestamp - 36), "gasUsed": "21000", "gasPrice": "1"},
+        {"hash": "0xa", "blockNumber": "195", "timeStamp": str(timestamp - 60), "gasUsed": "21000", "gasPrice": "1"},
+    ])
+
+    assert crud.update_lastupdate_transaction.call_args.kwargs["end_time"] == END_TIME - timedelta(seconds=61)
+    assert crud.update_lastupdate_transaction.call_args.kwargs["block_number"] == 194
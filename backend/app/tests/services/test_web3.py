@@ -0,0 +1,78 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app import web3
+
+TIMESTAMP = 1738658220  # 2025-02-04 08:37:00 UTC
+
+
+def fake_rpc_batch(batches: list):
+    """
+    Answers JSON-RPC batches from fixed transactions, receipts and blocks, recording each batch's methods.
+    Lookups of hashes that are not 0x prefixed fail like invalid params on a node.
+    """
+    transactions = {
+        "0xa": {"hash": "0xa", "blockNumber": hex(100), "gasPrice": hex(2_000_000_000)},
+        "0xb": {"hash": "0xb", "blockNumber": hex(100), "gasPrice": hex(30_000_000_000)},
+        "0xc": {"hash": "0xc", "blockNumber": hex(101), "gasPrice": hex(2_000_000_000)},
+        "0xpending": {"hash": "0xpending", "blockNumber": None, "gasPrice": hex(2_000_000_000)},
+    }
+
+    def rpc_batch(*, client, calls, block_numbers=None, skip_errors=False):
+        batches.append([method for method, _ in calls])
+        results = []
+        for method, params in calls:
+            if not params[0].startswith("0x"):
+                if not skip_errors:
+                    raise ValueError(f"{method} failed: invalid argument")
+                results.append(None)
+            elif method == "eth_getTransactionByHash":
+                results.append(transactions.get(params[0]))
+            elif method == "eth_getTransactionReceipt":
+                results.append({"gasUsed": hex(21000)} if params[0] in transactions else None)
+            else:
+                results.append({"number": params[0], "timestamp": hex(TIMESTAMP + int(params[0], 16))})
+        return results
+
+    return rpc_batch
+
+def test_get_eth_transaction_details_for_insert_batches_lookups():
+    batches = []
+
+    with (
+        patch("app.web3.rpc_batch", side_effect=fake_rpc_batch(batches)),
+        patch("app.web3.get_ethusdt_price", return_value={(TIMESTAMP + 100) * 1000: 3000.0, (TIMESTAMP + 101) * 1000: 3001.0}) as get_ethusdt_price,
+    ):
+        transactions = web3.get_eth_transaction_details_for_insert(
+            session=MagicMock(), client=MagicMock(), tx_hashes=["0xa", "0xb", "0xc", "0xa", "0xmissing", "0xpending"]
+        )
+
+    assert [transaction.tx_hash for transaction in transactions] == ["0xa", "0xb", "0xc"]
+    assert batches == [
+        ["eth_getTransactionByHash", "eth_getTransactionReceipt"] * 5,
+        ["eth_getBlockByNumber", "eth_getBlockByNumber"],
+    ]
+    get_ethusdt_price.assert_called_once()
+    assert get_ethusdt_price.call_args.kwargs["timestamps_ms"] == [(TIMESTAMP + 100) * 1000, (TIMESTAMP + 101) * 1000]
+    assert transactions[1].timestamp.timestamp() == TIMESTAMP + 100
+    assert transactions[1].txn_fee_eth == pytest.approx(21000 * 30e9 / 1e18)
+    assert transactions[2].txn_fee_usdt == pytest.approx(21000 * 2e9 * 3001.0 / 1e18)
+
+def test_get_eth_transaction_details_for_insert_skips_unpriced_transactions():
+    with (
+        patch("app.web3.rpc_batch", side_effect=fake_rpc_batch([])),
+        patch("app.web3.get_ethusdt_price", return_value={(TIMESTAMP + 101) * 1000: 3001.0}),
+    ):
+        transactions = web3.get_eth_transaction_details_for_insert(session=MagicMock(), client=MagicMock(), tx_hashes=["0xa", "0xc"])
+
+    assert [transaction.tx_hash for transaction in transactions] == ["0xc"]
+
+def test_get_eth_transaction_details_for_insert_skips_malformed_hashes():
+    with (
+        patch("app.web3.rpc_batch", side_effect=fake_rpc_batch([])),
+        patch("app.web3.get_ethusdt_price", return_value={(TIMESTAMP + 100) * 1000: 3000.0, (TIMESTAMP + 101) * 1000: 3001.0}),
+    ):
+        transactions = web3.get_eth_transaction_details_for_insert(session=MagicMock(), client=MagicMock(), tx_hashes=["0xa", "not-a-hash", "0xc"])
+
+    assert [transaction.tx_hash for transaction in transactions] == ["0xa", "0xc"]
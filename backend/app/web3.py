@@ -1,60 +1,85 @@
+import logging
+
 import httpx
 from sqlmodel import Session
 from web3 import Web3
-from web3.exceptions import TransactionNotFound, BlockNotFound
 from app.core.config import settings
 from app.binance import get_ethusdt_price
 from datetime import datetime, timezone
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional
 
-from app.models import TransactionCreate, TransactionsPublic
+from app.models import CountStrategy, TransactionCreate, TransactionsPublic
 from app.crud import get_transactions, insert_transactions, get_lastupdate_transaction
+from app.node_health import node_monitor
+from app.rpc_logs import rpc_batch
 from app.tasks import update_price_and_transactions
 
-ONE_SECOND_MS = 1000
+logger = logging.getLogger(__name__)
 
-web3 = Web3(Web3.HTTPProvider(settings.INFURA_HTTPS))
+ONE_SECOND_MS = 1000
 
-def get_eth_transaction_detail_for_insert(*, session: Session, tx_hash: str) -> TransactionCreate:
+def get_eth_transaction_details_for_insert(*, session: Session, client: httpx.Client, tx_hashes: List[str]) -> List[TransactionCreate]:
     """
-    Retrieves and displays details for a given Ethereum transaction hash for inserting into DB.
+    Retrieves details of several Ethereum transactions for inserting into DB with batched JSON-RPC requests,
+    one batch for the transactions and their receipts, one for their distinct blocks and a single ETHUSDT price lookup.
+    Hashes that are malformed, not found, not yet mined or without a price are left out.
     """
-    if not web3.is_connected():
-        raise ConnectionError("Failed to connect to the Ethereum node.")
-    
-    try:
-        tx = web3.eth.get_transaction(tx_hash)
-        tx_receipt = web3.eth.get_transaction_receipt(tx_hash)
-        block = web3.eth.get_block(tx['blockNumber'])
-        timestamp = block['timestamp']
-        timestamp_ms = timestamp * ONE_SECOND_MS
-
-        gas_used = tx_receipt['gasUsed']
-        total_gas_cost_eth = web3.from_wei(tx['gasPrice'] * gas_used, 'ether')
-
-        eth_price_usd = get_ethusdt_price(session=session, timestamps_ms=[timestamp_ms]).get(timestamp_ms)
-        total_gas_cost_usd = float(total_gas_cost_eth) * eth_price_usd
-
-        transaction = TransactionCreate(
-            tx_hash=tx.hash.to_0x_hex(),
+    tx_hashes = list(dict.fromkeys(tx_hashes))
+    found: List[Dict[str, Any]] = []
+    receipts: Dict[str, Dict[str, Any]] = {}
+    hashes_per_batch = max(settings.RPC_BATCH_SIZE // 2, 1)
+    for start in range(0, len(tx_hashes), hashes_per_batch):
+        chunk = tx_hashes[start:start + hashes_per_batch]
+        results = rpc_batch(
+            client=client,
+            calls=[call for tx_hash in chunk for call in (("eth_getTransactionByHash", [tx_hash]), ("eth_getTransactionReceipt", [tx_hash]))],
+            block_numbers=[None] * (2 * len(chunk)),
+            skip_errors=True
+        )
+        for tx_hash, tx, receipt in zip(chunk, results[::2], results[1::2]):
+            if tx is None or receipt is None or tx.get("blockNumber") is None:
+                logger.warning(f"Error fetching transaction {tx_hash}: not found or not yet mined")
+                continue
+            found.append(tx)
+            receipts[tx["hash"]] = receipt
+
+    block_numbers = list(dict.fromkeys(tx["blockNumber"] for tx in found))
+    block_timestamps: Dict[str, int] = {}
+    for start in range(0, len(block_numbers), settings.RPC_BATCH_SIZE):
+        chunk = block_numbers[start:start + settings.RPC_BATCH_SIZE]
+        blocks = rpc_batch(
+            client=client,
+            calls=[("eth_getBlockByNumber", [block_number, False]) for block_number in chunk],
+            block_numbers=[int(block_number, 16) for block_number in chunk]
+        )
+        block_timestamps.update((block_number, int(block["timestamp"], 16)) for block_number, block in zip(chunk, blocks) if block)
+    if not block_timestamps:
+        return []
+
+    timestamps_ms = sorted({timestamp * ONE_SECOND_MS for timestamp in block_timestamps.values()})
+    eth_usdt_prices = get_ethusdt_price(session=session, timestamps_ms=timestamps_ms)
+
+    transactions = []
+    for tx in found:
+        timestamp = block_timestamps.get(tx["blockNumber"])
+        eth_price_usd = eth_usdt_prices.get(timestamp * ONE_SECOND_MS) if timestamp is not None else None
+        if eth_price_usd is None:
+            logger.warning(f"Error fetching transaction {tx['hash']}: no block timestamp or ETHUSDT price")
+            continue
+
+        gas_used = int(receipts[tx["hash"]]["gasUsed"], 16)
+        gas_price_wei = int(tx["gasPrice"], 16)
+        total_gas_cost_eth = float(Web3.from_wei(gas_price_wei * gas_used, 'ether'))
+        transactions.append(TransactionCreate(
+            tx_hash=tx["hash"],
             timestamp=datetime.fromtimestamp(timestamp, tz=timezone.utc),
-            txn_fee_usdt=total_gas_cost_usd,
+            txn_fee_usdt=total_gas_cost_eth * eth_price_usd,
             gas_used=gas_used,
-            gas_price_wei=tx['gasPrice'],
+            gas_price_wei=gas_price_wei,
             txn_fee_eth=total_gas_cost_eth,
             eth_usdt_price=eth_price_usd
-        )
-
-        return transaction
-
-    except TransactionNotFound:
-        raise ValueError(f"Transaction with hash {tx_hash} not found.")
-    except BlockNotFound:
-        raise ValueError(f"Block containing transaction {tx_hash} not found.")
-    except RuntimeError as re:
-        raise re
-    except Exception as err:
-        raise RuntimeError(f"An unexpected error occurred: {err}")
+        ))
+    return transactions
 
 
 def get_eth_transaction_details(
@@ -65,12 +90,14 @@ def get_eth_transaction_details(
     limit: int = 50,
     skip: int = 0,
     start_time: Optional[datetime] = None,
-    end_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    count_strategy: CountStrategy = "exact"
 ) -> TransactionsPublic:
     """
     Retrieves and displays details of eth transactions, accepts filtering by tx_hash.
     """
-    if not web3.is_connected():
+    if not node_monitor.is_healthy():
         raise ConnectionError("Failed to connect to the Ethereum node.")
     
     check_time = datetime.now(timezone.utc)
@@ -85,7 +112,7 @@ def get_eth_transaction_details(
 
     # Fetch all transactions from DB if no filters are provided
     if not tx_hashes:
-        transactions = get_transactions(session=session, skip=skip, limit=limit, start_time=start_time, end_time=end_time)
+        transactions = get_transactions(session=session, skip=skip, limit=limit, start_time=start_time, end_time=end_time, cursor=cursor, count_strategy=count_strategy)
         return transactions
 
     # If tx_hashes are given, search DB, fetch and insert  missing transactions if any
@@ -95,16 +122,14 @@ def get_eth_transaction_details(
 
     if missing_tx_hashes:
         new_transactions = []
-        for tx_hash in missing_tx_hashes:
-            try:
-                new_transaction = get_eth_transaction_detail_for_insert(session=session, tx_hash=tx_hash)
-                new_transactions.append(new_transaction)
-            except Exception as e:
-                print(f"Error fetching transaction {tx_hash}: {e}")
+        try:
+            new_transactions = get_eth_transaction_details_for_insert(session=session, client=client, tx_hashes=sorted(missing_tx_hashes))
+        except Exception as e:
+            logger.error(f"Error fetching transactions {sorted(missing_tx_hashes)}: {e}")
 
         if new_transactions:
             insert_transactions(session=session, transactions_create=new_transactions)
 
     # Fetch and return filtered results
-    transactions = get_transactions(session=session, tx_hashes=tx_hashes, start_time=start_time, end_time=end_time, skip=skip, limit=limit)
+    transactions = get_transactions(session=session, tx_hashes=tx_hashes, start_time=start_time, end_time=end_time, skip=skip, limit=limit, cursor=cursor, count_strategy=count_strategy)
     return transactions
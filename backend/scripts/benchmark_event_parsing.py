@@ -0,0 +1,81 @@
+"""
+Benchmark per-event vs columnar parsing of Etherscan tokentx events and Binance klines for 100k events,
+from the raw API pages up to what is handed to the database layer: validated models before, typed rows now.
+
+Run from the backend directory:
+    python scripts/benchmark_event_parsing.py
+"""
+import random
+import time
+from datetime import datetime, timezone
+
+from app.columnar import concat_transfer_events, parse_klines, parse_transfer_events, price_transfer_events
+from app.crud import _transaction_row
+from app.models import Transaction, TransactionCreate
+
+EVENTS = 100_000
+PAGE_SIZE = 100
+ONE_SECOND_MS = 1000
+START_TIMESTAMP = 1738627200  # 2025-02-04 00:00:00 UTC
+
+
+def per_event(pages: list, prices: dict) -> list:
+    """
+    Previous behaviour: float()/int()/datetime.fromtimestamp() and a TransactionCreate per event,
+    validated again into a Transaction for its insert values.
+    """
+    raw_transactions = [event for page in pages for event in page]
+    transactions = []
+    for event in raw_transactions:
+        eth_usdt_price = prices.get(int(event["timeStamp"]) * ONE_SECOND_MS)
+        transactions.append(TransactionCreate(
+            tx_hash=event["hash"],
+            timestamp=datetime.fromtimestamp(int(event["timeStamp"]), tz=timezone.utc),
+            txn_fee_usdt=float(event["gasUsed"]) * float(event["gasPrice"]) * eth_usdt_price / 1e18,
+            gas_used=int(event["gasUsed"]),
+            gas_price_wei=int(event["gasPrice"]),
+            txn_fee_eth=float(event["gasUsed"]) * float(event["gasPrice"]) / 1e18,
+            eth_usdt_price=eth_usdt_price
+        ))
+    return [_transaction_row(Transaction.model_validate(transaction)) for transaction in transactions]
+
+def columnar(pages: list, prices: dict) -> list:
+    batch = concat_transfer_events([parse_transfer_events(page) for page in pages])
+    return price_transfer_events(batch=batch, prices=prices).to_rows()
+
+def per_kline(klines: list) -> list:
+    return [("ETHUSDT", kline[0], float(kline[1])) for kline in klines]
+
+def columnar_klines(klines: list) -> list:
+    return parse_klines(klines).to_spot_prices(symbol="ETHUSDT")
+
+def timed(name: str, fn, *args) -> None:
+    started = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<20} {len(result):>7} rows  {elapsed:7.3f}s  {len(result) / elapsed:12.0f} rows/sec")
+
+def main() -> None:
+    rng = random.Random(0)
+    events = [
+        {
+            "hash": f"0x{rng.getrandbits(256):064x}",
+            "blockNumber": str(START_TIMESTAMP // 12 + i // 120),
+            "timeStamp": str(START_TIMESTAMP + i // 10),
+            "gasUsed": str(rng.randint(100_000, 400_000)),
+            "gasPrice": str(rng.randint(1_000_000_000, 50_000_000_000)),
+        }
+        for i in range(EVENTS)
+    ]
+    pages = [events[i:i + PAGE_SIZE] for i in range(0, EVENTS, PAGE_SIZE)]
+    prices = {(START_TIMESTAMP + second) * ONE_SECOND_MS: 3000.0 + rng.random() for second in range(EVENTS // 10 + 1)}
+    klines = [[(START_TIMESTAMP + i) * ONE_SECOND_MS, f"{3000 + rng.random():.2f}", "0", "0", "0", "0"] for i in range(EVENTS)]
+
+    timed("per-event", per_event, pages, prices)
+    timed("columnar", columnar, pages, prices)
+    timed("per-kline", per_kline, klines)
+    timed("columnar klines", columnar_klines, klines)
+
+
+if __name__ == "__main__":
+    main()
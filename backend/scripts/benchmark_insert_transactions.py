@@ -0,0 +1,87 @@
+"""
+Benchmark rows/sec of per-row vs bulk transaction inserts.
+
+Run from the backend directory against a migrated DB:
+    python scripts/benchmark_insert_transactions.py
+"""
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+
+from app import crud
+from app.core.db import engine
+from app.models import Transaction, TransactionCreate
+
+ROW_COUNTS = [10_000, 100_000]
+HASH_PREFIX = "0xbench"
+
+
+def make_transactions(count: int) -> List[TransactionCreate]:
+    run_id = uuid.uuid4().hex[:8]
+    start = datetime.now(tz=timezone.utc)
+    return [
+        TransactionCreate(
+            tx_hash=f"{HASH_PREFIX}{run_id}{i:010d}",
+            timestamp=start - timedelta(seconds=i),
+            txn_fee_usdt=1.5,
+            gas_used=150000,
+            gas_price_wei=10_000_000_000,
+            txn_fee_eth=0.0015,
+            eth_usdt_price=1000.0
+        )
+        for i in range(count)
+    ]
+
+
+def per_row_insert(*, session: Session, transactions_create: List[TransactionCreate]) -> None:
+    """
+    Previous insert_transactions implementation: one statement and commit per row.
+    """
+    for tx in transactions_create:
+        db_obj = Transaction.model_validate(tx)
+        stmt = pg_insert(Transaction).values(
+            tx_hash=db_obj.tx_hash,
+            timestamp=db_obj.timestamp,
+            txn_fee_usdt=db_obj.txn_fee_usdt,
+            gas_used=db_obj.gas_used,
+            gas_price_wei=db_obj.gas_price_wei,
+            txn_fee_eth=db_obj.txn_fee_eth,
+            eth_usdt_price=db_obj.eth_usdt_price
+        ).on_conflict_do_nothing(index_elements=['tx_hash'])
+        session.exec(stmt)
+        try:
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+
+
+def cleanup(session: Session) -> None:
+    session.exec(delete(Transaction).where(Transaction.tx_hash.startswith(HASH_PREFIX)))
+    session.commit()
+
+
+def run(session: Session, name: str, insert_fn, count: int) -> None:
+    transactions = make_transactions(count)
+    started = time.perf_counter()
+    insert_fn(session=session, transactions_create=transactions)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<10} {count:>8} rows  {elapsed:8.2f}s  {count / elapsed:10.0f} rows/sec")
+    cleanup(session)
+
+
+def main() -> None:
+    with Session(engine) as session:
+        cleanup(session)
+        for count in ROW_COUNTS:
+            run(session, "per-row", per_row_insert, count)
+            run(session, "bulk", crud.insert_transactions, count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark serial vs concurrent 1s kline fetching for a one-day range against a local
+stub of the Binance klines endpoint that injects latency and reports used weight.
+
+Run from the backend directory:
+    python scripts/benchmark_kline_fetching.py
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from binance.spot import Spot as Client
+
+from app import binance
+
+LATENCY_SECONDS = 0.15
+ONE_DAY_MS = 24 * 60 * 60 * 1000
+START_TIME_MS = 1738627200000  # 2025-02-04 00:00:00 UTC
+
+
+class StubKlinesHandler(BaseHTTPRequestHandler):
+    used_weight = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        start_time = int(query["startTime"][0])
+        end_time = int(query["endTime"][0])
+        limit = int(query["limit"][0])
+        time.sleep(LATENCY_SECONDS)
+
+        klines = [
+            [open_time, "3000.0", "3000.0", "3000.0", "3000.0", "1.0"]
+            for open_time in range(start_time, end_time + 1, 1000)
+        ][:limit]
+        with StubKlinesHandler.lock:
+            StubKlinesHandler.used_weight += binance.KLINES_REQUEST_WEIGHT
+            used_weight = StubKlinesHandler.used_weight
+
+        body = json.dumps(klines).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("X-MBX-USED-WEIGHT-1M", str(used_weight))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serial_fetch(client: Client, start_time_ms: int, end_time_ms: int) -> int:
+    """
+    Previous behaviour: one klines call at a time over the whole range.
+    """
+    count = 0
+    for window_start, window_end in binance.get_kline_windows(start_time_ms=start_time_ms, end_time_ms=end_time_ms):
+        count += len(client.klines(symbol=binance.ETH_USDT_SYMBOL, interval="1s", startTime=window_start, endTime=window_end, limit=1000))
+    return count
+
+
+def concurrent_fetch(client: Client, start_time_ms: int, end_time_ms: int) -> int:
+    windows = binance.get_kline_windows(start_time_ms=start_time_ms, end_time_ms=end_time_ms)
+    return sum(len(klines) for klines in binance.iter_kline_chunks(symbol=binance.ETH_USDT_SYMBOL, windows=windows, client=client))
+
+
+def main() -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubKlinesHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    end_time_ms = START_TIME_MS + ONE_DAY_MS - 1000
+
+    for name, fetch, client in (
+        ("serial", serial_fetch, Client(base_url=base_url)),
+        ("concurrent", concurrent_fetch, Client(base_url=base_url, show_limit_usage=True)),
+    ):
+        started = time.perf_counter()
+        count = fetch(client, START_TIME_MS, end_time_ms)
+        elapsed = time.perf_counter() - started
+        print(f"{name:<12} {count:>7} klines  {elapsed:7.2f}s  {count / elapsed:10.0f} klines/sec")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()